@@ -54,6 +54,9 @@ OPENAI_CHAT_MODEL_FALLBACKS = [
 # -----------------------------------------------------------------------------
 DEBUG = env.bool("DJANGO_DEBUG", False)
 SECRET_KEY = env.str("DJANGO_SECRET_KEY", default="dev-insecure-key")
+# Clés HMAC des liens de téléchargement (store.utils.tokens), la plus récente en tête :
+# la première signe, les suivantes vérifient encore. Vide → SECRET_KEY (+ fallbacks).
+DOWNLOAD_TOKEN_KEYS = env.list("DOWNLOAD_TOKEN_KEYS", default=[])
 
 # -----------------------------------------------------------------------------
 # Allowed Hosts & CSRF Trusted Origins
@@ -121,6 +124,21 @@ MEDIA_ROOT = BASE_DIR / "media"
 # Médias privés (fichiers payants)
 PRIVATE_MEDIA_ROOT = BASE_DIR / "private_media"
 
+# Livraison des fichiers protégés (store.utils.delivery) :
+# "stream" (Django envoie les octets), "x-accel" (nginx), "x-sendfile" (Apache/LWS).
+FILE_DELIVERY_BACKEND = env.str("FILE_DELIVERY_BACKEND", default="stream")
+# Racine disque → préfixe de la location `internal` nginx (seuls ces fichiers sont délégués).
+FILE_DELIVERY_ACCEL_LOCATIONS = {
+    str(MEDIA_ROOT): env.str("FILE_DELIVERY_ACCEL_MEDIA", default="/_protected/media/"),
+    str(PRIVATE_MEDIA_ROOT): env.str("FILE_DELIVERY_ACCEL_PRIVATE", default="/_protected/private/"),
+}
+
+# Pied de page acheteur sur les PDF d'ebook (store.services.watermark, requiert PyPDF2).
+# Cache disque sous PRIVATE_MEDIA_ROOT : délégué au serveur frontal comme le reste.
+PDF_WATERMARK = env.bool("PDF_WATERMARK", default=True)
+PDF_WATERMARK_CACHE_DIR = PRIVATE_MEDIA_ROOT / "_watermarked"
+PDF_WATERMARK_CACHE_MAX_BYTES = env.int("PDF_WATERMARK_CACHE_MAX_MB", default=512) * 1024 * 1024
+
 # Stockage (avec WhiteNoise si disponible)
 if USE_WHITENOISE and HAS_WHITENOISE:
     STORAGES = {
@@ -176,6 +194,20 @@ SERVER_EMAIL = env.str("SERVER_EMAIL", EMAIL_HOST_USER or "root@localhost")
 # Expéditeur spécifique pour les emails de livraison (facultatif)
 FULFILMENT_SENDER = env.str("FULFILMENT_SENDER", DEFAULT_FROM_EMAIL)
 
+# -----------------------------------------------------------------------------
+# Cache partagé entre workers (Redis si CACHE_REDIS_URL, sinon LocMem par processus)
+# -----------------------------------------------------------------------------
+CACHE_REDIS_URL = env.str("CACHE_REDIS_URL", "")
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
 # -----------------------------------------------------------------------------
 # CinetPay
 # -----------------------------------------------------------------------------
@@ -184,6 +216,34 @@ CINETPAY_API_KEY = env.str("CINETPAY_API_KEY", default=None)
 CINETPAY_SECRET_KEY = env.str("CINETPAY_SECRET_KEY", default=None)
 CINETPAY_MODE = env.str("CINETPAY_MODE", "PROD").upper()
 CINETPAY_ENV = env.str("CINETPAY_ENV", "sandbox")
+# Inbox webhooks : persister puis acquitter (200 immédiat), traitement différé
+# par la tâche `drain_webhook_inbox` / la commande du même nom.
+PAYMENT_WEBHOOK_INBOX = env.bool("PAYMENT_WEBHOOK_INBOX", False)
+PAYMENT_WEBHOOK_INBOX_BATCH = env.int("PAYMENT_WEBHOOK_INBOX_BATCH", 50)
+# Dédoublonnage des webhooks rejoués (store.services.webhook_dedup), en secondes
+PAYMENT_WEBHOOK_DEDUP_TTL = env.int("PAYMENT_WEBHOOK_DEDUP_TTL", 86400)
+# URLs S3 signées réutilisées tant qu'il leur reste cette fraction de la durée demandée
+# (downloads.services.SignedUrlService) ; 1 = jamais réutilisées.
+SIGNED_URL_REUSE_FRACTION = env.float("SIGNED_URL_REUSE_FRACTION", 0.5)
+# Instantané du catalogue publié gardé en mémoire par worker (store.services.catalog),
+# en s : borne la péremption quand le cache n'est pas partagé entre workers.
+CATALOG_SNAPSHOT_MAX_AGE = env.int("CATALOG_SNAPSHOT_MAX_AGE", 300)
+# Statut de commande en cache pour la page d'attente (store.services.order_status), en s
+ORDER_STATUS_CACHE_TTL = env.int("ORDER_STATUS_CACHE_TTL", 3600)
+# Outbox des e-mails transactionnels (store.services.outbox) ; 0 = envoi immédiat
+EMAIL_OUTBOX = env.bool("EMAIL_OUTBOX", True)
+EMAIL_OUTBOX_BATCH = env.int("EMAIL_OUTBOX_BATCH", 50)
+EMAIL_OUTBOX_MAX_ATTEMPTS = env.int("EMAIL_OUTBOX_MAX_ATTEMPTS", 8)
+# Débit par défaut de la commande `resend_fulfilment` (messages/s, limite du fournisseur SMTP)
+EMAIL_RESEND_RATE = env.float("EMAIL_RESEND_RATE", 5.0)
+# Checkout idempotent : réutilise la payment_url d'une commande non payée récente
+CHECKOUT_REUSE_MINUTES = env.int("CHECKOUT_REUSE_MINUTES", 20)
+# Réconciliation des paiements en attente (commande/tâche `reconcile_payments`)
+PAYMENT_RECONCILE_STALE_MINUTES = env.int("PAYMENT_RECONCILE_STALE_MINUTES", 15)
+PAYMENT_RECONCILE_MAX_AGE_HOURS = env.int("PAYMENT_RECONCILE_MAX_AGE_HOURS", 72)
+PAYMENT_RECONCILE_CHUNK = env.int("PAYMENT_RECONCILE_CHUNK", 200)
+PAYMENT_RECONCILE_WORKERS = env.int("PAYMENT_RECONCILE_WORKERS", 8)
+PAYMENT_RECONCILE_RATE = env.float("PAYMENT_RECONCILE_RATE", 10.0)  # checks/s, 0 = illimité
 
 # -----------------------------------------------------------------------------
 # Kit Complet - Configuration
@@ -252,5 +312,25 @@ for _alias in ("produit", "audit-services-publics", "ebook-audit-sans-peur"):
 # -----------------------------------------------------------------------------
 import os
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+CELERY_BEAT_SCHEDULE = {
+    "reconcile-payments": {
+        "task": "store.tasks.reconcile_payments",
+        "schedule": 300.0,
+    },
+    "flush-download-stats": {
+        "task": "store.tasks.flush_download_stats",
+        "schedule": 300.0,
+    },
+}
+if EMAIL_OUTBOX:
+    CELERY_BEAT_SCHEDULE["drain-email-outbox"] = {
+        "task": "store.tasks.drain_email_outbox",
+        "schedule": 60.0,
+    }
+if PAYMENT_WEBHOOK_INBOX:
+    CELERY_BEAT_SCHEDULE["drain-webhook-inbox"] = {
+        "task": "store.tasks.drain_webhook_inbox",
+        "schedule": 10.0,
+    }
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 SITE_URL = os.getenv("SITE_URL", "http://localhost:8000")
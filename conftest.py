@@ -10,6 +10,34 @@ def _safe_email_backend(settings, monkeypatch):
     return settings
 
 
+@pytest.fixture
+def locmem_cache(settings):
+    # dev.py désactive le cache (DummyCache) : tests des chemins « cache chaud ».
+    from django.core.cache import cache
+
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()  # stockage LocMem partagé par le processus
+    yield settings
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    # Le cache (LocMem) survit d'un test à l'autre : dédoublonnage, compteurs…
+    # Idem pour l'instantané du catalogue mémorisé dans le processus.
+    from django.core.cache import cache
+
+    from store.services import catalog
+
+    cache.clear()
+    catalog._memo = None
+    yield
+    cache.clear()
+    catalog._memo = None
+
+
 @pytest.fixture
 def seed_download_categories(db):
     from downloads.models import DownloadCategory
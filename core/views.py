@@ -9,20 +9,15 @@ from django.http import (
 from django.shortcuts import render, redirect
 from django.utils.timezone import now
 
-from store.models import ExampleSlide, OfferTier, Product
+from store.services import catalog
 
 
 def home(request):
-    product = Product.objects.filter(is_published=True).first()
-    offers = OfferTier.objects.select_related("product").all()
-    examples = ExampleSlide.objects.all()[:3]
-
-    
-
+    snap = catalog.snapshot()
     return render(
         request,
         "core/home.html",
-        {"product": product, "offers": offers, "examples": examples}
+        {"product": snap.product, "offers": snap.tiers, "examples": snap.slides[:3]}
     )
 
 
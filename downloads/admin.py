@@ -1,9 +1,11 @@
 from django.contrib import admin
+from django.db.models import Sum
 
 from .models import (
     DownloadableAsset,
     DownloadCategory,
     DownloadEntitlement,
+    DownloadStat,
     ExternalEntitlement,
     PurchaseClaim,
 )
@@ -39,20 +41,49 @@ class DownloadCategoryAdmin(admin.ModelAdmin):
 @admin.register(DownloadableAsset)
 class DownloadableAssetAdmin(admin.ModelAdmin):
     list_display = (
-        "title", "category", "get_ext", "is_published", "order", "updated_at"
+        "title", "category", "get_ext", "is_published", "order", "downloads_total", "updated_at"
     )
     exclude = ("order",)  # on ne demande pas 'order' dans le formulaire
     list_filter = ("category", "is_published")
     search_fields = ("title", "slug", "short_desc")
     ordering = ("category", "order", "-updated_at")
     prepopulated_fields = {"slug": ("title",)}
-    readonly_fields = ("updated_at", "created_at")
+    readonly_fields = (
+        "original_name", "size", "mime_type", "page_count", "sha256", "updated_at", "created_at"
+    )
 
     def get_ext(self, obj):
         return obj.extension
 
     get_ext.short_description = "Ext."
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(_downloads=Sum("stats__count"))
+
+    def downloads_total(self, obj):
+        return obj._downloads or 0
+
+    downloads_total.short_description = "Téléchargements"
+    downloads_total.admin_order_field = "_downloads"
+
+
+@admin.register(DownloadStat)
+class DownloadStatAdmin(admin.ModelAdmin):
+    """Téléchargements par asset et par jour (alimenté par flush_download_stats)."""
+
+    list_display = ("day", "asset", "count", "last_at")
+    list_filter = ("asset__category",)
+    list_select_related = ("asset",)
+    search_fields = ("asset__title", "asset__slug")
+    date_hierarchy = "day"
+    ordering = ("-day", "-count")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(DownloadEntitlement)
 class DownloadEntitlementAdmin(admin.ModelAdmin):
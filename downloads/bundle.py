@@ -0,0 +1,104 @@
+"""
+Archive « tout télécharger » des ressources d'une commande (page resources_overview).
+
+- `members(slugs)` : membres de l'archive (nom, source, taille, date) pour un ensemble
+  de catégories, calculés une fois puis gardés en cache par ensemble, sous le tampon
+  de version de downloads.resources (incrémenté à toute écriture sur un asset ou une
+  catégorie).
+- Source : copie privée (PRIVATE_MEDIA_ROOT) si elle existe, sinon le stockage du champ.
+- `stream(members)` : store.utils.zipstream, ni fichier temporaire ni fichier entier en
+  mémoire ; formats déjà compressés (PDF, Office, images, archives) stockés tels quels.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+
+from store.utils.zipstream import ZipMember, stream_zip
+
+from . import resources
+from .models import DownloadableAsset
+
+STORED_EXTENSIONS = frozenset({
+    ".pdf", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".epub",
+    ".zip", ".gz", ".7z", ".rar", ".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp3", ".mp4",
+})
+
+CACHE_PREFIX = "downloads:bundle"
+CACHE_TTL = 24 * 3600
+
+
+def _storage():
+    return DownloadableAsset._meta.get_field("file").storage
+
+
+def _source(asset: DownloadableAsset) -> tuple[str, int, float] | None:
+    """(source, taille, mtime) ; source absolue = copie privée, sinon nom dans le stockage."""
+    name = asset.file.name
+    private_root = getattr(settings, "PRIVATE_MEDIA_ROOT", None)
+    if private_root:
+        private = Path(private_root) / name
+        if private.is_file():
+            stat = private.stat()
+            return str(private), stat.st_size, stat.st_mtime
+    if asset.size is not None:  # métadonnées d'upload : pas d'appel au stockage
+        return name, asset.size, asset.updated_at.timestamp()
+    storage = _storage()
+    try:
+        return name, storage.size(name), storage.get_modified_time(name).timestamp()
+    except (OSError, NotImplementedError):
+        return None
+
+
+def _safe(part: str) -> str:
+    return part.replace("/", "-").replace("\\", "-").strip() or "fichiers"
+
+
+def _build(slugs: list[str]) -> list[ZipMember]:
+    assets = (
+        DownloadableAsset.objects.filter(category_id__in=slugs, is_published=True)
+        .exclude(file="")
+        .select_related("category")
+        .order_by("category__order", "category_id", "order", "id")
+    )
+    members, seen = [], set()
+    for asset in assets:
+        found = _source(asset)
+        if found is None:
+            continue
+        source, size, mtime = found
+        base = os.path.basename(asset.file.name)
+        stem, ext = os.path.splitext(base)
+        folder = _safe(asset.category.title)
+        name, n = f"{folder}/{base}", 1
+        while name in seen:
+            n += 1
+            name = f"{folder}/{stem} ({n}){ext}"
+        seen.add(name)
+        members.append(ZipMember(name, source, size, mtime, ext.lower() in STORED_EXTENSIONS))
+    return members
+
+
+def members(slugs) -> list[ZipMember]:
+    slugs = sorted({s for s in slugs if s})
+    digest = hashlib.sha256(",".join(slugs).encode("utf-8")).hexdigest()[:16]
+    key = f"{CACHE_PREFIX}:{resources.version()}:{digest}"
+    found = cache.get(key)
+    if found is None:
+        found = _build(slugs)
+        cache.set(key, found, CACHE_TTL)
+    return found
+
+
+def _open(member: ZipMember):
+    if os.path.isabs(member.source):
+        return open(member.source, "rb")
+    return _storage().open(member.source, "rb")
+
+
+def stream(entries: list[ZipMember]):
+    return stream_zip(entries, _open)
@@ -0,0 +1,110 @@
+"""
+Droits d'accès aux catégories protégées, résolus une fois par session.
+
+- `entitled_slugs(request)` : ensemble des slugs accessibles à l'utilisateur connecté,
+  aux e-mails revendiqués en session et au code de claim, calculé en UNE requête
+  (DownloadEntitlement + ExternalEntitlement en sous-requêtes EXISTS).
+- Le résultat est gardé dans la session (liste de slugs) avec le tampon de version
+  courant, l'identité qui l'a produit et sa date : un contrôle d'accès répété n'est
+  plus qu'un test d'appartenance.
+- Invalidation (downloads.signals) : toute écriture sur un entitlement incrémente le
+  tampon global ; changement d'identité → recalcul ; SESSION_TTL borne la
+  péremption si le cache partagé est indisponible.
+"""
+from __future__ import annotations
+
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
+
+from .models import DownloadCategory, DownloadEntitlement, ExternalEntitlement
+
+VERSION_KEY = "entitlements:version"
+SESSION_KEY = "entitled_slugs"
+SESSION_TTL = 300
+# Clés de session historiques posées par les parcours de claim.
+EMAIL_SESSION_KEYS = ("download_claim_email", "claimed_email")
+CODE_SESSION_KEY = "claim_code"
+
+
+def version() -> int:
+    return cache.get_or_set(VERSION_KEY, 1, None) or 1
+
+
+def bump_version() -> None:
+    """Les ensembles mémorisés en session deviennent périmés."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+
+
+def _identity(request) -> tuple[int | None, list[str], str]:
+    session = getattr(request, "session", None) or {}
+    user = getattr(request, "user", None)
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    emails = {(session.get(k) or "").strip().lower() for k in EMAIL_SESSION_KEYS}
+    if user_id and getattr(user, "email", ""):
+        emails.add(user.email.strip().lower())
+    emails.discard("")
+    return user_id, sorted(emails), (session.get(CODE_SESSION_KEY) or "").strip()
+
+
+def _fingerprint(identity) -> str:
+    return hashlib.sha256(repr(identity).encode("utf-8")).hexdigest()[:16]
+
+
+def entitled_categories(user_id, emails, code):
+    """Requête des catégories accordées (None si aucune identité) ; emails en minuscules."""
+    site, external = Q(), Q()
+    if user_id:
+        site |= Q(user_id=user_id)
+    for email in emails:
+        site |= Q(email__lower=email)
+        external |= Q(email__lower=email)
+    if code:
+        external |= Q(claim_code=code)
+    granted = Q()
+    if site:
+        granted |= Exists(DownloadEntitlement.objects.filter(site, category_id=OuterRef("pk")))
+    if external:
+        granted |= Exists(ExternalEntitlement.objects.filter(external, category_id=OuterRef("pk")))
+    if not granted:
+        return None
+    return DownloadCategory.objects.filter(granted)
+
+
+def _resolve(user_id, emails, code) -> set[str]:
+    qs = entitled_categories(user_id, emails, code)
+    if qs is None:
+        return set()
+    return {s.strip().lower() for s in qs.values_list("slug", flat=True)}
+
+
+def entitled_slugs(request) -> frozenset[str]:
+    """Slugs de catégories accessibles pour cette requête (session, puis base)."""
+    memo = getattr(request, "_entitled_slugs", None)
+    if memo is not None:
+        return memo
+
+    identity = _identity(request)
+    fingerprint, stamp = _fingerprint(identity), version()
+    session = getattr(request, "session", None)
+    stored = session.get(SESSION_KEY) if session is not None else None
+    if (
+        stored
+        and stored.get("v") == stamp
+        and stored.get("id") == fingerprint
+        and time.time() - stored.get("at", 0) < SESSION_TTL
+    ):
+        slugs = frozenset(stored["slugs"])
+    else:
+        slugs = frozenset(_resolve(*identity))
+        if session is not None:
+            session[SESSION_KEY] = {
+                "v": stamp, "id": fingerprint, "at": int(time.time()), "slugs": sorted(slugs),
+            }
+    request._entitled_slugs = slugs
+    return slugs
@@ -0,0 +1,77 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from downloads.metadata import describe
+from downloads.models import DownloadableAsset
+
+UPDATE_FIELDS = ["original_name", "size", "mime_type", "sha256", "page_count"]
+
+
+def _describe(asset):
+    """(asset, métadonnées, erreur) — exécuté dans un thread : stockage seulement, pas d'ORM."""
+    try:
+        return asset, describe(asset.file), None
+    except (OSError, NotImplementedError) as exc:
+        return asset, None, exc
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcule taille, type MIME, SHA-256 et nombre de pages des DownloadableAsset "
+        "(lectures en parallèle, écritures groupées). --verify : contrôle d'intégrité seul."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Lectures simultanées")
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--all", action="store_true", help="Recalculer aussi les assets déjà renseignés"
+        )
+        parser.add_argument(
+            "--verify", action="store_true",
+            help="Comparer le SHA-256 enregistré au contenu actuel, sans rien écrire",
+        )
+
+    def handle(self, *args, **opts):
+        qs = DownloadableAsset.objects.exclude(file="").order_by("pk")
+        if opts["verify"]:
+            qs = qs.exclude(sha256="")
+        elif not opts["all"]:
+            qs = qs.filter(sha256="")
+
+        pending, updated, missing, mismatched = [], 0, 0, 0
+        with ThreadPoolExecutor(max_workers=max(1, opts["workers"])) as pool:
+            for asset, meta, error in pool.map(_describe, qs.iterator(chunk_size=500)):
+                if error is not None:
+                    missing += 1
+                    self.stdout.write(
+                        self.style.WARNING(f"#{asset.pk} {asset.file.name} : {error}")
+                    )
+                    continue
+                if opts["verify"]:
+                    if meta["sha256"] != asset.sha256 or meta["size"] != asset.size:
+                        mismatched += 1
+                        self.stdout.write(
+                            self.style.ERROR(f"#{asset.pk} {asset.file.name} : modifié")
+                        )
+                    continue
+                for field, value in meta.items():
+                    setattr(asset, field, value)
+                asset.original_name = asset.original_name or os.path.basename(asset.file.name)
+                pending.append(asset)
+                if len(pending) >= opts["batch_size"]:
+                    updated += DownloadableAsset.objects.bulk_update(pending, UPDATE_FIELDS)
+                    pending = []
+        if pending:
+            updated += DownloadableAsset.objects.bulk_update(pending, UPDATE_FIELDS)
+
+        if opts["verify"]:
+            if mismatched or missing:
+                raise CommandError(f"Intégrité : {mismatched} modifié(s), {missing} illisible(s).")
+            self.stdout.write(self.style.SUCCESS("Intégrité : tous les fichiers sont conformes."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Métadonnées : {updated} asset(s) mis à jour, {missing} illisible(s)."
+            ))
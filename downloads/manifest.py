@@ -0,0 +1,102 @@
+"""
+Manifeste des liens signés envoyés par e-mail (ebook A4/6x9 + catégories acquises).
+
+- Une seule requête : assets publiés « ebook » (titre A4 / 6x9) OU appartenant à une
+  catégorie bonus pour laquelle l'email a un ExternalEntitlement (sous-requête),
+  catégorie jointe.
+- URLs signées en un lot (SignedUrlService.get_signed_urls, réutilisées si encore valides).
+- Résultat mémorisé par email dans le cache tant que ces URLs restent valables (moins
+  une marge) : un renvoi ou un second fulfilment ne touche plus la base.
+- Invalidation (downloads.signals) : changement d'entitlement → clé de l'email ;
+  changement d'asset ou de catégorie → génération globale incrémentée.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
+
+from .models import DownloadableAsset, ExternalEntitlement
+from .services import SignedUrlService
+
+EBOOK_TITLE_REGEX = r"A4|6.?x.?9"
+_VARIANT = re.compile(EBOOK_TITLE_REGEX, re.IGNORECASE)
+EXTRA_SLUGS = ("checklists", "outils-pratiques", "irregularites", "bonus")
+LINK_EXPIRES = 60 * 15
+# Un lien servi depuis le cache reste valable au moins SAFETY_MARGIN secondes.
+SAFETY_MARGIN = 120
+
+CACHE_PREFIX = "links:manifest"
+GENERATION_KEY = f"{CACHE_PREFIX}:gen"
+
+
+def _generation() -> int:
+    return cache.get_or_set(GENERATION_KEY, 1, None) or 1
+
+
+def _key(email: str, generation: int) -> str:
+    digest = hashlib.sha256(email.strip().lower().encode("utf-8")).hexdigest()[:32]
+    return f"{CACHE_PREFIX}:{generation}:{digest}"
+
+
+def invalidate_email(email: str) -> None:
+    cache.delete(_key(email, _generation()))
+
+
+def invalidate_all() -> None:
+    """Les manifestes existants deviennent inaccessibles (et expirent d'eux-mêmes)."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 2, None)
+
+
+def _resolve(email: str, expires: int) -> list[dict]:
+    entitled = ExternalEntitlement.objects.filter(
+        email__lower=email.strip().lower(),
+        category_id=OuterRef("category_id"),
+        category__slug__in=EXTRA_SLUGS,
+    )
+    assets = list(
+        DownloadableAsset.objects.filter(is_published=True)
+        .annotate(entitled=Exists(entitled))
+        .filter(Q(title__iregex=EBOOK_TITLE_REGEX) | Q(entitled=True))
+        .select_related("category")
+        .order_by("category__order", "category_id", "order", "title")
+    )
+
+    # EBOOK A4/6x9 : catégorie « ebook » en priorité, sinon toutes catégories.
+    variants = [a for a in assets if _VARIANT.search(a.title)]
+    ebook = [a for a in variants if a.category.slug == "ebook"] or variants
+    extra = [a for a in assets if a.entitled]
+    urls = SignedUrlService.get_signed_urls(ebook + extra, expires=expires)
+    links = []
+    for asset in sorted(ebook, key=lambda a: a.title):
+        if asset.pk in urls:
+            links.append({"title": asset.title, "url": urls[asset.pk]})
+    # Autres catégories acquises
+    for asset in extra:
+        if asset.pk in urls:
+            links.append(
+                {"title": f"{asset.category.title} — {asset.title}", "url": urls[asset.pk]}
+            )
+    return links
+
+
+def build_link_manifest(email: str, *, expires: int = LINK_EXPIRES) -> list[dict]:
+    """
+    Liens signés [{"title", "url"}] pour `email`, servis depuis le cache tant que
+    les URLs ont encore au moins SAFETY_MARGIN secondes de validité.
+    """
+    key = _key(email, _generation())
+    links = cache.get(key)
+    if links is not None:
+        return links
+    links = _resolve(email, expires)
+    # URLs éventuellement réutilisées (cache de SignedUrlService) : validité minimale garantie.
+    ttl = SignedUrlService.min_validity(expires) - SAFETY_MARGIN
+    if ttl > 0:
+        cache.set(key, links, ttl)
+    return links
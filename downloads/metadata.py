@@ -0,0 +1,104 @@
+"""
+Métadonnées des fichiers téléchargeables (taille, type MIME, SHA-256, pages PDF).
+
+- À l'upload (signal `fill_meta_on_upload`) : le fichier est écrit dans le stockage à
+  travers `_HashingFile`, qui calcule le SHA-256 et la taille au fil de la lecture
+  faite par le stockage ; aucune relecture du fichier écrit.
+- `describe(fieldfile)` : même calcul depuis le stockage, pour la commande
+  `backfill_asset_metadata` (fichiers existants, contrôles d'intégrité).
+- Les listes, e-mails et ETag lisent ensuite les colonnes, jamais le fichier.
+"""
+from __future__ import annotations
+
+import hashlib
+import mimetypes
+import os
+
+from django.core.files import File
+
+try:
+    from PyPDF2 import PdfReader  # type: ignore
+except Exception:
+    PdfReader = None
+
+CHUNK = 64 * 1024
+FIELDS = ("original_name", "size", "mime_type", "sha256", "page_count")
+
+
+class _HashingFile(File):
+    """Fichier dont chaque lecture alimente le SHA-256 ; un retour au début le réinitialise."""
+
+    def __init__(self, file, name=None):
+        super().__init__(file, name)
+        self._reset()
+
+    def _reset(self):
+        self.digest = hashlib.sha256()
+        self.bytes_read = 0
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if offset == 0 and whence == os.SEEK_SET:
+            self._reset()
+        return self.file.seek(offset, whence)
+
+    def read(self, *args):
+        data = self.file.read(*args)
+        self.digest.update(data)
+        self.bytes_read += len(data)
+        return data
+
+
+def guess_mime(name: str, declared: str | None = None) -> str:
+    guessed, _ = mimetypes.guess_type(name)
+    return guessed or declared or "application/octet-stream"
+
+
+def page_count(fileobj, name: str) -> int | None:
+    """Nombre de pages d'un PDF (None si autre format, PyPDF2 absent ou PDF illisible)."""
+    if PdfReader is None or not name.lower().endswith(".pdf"):
+        return None
+    try:
+        fileobj.seek(0)
+        return len(PdfReader(fileobj).pages)
+    except Exception:
+        return None
+    finally:
+        fileobj.seek(0)
+
+
+def store_upload(instance) -> None:
+    """Écrit le fichier uploadé dans le stockage et renseigne ses colonnes au passage."""
+    fieldfile = instance.file
+    upload = fieldfile.file
+    original = os.path.basename(getattr(upload, "name", None) or fieldfile.name)
+    declared = getattr(upload, "content_type", None)
+    pages = page_count(upload, original)
+
+    hashing = _HashingFile(upload, name=original)
+    fieldfile.save(fieldfile.name, hashing, save=False)
+    if hashing.bytes_read != getattr(upload, "size", hashing.bytes_read):
+        # Stockage qui n'a pas lu le fichier depuis le début d'un seul tenant.
+        meta = describe(fieldfile)
+    else:
+        meta = {"size": hashing.bytes_read, "sha256": hashing.digest.hexdigest()}
+    instance.original_name = original[:255]
+    instance.size = meta["size"]
+    instance.sha256 = meta["sha256"]
+    instance.mime_type = guess_mime(original, declared)
+    instance.page_count = pages
+
+
+def describe(fieldfile) -> dict:
+    """Métadonnées d'un fichier déjà stocké, lu une fois par morceaux."""
+    digest, size = hashlib.sha256(), 0
+    with fieldfile.storage.open(fieldfile.name, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK), b""):
+            digest.update(chunk)
+            size += len(chunk)
+        pages = page_count(fh, fieldfile.name)
+    return {
+        "size": size,
+        "sha256": digest.hexdigest(),
+        "mime_type": guess_mime(fieldfile.name),
+        "page_count": pages,
+    }
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:36
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloads", "0011_external_entitlement_imap_fields"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="downloadentitlement",
+            index=models.Index(
+                django.db.models.functions.text.Lower("email"),
+                models.F("category"),
+                name="dlent_email_lower_cat_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="externalentitlement",
+            index=models.Index(
+                django.db.models.functions.text.Lower("email"),
+                models.F("category"),
+                name="extent_email_lower_cat_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloads", "0012_entitlement_email_lower_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DownloadStat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("last_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "asset",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stats",
+                        to="downloads.downloadableasset",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Statistique de téléchargement",
+                "verbose_name_plural": "Statistiques de téléchargement",
+                "ordering": ["-day", "-count"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("asset", "day"), name="downloadstat_asset_day_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
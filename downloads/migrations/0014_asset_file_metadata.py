@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloads", "0013_downloadstat"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="downloadableasset",
+            name="mime_type",
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name="downloadableasset",
+            name="original_name",
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="downloadableasset",
+            name="page_count",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="downloadableasset",
+            name="sha256",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="downloadableasset",
+            name="size",
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
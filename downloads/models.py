@@ -3,6 +3,7 @@ from pathlib import Path
 
 from django.conf import settings
 from django.db import models
+from django.db.models.functions import Lower
 from django.urls import reverse
 
 
@@ -50,6 +51,13 @@ class DownloadableAsset(models.Model):
     is_published = models.BooleanField(default=True)
     order = models.PositiveIntegerField(default=0)
 
+    # Renseignés à l'upload (downloads.metadata) : jamais de stat ni de lecture à la requête.
+    original_name = models.CharField(max_length=255, blank=True, editable=False)
+    size = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    mime_type = models.CharField(max_length=100, blank=True, editable=False)
+    sha256 = models.CharField(max_length=64, blank=True, editable=False)
+    page_count = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -66,6 +74,34 @@ class DownloadableAsset(models.Model):
     def get_download_url(self):
         return reverse("downloads:asset_download", kwargs={"slug": self.slug})
 
+    @property
+    def etag(self) -> str | None:
+        """ETag fort dérivé du SHA-256 enregistré (None tant qu'il n'est pas calculé)."""
+        return f'"{self.sha256[:32]}"' if self.sha256 else None
+
+
+class DownloadStat(models.Model):
+    """
+    Téléchargements agrégés par asset et par jour. Alimenté par lots depuis les
+    compteurs en cache (downloads.stats.flush), jamais dans la requête.
+    """
+
+    asset = models.ForeignKey(DownloadableAsset, related_name="stats", on_delete=models.CASCADE)
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    last_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["asset", "day"], name="downloadstat_asset_day_uniq")
+        ]
+        ordering = ["-day", "-count"]
+        verbose_name = "Statistique de téléchargement"
+        verbose_name_plural = "Statistiques de téléchargement"
+
+    def __str__(self):
+        return f"{self.asset} — {self.day:%Y-%m-%d} : {self.count}"
+
 
 class DownloadEntitlement(models.Model):
     user = models.ForeignKey(
@@ -82,6 +118,10 @@ class DownloadEntitlement(models.Model):
 
     class Meta:
         unique_together = [("email", "category")]
+        indexes = [
+            # Contrôle d'accès : EXISTS(email__lower=… AND category=…), servi par l'index seul.
+            models.Index(Lower("email"), models.F("category"), name="dlent_email_lower_cat_idx"),
+        ]
 
     def __str__(self):
         return f"{self.email} → {self.category.slug} ({self.source})"
@@ -127,6 +167,9 @@ class ExternalEntitlement(models.Model):
 
     class Meta:
         unique_together = [("email", "category", "platform", "order_ref")]
+        indexes = [
+            models.Index(Lower("email"), models.F("category"), name="extent_email_lower_cat_idx"),
+        ]
         verbose_name = "Droit d'accès externe"
         verbose_name_plural = "Droits d'accès externes"
 
@@ -0,0 +1,65 @@
+"""
+Contenu de la page ressources d'une commande (resources_overview), en cache versionné.
+
+- `groups()` : catégories ressources → assets publiés, construits en UNE requête et
+  gardés en cache sous le tampon de version courant. Ni URL ni droit d'accès dedans :
+  la vue les calcule à chaque affichage (signature en lot, session sécurisée).
+- `bump_version()` (downloads.signals) : toute écriture sur un asset ou une catégorie
+  change la clé ; les anciennes entrées expirent d'elles-mêmes. Le même tampon
+  invalide les listes de membres des archives ZIP (downloads.bundle).
+"""
+from __future__ import annotations
+
+from django.core.cache import cache
+
+from .models import DownloadableAsset
+
+# Catégories listées sur la page ressources (l'ebook a sa propre page).
+RESOURCE_SLUGS = ("checklists", "outils-pratiques", "irregularites", "bonus")
+
+CACHE_PREFIX = "downloads:resources"
+VERSION_KEY = f"{CACHE_PREFIX}:version"
+CACHE_TTL = 24 * 3600
+
+
+def version() -> int:
+    return cache.get_or_set(VERSION_KEY, 1, None) or 1
+
+
+def bump_version() -> None:
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+
+
+def _build() -> list[dict]:
+    assets = (
+        DownloadableAsset.objects.filter(category_id__in=RESOURCE_SLUGS, is_published=True)
+        .select_related("category")
+        .order_by("category__order", "category_id", "order", "id")
+    )
+    result, current = [], None
+    for asset in assets:
+        cat = asset.category
+        if current is None or current["slug"] != cat.slug:
+            current = {
+                "slug": cat.slug,
+                "title": cat.title,
+                "subtitle": cat.subtitle,
+                "description": cat.description,
+                "assets": [],
+            }
+            result.append(current)
+        current["assets"].append(asset)
+    return result
+
+
+def groups() -> list[dict]:
+    """[{slug, title, subtitle, description, assets: [DownloadableAsset]}] (cache versionné)."""
+    key = f"{CACHE_PREFIX}:groups:{version()}"
+    found = cache.get(key)
+    if found is None:
+        found = _build()
+        cache.set(key, found, CACHE_TTL)
+    return found
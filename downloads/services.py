@@ -1,5 +1,8 @@
-from django.utils import timezone
-from downloads.models import ExternalEntitlement
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
 
 try:
     from storages.backends.s3boto3 import S3Boto3Storage
@@ -8,31 +11,104 @@ try:
 except Exception:
     HAS_S3 = False
 
-from .models import DownloadableAsset, DownloadEntitlement, DownloadCategory
+from . import stats
+from .entitlements import entitled_slugs
+from .models import DownloadableAsset, DownloadCategory
+
+SIGNED_URL_PREFIX = "signedurl"
+
+
+def _presigned(storage) -> bool:
+    """Stockage dont les URLs sont signées (coûteuses) : seules celles-ci sont mises en cache."""
+    return HAS_S3 and isinstance(storage, S3Boto3Storage)
+
+
+def _reuse_fraction() -> float:
+    return min(max(float(getattr(settings, "SIGNED_URL_REUSE_FRACTION", 0.5)), 0.0), 1.0)
 
 
 class SignedUrlService:
+    """
+    URLs de téléchargement des assets. Sur S3, une URL signée est gardée en cache
+    (clé : asset, stockage, nom de fichier, disposition) et réutilisée tant qu'il lui
+    reste au moins SIGNED_URL_REUSE_FRACTION de la durée demandée : les pages qui
+    listent des dizaines d'assets ne signent plus à chaque affichage.
+    """
+
     @staticmethod
-    def get_signed_url(asset: DownloadableAsset, *, expires=300) -> str:
+    def _disposition(asset: DownloadableAsset) -> str:
+        return f"attachment; filename={asset.file.name.split('/')[-1]}"
+
+    @staticmethod
+    def _sign(asset: DownloadableAsset, expires: int) -> str:
         f = asset.file
         if not f:
             raise ValueError("File missing")
-        if HAS_S3 and isinstance(f.storage, S3Boto3Storage):
+        if _presigned(f.storage):
             return f.storage.url(
                 f.name,
-                parameters={
-                    "ResponseContentDisposition": f"attachment; filename={f.name.split('/')[-1]}"
-                },
+                parameters={"ResponseContentDisposition": SignedUrlService._disposition(asset)},
                 expire=expires,
             )
         return f.url
 
+    @staticmethod
+    def _cache_key(asset: DownloadableAsset) -> str:
+        storage = asset.file.storage
+        ident = "|".join((
+            str(asset.pk),
+            f"{type(storage).__name__}:{getattr(storage, 'bucket_name', '')}",
+            asset.file.name,
+            SignedUrlService._disposition(asset),
+        ))
+        return f"{SIGNED_URL_PREFIX}:{hashlib.sha256(ident.encode('utf-8')).hexdigest()[:32]}"
+
+    @staticmethod
+    def min_validity(expires: int) -> int:
+        """Durée de validité restante garantie (s) d'une URL obtenue pour `expires`."""
+        return int(expires * _reuse_fraction())
+
+    @staticmethod
+    def get_signed_urls(assets, *, expires=300) -> dict[int, str]:
+        """{asset.pk: url} ; les assets sans fichier sont absents du résultat."""
+        urls, keys = {}, {}
+        for asset in assets:
+            if asset.file and _presigned(asset.file.storage):
+                keys[SignedUrlService._cache_key(asset)] = asset
+            elif asset.file:
+                urls[asset.pk] = SignedUrlService._sign(asset, expires)
+        if not keys:
+            return urls
+
+        now = time.time()
+        floor = SignedUrlService.min_validity(expires)
+        fresh = {}
+        for key, entry in cache.get_many(list(keys)).items():
+            url, expires_at = entry
+            if expires_at - now >= floor:
+                urls[keys[key].pk] = url
+                fresh[key] = True
+        signed = {}
+        for key, asset in keys.items():
+            if key not in fresh:
+                url = SignedUrlService._sign(asset, expires)
+                urls[asset.pk] = url
+                signed[key] = (url, now + expires)
+        ttl = expires - floor
+        if signed and ttl > 0:
+            cache.set_many(signed, ttl)
+        return urls
+
+    @staticmethod
+    def get_signed_url(asset: DownloadableAsset, *, expires=300) -> str:
+        if not asset.file:
+            raise ValueError("File missing")
+        return SignedUrlService.get_signed_urls([asset], expires=expires)[asset.pk]
+
     @staticmethod
     def update_analytics(asset: DownloadableAsset, request, kind="DOWNLOAD"):
-        asset.download_count = (asset.download_count or 0) + 1
-        asset.last_download_at = timezone.now()
-        asset.save(update_fields=["download_count", "last_download_at"])
-        # AssetEvent n'existe plus, donc on ne log plus d'événement détaillé ici.
+        # Compteur en cache, reporté dans DownloadStat par flush_download_stats.
+        stats.record(asset.pk)
 
 
 ALWAYS_PROTECTED = {"bonus", "checklists", "outils-pratiques", "irregularites"}
@@ -41,25 +117,13 @@ def user_has_access(request, category: "DownloadCategory") -> bool:
     """
     Phase 1 gate for downloads:
     - If slug in ALWAYS_PROTECTED or category.is_protected: require entitlement
+      (site user/email, external purchase email or claim code — downloads.entitlements)
     - Else public
     """
     slug = (category.slug or "").strip().lower()
-    # 1) Public if not protected and not in ALWAYS_PROTECTED
     if not category.is_protected and slug not in ALWAYS_PROTECTED:
         return True
-
-    # 2) Protected: check entitlement on category
-    user = getattr(request, "user", None)
-    if user and getattr(user, "is_authenticated", False):
-        if DownloadEntitlement.objects.filter(user=user, category=category).exists():
-            return True
-
-    email = (request.session.get("download_claim_email") or "").strip()
-    if email and DownloadEntitlement.objects.filter(email__iexact=email, category=category).exists():
-        return True
-
-    # 3) Deny
-    return False
+    return slug in entitled_slugs(request)
 
 
 def check_site_purchase(email: str, sku: str) -> bool:
@@ -72,7 +136,9 @@ def check_site_purchase(email: str, sku: str) -> bool:
     except Exception:
         return False
     try:
-        q = Order.objects.filter(email=email).filter(status__in=["PAID", "SUCCEEDED", "COMPLETED"])
+        q = Order.objects.filter(
+            email__lower=email.strip().lower(), status__in=["PAID", "SUCCEEDED", "COMPLETED"]
+        )
         if not q.exists():
             return False
         any_with_sku = q.filter(items__sku=sku).exists()
@@ -81,29 +147,11 @@ def check_site_purchase(email: str, sku: str) -> bool:
         return q.filter(sku=sku).exists()
     except Exception:
         return False
-        
-def user_has_access(request, category):
-    # ... existant (tokens, commandes du site, etc.)
-
-    # 1) Email de session (ex: après /claim)
-    email = (getattr(request, "session", {}) or {}).get("claimed_email") or request.user.email if getattr(request, "user", None) and request.user.is_authenticated else None
-
-    if email:
-        # Achats externes importés (CSV)
-        if ExternalEntitlement.objects.filter(email__iexact=email, category=category).exists():
-            return True
 
-    # 2) Code de claim (fallback si la plateforme ne donne pas l’email)
-    code = request.session.get("claim_code")
-    if code and ExternalEntitlement.objects.filter(claim_code=code, category=category).exists():
-        return True
 
-    # ... reste de ta logique existante ...
-    return False
 def _filesize_display(asset: DownloadableAsset) -> str | None:
-    try:
-        size = asset.file.size
-    except Exception:
+    size = asset.size  # colonne renseignée à l'upload : pas d'appel au stockage
+    if size is None:
         return None
     units = ["B", "KB", "MB", "GB"]
     i = 0
@@ -0,0 +1,122 @@
+"""
+Statistiques de téléchargement sans écriture en base dans la requête.
+
+- `record(asset_id)` : incrémente le compteur `dlstat:<jour>:<asset>` du cache (O(1))
+  et note l'heure du dernier téléchargement.
+- `flush()` (tâche `flush_download_stats`, Celery Beat) : lit d'un coup (get_many) les
+  compteurs des derniers jours de tous les assets, les reporte dans DownloadStat
+  (F("count") + n pour les lignes existantes, bulk_create pour les autres), puis les
+  décrémente de la valeur reportée : les hits arrivés entre-temps restent en cache
+  pour le passage suivant.
+- Cache inutilisable (DummyCache) : écriture directe en base, rien n'est perdu.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DownloadableAsset, DownloadStat
+
+PREFIX = "dlstat"
+COUNTER_TTL = 3 * 24 * 3600
+FLUSH_DAYS = 2
+FLUSH_LOCK_KEY = f"{PREFIX}:flush:lock"
+FLUSH_LOCK_TIMEOUT = 300
+
+
+def _key(day, asset_id: int) -> str:
+    return f"{PREFIX}:{day:%Y%m%d}:{asset_id}"
+
+
+def _last_key(day, asset_id: int) -> str:
+    return f"{PREFIX}:last:{day:%Y%m%d}:{asset_id}"
+
+
+def record(asset_id: int, *, now: datetime | None = None) -> None:
+    """Compte un téléchargement de l'asset (cache seulement)."""
+    now = now or timezone.now()
+    day = timezone.localdate(now)
+    key = _key(day, asset_id)
+    cache.add(key, 0, COUNTER_TTL)
+    try:
+        cache.incr(key)
+    except ValueError:
+        _apply({(asset_id, day): (1, now)})
+        return
+    cache.set(_last_key(day, asset_id), now.timestamp(), COUNTER_TTL)
+
+
+def record_response(request, asset_id: int, response) -> None:
+    """
+    Compte un téléchargement servi : réponse complète, ou premier segment d'une
+    reprise (Range depuis l'octet 0). Les 304, HEAD et segments suivants ne comptent pas.
+    """
+    if request.method != "GET":
+        return
+    status = response.status_code
+    first_part = response.get("Content-Range", "").startswith("bytes 0-")
+    if status == 200 or (status == 206 and first_part):
+        record(asset_id)
+
+
+def _apply(pending: dict) -> None:
+    """{(asset_id, jour): (n, dernier_hit)} → DownloadStat, en une transaction."""
+    if not pending:
+        return
+    with transaction.atomic():
+        existing = set(
+            DownloadStat.objects.filter(
+                asset_id__in={pk for pk, _ in pending}, day__in={day for _, day in pending}
+            ).values_list("asset_id", "day")
+        )
+        new = []
+        for (pk, day), (n, last_at) in pending.items():
+            if (pk, day) in existing:
+                changes = {"count": F("count") + n}
+                if last_at:
+                    changes["last_at"] = last_at
+                DownloadStat.objects.filter(asset_id=pk, day=day).update(**changes)
+            else:
+                new.append(DownloadStat(asset_id=pk, day=day, count=n, last_at=last_at))
+        DownloadStat.objects.bulk_create(new)
+
+
+def flush(days: int = FLUSH_DAYS) -> int | None:
+    """
+    Reporte les compteurs en base ; retourne le nombre de téléchargements reportés,
+    None si un autre flush est en cours.
+    """
+    if not cache.add(FLUSH_LOCK_KEY, 1, FLUSH_LOCK_TIMEOUT):
+        return None
+    try:
+        today = timezone.localdate()
+        asset_ids = list(DownloadableAsset.objects.values_list("pk", flat=True))
+        slots = {
+            _key(day, pk): (pk, day)
+            for day in (today - timedelta(days=d) for d in range(days))
+            for pk in asset_ids
+        }
+        counts = {k: n for k, n in cache.get_many(list(slots)).items() if n}
+        if not counts:
+            return 0
+        lasts = cache.get_many([_last_key(day, pk) for pk, day in map(slots.get, counts)])
+
+        pending = {}
+        for key, n in counts.items():
+            pk, day = slots[key]
+            ts = lasts.get(_last_key(day, pk))
+            last_at = datetime.fromtimestamp(ts, tz=dt_timezone.utc) if ts else None
+            pending[(pk, day)] = (n, last_at)
+        _apply(pending)
+        for key, n in counts.items():
+            try:
+                cache.decr(key, n)
+            except ValueError:
+                pass  # expiré entre-temps : rien à recompter
+        return sum(counts.values())
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
@@ -1,6 +1,7 @@
 import pytest
 
 from downloads.models import DownloadCategory
+from store.models import Order, Product
 
 
 @pytest.fixture
@@ -15,3 +16,24 @@ def cat_bonus(db):
     return DownloadCategory.objects.create(
         slug="bonus", title="Bonus", page_path="/bonus", is_protected=True, required_sku="EBOOK_ASP"
     )
+
+
+@pytest.fixture
+def order(db, settings, tmp_path):
+    """Commande payée, fichiers dans des racines temporaires."""
+    settings.MEDIA_ROOT = str(tmp_path / "media")
+    settings.PRIVATE_MEDIA_ROOT = str(tmp_path / "private")
+    product = Product.objects.create(slug="asp", title="Audit Sans Peur", price_fcfa=15000)
+    return Order.objects.create(
+        product=product, email="buyer@example.com", amount_fcfa=15000, status="PAID"
+    )
+
+
+@pytest.fixture
+def buyer(client, order):
+    """Client dont la session sécurisée couvre `order` (pages ressources)."""
+    session = client.session
+    session["order_email"] = order.email
+    session["paid_orders"] = [str(order.uuid)]
+    session.save()
+    return client
@@ -0,0 +1,79 @@
+import hashlib
+import io
+
+import pytest
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+
+from downloads.models import DownloadableAsset
+from downloads.services import _filesize_display
+
+
+def _pdf(pages=2) -> bytes:
+    PyPDF2 = pytest.importorskip("PyPDF2")
+    writer = PyPDF2.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=595, height=842)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+@pytest.fixture
+def media(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+def _asset(cat, name, content, slug="guide"):
+    return DownloadableAsset.objects.create(
+        category=cat, slug=slug, title=slug, file=SimpleUploadedFile(name, content)
+    )
+
+
+@pytest.mark.django_db
+def test_upload_records_metadata_in_one_pass(cat_bonus, media):
+    body = _pdf(pages=3)
+    asset = _asset(cat_bonus, "Guide été.pdf", body)
+    asset.refresh_from_db()
+    assert asset.original_name == "Guide été.pdf"
+    assert asset.size == len(body)
+    assert asset.sha256 == hashlib.sha256(body).hexdigest()
+    assert asset.mime_type == "application/pdf"
+    assert asset.page_count == 3
+    assert asset.file.read() == body
+
+    other = _asset(cat_bonus, "notes.txt", b"abc", slug="notes")
+    assert (other.mime_type, other.page_count, other.size) == ("text/plain", None, 3)
+
+
+@pytest.mark.django_db
+def test_listing_and_etag_never_touch_the_storage(cat_bonus, media, client, monkeypatch):
+    asset = _asset(cat_bonus, "guide.pdf", b"%PDF-1.4 " + b"x" * 2000)
+
+    def forbidden(*args, **kwargs):
+        raise AssertionError("appel au stockage")
+
+    monkeypatch.setattr(FileSystemStorage, "size", forbidden)
+    assert _filesize_display(asset) == "2.0 KB"
+    resp = client.get(reverse("downloads:asset", args=[asset.pk]))
+    assert resp["ETag"] == f'"{asset.sha256[:32]}"'
+    b"".join(resp.streaming_content)
+
+
+@pytest.mark.django_db
+def test_backfill_then_verify(cat_bonus, media):
+    asset = _asset(cat_bonus, "guide.pdf", b"%PDF-1.4 contenu")
+    expected = asset.sha256
+    DownloadableAsset.objects.update(size=None, sha256="", mime_type="", page_count=None)
+
+    call_command("backfill_asset_metadata", workers=2)
+    asset.refresh_from_db()
+    assert (asset.sha256, asset.size, asset.mime_type) == (expected, 16, "application/pdf")
+    call_command("backfill_asset_metadata", verify=True)
+
+    (media / asset.file.name).write_bytes(b"%PDF-1.4 altere")
+    with pytest.raises(CommandError):
+        call_command("backfill_asset_metadata", verify=True)
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django.utils import timezone
+
+from downloads import stats
+from downloads.models import DownloadableAsset, DownloadStat
+
+
+@pytest.fixture
+def asset(cat_bonus, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return DownloadableAsset.objects.create(
+        category=cat_bonus, slug="guide", title="Guide",
+        file=SimpleUploadedFile("guide.pdf", b"%PDF-1.4 contenu"),
+    )
+
+
+@pytest.mark.django_db
+def test_hits_stay_in_cache_until_flush(asset, locmem_cache, django_assert_num_queries):
+    with django_assert_num_queries(0):
+        for _ in range(3):
+            stats.record(asset.pk)
+    assert not DownloadStat.objects.exists()
+
+    assert stats.flush() == 3
+    row = DownloadStat.objects.get(asset=asset)
+    assert (row.day, row.count) == (timezone.localdate(), 3)
+    assert row.last_at is not None
+
+    stats.record(asset.pk)
+    stats.record(asset.pk, now=timezone.now() - timedelta(days=1))
+    assert stats.flush() == 2
+    assert dict(DownloadStat.objects.values_list("day", "count")) == {
+        timezone.localdate(): 4,
+        timezone.localdate() - timedelta(days=1): 1,
+    }
+    assert stats.flush() == 0
+
+
+@pytest.mark.django_db
+def test_concurrent_flush_is_skipped(asset, locmem_cache):
+    stats.record(asset.pk)
+    cache.add(stats.FLUSH_LOCK_KEY, 1)
+    assert stats.flush() is None
+    cache.delete(stats.FLUSH_LOCK_KEY)
+    assert stats.flush() == 1
+
+
+@pytest.mark.django_db
+def test_without_shared_cache_hits_go_to_the_database(asset):
+    stats.record(asset.pk)
+    stats.record(asset.pk)
+    assert DownloadStat.objects.get(asset=asset).count == 2
+
+
+@pytest.mark.django_db
+def test_only_full_downloads_are_counted(asset, client, locmem_cache):
+    url = reverse("downloads:asset", args=[asset.pk])
+    for headers in ({}, {"Range": "bytes=0-3"}, {"Range": "bytes=4-"}):
+        b"".join(client.get(url, headers=headers).streaming_content)
+    client.head(url)
+    stats.flush()
+    assert DownloadStat.objects.get(asset=asset).count == 2
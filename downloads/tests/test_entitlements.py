@@ -0,0 +1,78 @@
+import pytest
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory
+
+from downloads import entitlements
+from downloads.models import DownloadEntitlement, ExternalEntitlement
+from downloads.services import user_has_access
+
+
+def _request(**session):
+    request = RequestFactory().get("/")
+    request.user = AnonymousUser()
+    request.session = SessionStore()
+    request.session.update(session)
+    return request
+
+
+def _next(request):
+    """Requête suivante de la même session (sans le mémo par requête)."""
+    return _request(**dict(request.session.items()))
+
+
+@pytest.mark.django_db
+def test_gate_is_a_set_lookup_after_first_resolution(
+    cat_bonus, cat_checklists, locmem_cache, django_assert_num_queries
+):
+    ExternalEntitlement.objects.create(email="Buyer@Example.com", category=cat_bonus)
+    request = _request(claimed_email="buyer@example.com")
+    with django_assert_num_queries(1):
+        assert user_has_access(request, cat_bonus)
+        assert not user_has_access(request, cat_checklists)
+    with django_assert_num_queries(0):
+        assert user_has_access(_next(request), cat_bonus)
+
+
+@pytest.mark.django_db
+def test_all_claim_sources_are_resolved(cat_bonus, cat_checklists, django_user_model):
+    user = django_user_model.objects.create_user(username="u", email="u@example.com")
+    DownloadEntitlement.objects.create(user=user, email="autre@example.com", category=cat_bonus)
+    ExternalEntitlement.objects.create(
+        email="x@example.com", category=cat_checklists, claim_code="CODE42"
+    )
+    request = _request()
+    request.user = user
+    assert entitlements.entitled_slugs(request) == {"bonus"}
+    assert entitlements.entitled_slugs(_request(claim_code="CODE42")) == {"checklists"}
+    assert entitlements.entitled_slugs(_request(download_claim_email="autre@example.com")) == {
+        "bonus"
+    }
+    assert entitlements.entitled_slugs(_request()) == frozenset()
+
+
+@pytest.mark.django_db
+def test_new_entitlement_bumps_the_stamp(cat_bonus, locmem_cache):
+    request = _request(claimed_email="buyer@example.com")
+    assert not user_has_access(request, cat_bonus)
+    ExternalEntitlement.objects.create(email="buyer@example.com", category=cat_bonus)
+    assert user_has_access(_next(request), cat_bonus)
+
+
+@pytest.mark.django_db
+def test_identity_change_recomputes(cat_bonus, locmem_cache):
+    ExternalEntitlement.objects.create(email="b@example.com", category=cat_bonus)
+    request = _request(claimed_email="a@example.com")
+    assert not user_has_access(request, cat_bonus)
+    following = _next(request)
+    following.session["claimed_email"] = "b@example.com"
+    assert user_has_access(following, cat_bonus)
+
+
+@pytest.mark.django_db
+def test_public_category_needs_no_lookup(db, django_assert_num_queries):
+    from downloads.models import DownloadCategory
+
+    public = DownloadCategory.objects.create(slug="ebook", title="Ebook", page_path="/ebook")
+    with django_assert_num_queries(0):
+        assert user_has_access(_request(), public)
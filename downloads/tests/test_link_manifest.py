@@ -0,0 +1,70 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from downloads import manifest
+from downloads.models import DownloadableAsset, DownloadCategory, ExternalEntitlement
+
+EMAIL = "buyer@example.com"
+
+
+@pytest.fixture(autouse=True)
+def media(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+
+
+def _pdf(slug):
+    return SimpleUploadedFile(f"{slug}.pdf", b"%PDF-1.4", content_type="application/pdf")
+
+
+@pytest.fixture
+def catalog(db, cat_bonus, cat_checklists):
+    ebook = DownloadCategory.objects.create(slug="ebook", title="Ebook", page_path="/ebook")
+    for slug, title, cat in [
+        ("a4", "PDF A4", ebook),
+        ("x69", "PDF 6x9", ebook),
+        ("bonus-1", "Guide", cat_bonus),
+        ("check-1", "Checklist", cat_checklists),
+    ]:
+        DownloadableAsset.objects.create(
+            category=cat, slug=slug, title=title, file=_pdf(slug)
+        )
+    DownloadableAsset.objects.create(
+        category=cat_bonus, slug="draft", title="Brouillon", file=_pdf("d"),
+        is_published=False,
+    )
+    ExternalEntitlement.objects.create(email=EMAIL, category=cat_bonus, platform="site")
+    return ebook
+
+
+def _titles(links):
+    return [link["title"] for link in links]
+
+
+@pytest.mark.django_db
+def test_manifest_is_one_query_then_cached(catalog, locmem_cache, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        links = manifest.build_link_manifest("Buyer@Example.com")
+    assert _titles(links) == ["PDF 6x9", "PDF A4", "Bonus — Guide"]
+    assert all(link["url"] for link in links)
+    with django_assert_num_queries(0):
+        assert manifest.build_link_manifest(EMAIL) == links
+
+
+@pytest.mark.django_db
+def test_variants_outside_ebook_category_are_a_fallback(cat_checklists):
+    DownloadableAsset.objects.create(
+        category=cat_checklists, slug="a4", title="Version A4", file=_pdf("a4")
+    )
+    assert _titles(manifest.build_link_manifest(EMAIL)) == ["Version A4"]
+
+
+@pytest.mark.django_db
+def test_entitlement_and_asset_changes_invalidate(catalog, cat_checklists, locmem_cache):
+    assert "Checklists — Checklist" not in _titles(manifest.build_link_manifest(EMAIL))
+    ExternalEntitlement.objects.create(email=EMAIL, category=cat_checklists, platform="site")
+    assert "Checklists — Checklist" in _titles(manifest.build_link_manifest(EMAIL))
+
+    asset = DownloadableAsset.objects.get(slug="bonus-1")
+    asset.title = "Guide v2"
+    asset.save()
+    assert "Bonus — Guide v2" in _titles(manifest.build_link_manifest(EMAIL))
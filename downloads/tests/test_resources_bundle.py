@@ -0,0 +1,75 @@
+import io
+import zipfile
+from pathlib import Path
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+from downloads.models import DownloadableAsset, DownloadCategory
+
+
+def _asset(category, slug, name, content):
+    return DownloadableAsset.objects.create(
+        category=category, slug=slug, title=slug, file=SimpleUploadedFile(name, content)
+    )
+
+
+def _archive(resp) -> zipfile.ZipFile:
+    assert resp.status_code == 200
+    assert resp["Content-Type"] == "application/zip"
+    return zipfile.ZipFile(io.BytesIO(b"".join(resp.streaming_content)))
+
+
+@pytest.mark.django_db
+def test_bundle_streams_every_resource(buyer, order, settings, locmem_cache):
+    checklists = DownloadCategory.objects.create(
+        slug="checklists", title="Checklists", page_path="/checklists"
+    )
+    outils = DownloadCategory.objects.create(
+        slug="outils-pratiques", title="Outils", page_path="/outils"
+    )
+    ebook = DownloadCategory.objects.create(slug="ebook", title="Ebook", page_path="/ebook")
+    pdf = _asset(checklists, "c1", "liste.pdf", b"%PDF-1.4 " + b"x" * 5000)
+    _asset(outils, "o1", "notes.txt", b"ligne\n" * 1000)
+    _asset(outils, "o2", "plan.txt", b"autre")
+    _asset(ebook, "e1", "ebook.pdf", b"%PDF ebook")
+    private = Path(settings.PRIVATE_MEDIA_ROOT) / pdf.file.name
+    private.parent.mkdir(parents=True)
+    private.write_bytes(b"%PDF-1.4 copie privee")
+
+    url = reverse("downloads:resources_zip", args=[order.uuid])
+    archive = _archive(buyer.get(url))
+    infos = {i.filename: i for i in archive.infolist()}
+    assert set(infos) == {"Checklists/liste.pdf", "Outils/notes.txt", "Outils/plan.txt"}
+    assert archive.read("Checklists/liste.pdf") == b"%PDF-1.4 copie privee"
+    assert infos["Checklists/liste.pdf"].compress_type == zipfile.ZIP_STORED
+    assert infos["Outils/notes.txt"].compress_type == zipfile.ZIP_DEFLATED
+    assert archive.read("Outils/notes.txt") == b"ligne\n" * 1000
+    assert archive.testzip() is None
+
+    only = _archive(buyer.get(url, {"categorie": "outils-pratiques"}))
+    assert only.namelist() == ["Outils/notes.txt", "Outils/plan.txt"]
+
+
+@pytest.mark.django_db
+def test_entry_list_is_cached_until_catalog_changes(
+    buyer, order, locmem_cache, django_assert_num_queries
+):
+    checklists = DownloadCategory.objects.create(
+        slug="checklists", title="Checklists", page_path="/checklists"
+    )
+    _asset(checklists, "c1", "a.pdf", b"%PDF a")
+    url = reverse("downloads:resources_zip", args=[order.uuid])
+    _archive(buyer.get(url))
+    with django_assert_num_queries(2):  # session + commande
+        assert _archive(buyer.get(url)).namelist() == ["Checklists/a.pdf"]
+
+    _asset(checklists, "c2", "b.pdf", b"%PDF b")
+    assert len(_archive(buyer.get(url)).namelist()) == 2
+
+
+@pytest.mark.django_db
+def test_bundle_requires_the_secure_session(client, order):
+    url = reverse("downloads:resources_zip", args=[order.uuid])
+    assert client.get(url).status_code == 403
@@ -0,0 +1,68 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.urls import reverse
+
+from downloads import views
+from downloads.models import DownloadableAsset
+
+
+@pytest.fixture
+def page(buyer, order, monkeypatch):
+    """Contexte de la page ressources (base.html n'est pas rendu ici : on garde le contexte)."""
+    url = reverse("downloads:resources", args=[order.uuid])
+    seen = []
+
+    def render(request, template, ctx):
+        seen.append(ctx)
+        return HttpResponse()
+
+    monkeypatch.setattr(views, "render", render)
+
+    def get():
+        assert buyer.get(url).status_code == 200
+        return seen[-1]
+
+    return get
+
+
+def _asset(category, slug):
+    return DownloadableAsset.objects.create(
+        category=category, slug=slug, title=slug.title(),
+        file=SimpleUploadedFile(f"{slug}.pdf", b"%PDF-1.4"),
+    )
+
+
+def _titles(ctx):
+    return [[item["title"] for item in g["items"]] for g in ctx["groups"]]
+
+
+@pytest.mark.django_db
+def test_page_cost_does_not_grow_with_the_catalog(
+    page, cat_checklists, cat_bonus, locmem_cache, django_assert_num_queries
+):
+    for i in range(12):
+        _asset(cat_checklists if i % 2 else cat_bonus, f"asset-{i}")
+    page()
+    with django_assert_num_queries(2):  # session + commande
+        ctx = page()
+    assert [g["slug"] for g in ctx["groups"]] == ["bonus", "checklists"]
+    assert sum(len(t) for t in _titles(ctx)) == 12
+    assert ctx["groups"][0]["items"][0]["url"].endswith(".pdf")
+
+
+@pytest.mark.django_db
+def test_catalog_changes_are_visible_on_next_view(page, cat_checklists, locmem_cache):
+    first = _asset(cat_checklists, "premier")
+    assert _titles(page()) == [["Premier"]]
+
+    second = _asset(cat_checklists, "second")
+    assert _titles(page()) == [["Premier", "Second"]]
+    second.delete()
+    assert _titles(page()) == [["Premier"]]
+    cat_checklists.title = "Listes"
+    cat_checklists.save()
+    assert page()["groups"][0]["title"] == "Listes"
+    first.is_published = False
+    first.save()
+    assert _titles(page()) == []
@@ -0,0 +1,76 @@
+import pytest
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from downloads import services
+from downloads.models import DownloadableAsset
+from downloads.services import SignedUrlService
+
+
+@pytest.fixture
+def assets(cat_bonus, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return [
+        DownloadableAsset.objects.create(
+            category=cat_bonus, slug=f"a{i}", title=f"A{i}",
+            file=SimpleUploadedFile(f"a{i}.pdf", b"%PDF-1.4"),
+        )
+        for i in range(3)
+    ]
+
+
+@pytest.fixture
+def s3(monkeypatch, locmem_cache):
+    """Stockage « signé » simulé : compte les signatures, horloge contrôlée."""
+    calls, clock = [], [1_000_000.0]
+
+    def sign(asset, expires):
+        calls.append(asset.pk)
+        return f"https://bucket/{asset.file.name}?exp={clock[0] + expires:.0f}"
+
+    monkeypatch.setattr(services, "_presigned", lambda storage: True)
+    monkeypatch.setattr(SignedUrlService, "_sign", staticmethod(sign))
+    monkeypatch.setattr(services.time, "time", lambda: clock[0])
+    return calls, clock
+
+
+@pytest.mark.django_db
+def test_batch_signs_once_then_reuses(assets, s3):
+    calls, _ = s3
+    first = SignedUrlService.get_signed_urls(assets, expires=900)
+    assert sorted(first) == sorted(a.pk for a in assets) and len(calls) == 3
+    assert SignedUrlService.get_signed_urls(assets, expires=900) == first
+    assert SignedUrlService.get_signed_url(assets[0], expires=900) == first[assets[0].pk]
+    assert len(calls) == 3
+
+
+@pytest.mark.django_db
+def test_url_is_resigned_once_too_little_lifetime_remains(assets, s3, settings):
+    calls, clock = s3
+    settings.SIGNED_URL_REUSE_FRACTION = 0.5
+    url = SignedUrlService.get_signed_url(assets[0], expires=900)
+    clock[0] += 400
+    assert SignedUrlService.get_signed_url(assets[0], expires=900) == url
+    clock[0] += 100  # 400 s restantes < 450
+    assert SignedUrlService.get_signed_url(assets[0], expires=900) != url
+    assert len(calls) == 2
+    # Une durée demandée plus longue n'accepte pas une URL trop courte.
+    SignedUrlService.get_signed_url(assets[0], expires=3600)
+    assert len(calls) == 3
+
+
+@pytest.mark.django_db
+def test_new_file_gets_a_new_url(assets, s3):
+    calls, _ = s3
+    SignedUrlService.get_signed_url(assets[0])
+    assets[0].file = SimpleUploadedFile("a0.pdf", b"%PDF-1.5")
+    assets[0].save()
+    SignedUrlService.get_signed_url(assets[0])
+    assert len(calls) == 2
+
+
+@pytest.mark.django_db
+def test_local_storage_is_not_cached(assets, locmem_cache):
+    urls = SignedUrlService.get_signed_urls(assets)
+    assert urls[assets[0].pk] == assets[0].file.url
+    assert cache.get(SignedUrlService._cache_key(assets[0])) is None
@@ -27,4 +27,9 @@ urlpatterns = [
         views.resources_overview,
         name="resources",
     ),
+    path(
+        "resources/<uuid:order_uuid>/zip/",
+        views.resources_bundle,
+        name="resources_zip",
+    ),
 ]
@@ -4,14 +4,22 @@ from django import forms
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
 from django.db.models import Q
-from django.http import FileResponse, HttpRequest, HttpResponse, HttpResponseForbidden
+from django.http import (
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    HttpResponseForbidden,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils.text import slugify
 from django.urls import reverse
+from django.utils.http import content_disposition_header
 from django.views.decorators.http import require_http_methods
 
-from store.models import DownloadToken, Order
+from store.models import Order
 
+from . import bundle, resources, stats
 from .models import (
     DownloadableAsset,
     DownloadCategory,
@@ -20,6 +28,8 @@ from .models import (
 )
 from .services import SignedUrlService, check_site_purchase, user_has_access
 from store.services.mailing import send_fulfilment_email
+from store.utils.delivery import serve_file
+from store.utils.tokens import resolve_order_token
 
 
 class DownloadableAssetForm(forms.ModelForm):
@@ -58,15 +68,17 @@ def asset_upload(request: HttpRequest) -> HttpResponse:
     return render(request, "downloads/asset_upload.html", {"form": form})
 
 
-def asset_download(request: HttpRequest, slug: str) -> FileResponse:
+def asset_download(request: HttpRequest, slug: str) -> HttpResponse:
     """
     Téléchargement direct par slug (/downloads/<slug>/).
     Conserver votre version si elle existe déjà.
     """
     asset = get_object_or_404(DownloadableAsset, slug=slug, is_published=True)
-    file_handle = asset.file.open("rb")
-    filename = os.path.basename(asset.file.name)
-    return FileResponse(file_handle, as_attachment=True, filename=filename)
+    response = serve_file(
+        asset.file, request=request, filename=os.path.basename(asset.file.name), etag=asset.etag
+    )
+    stats.record_response(request, asset.pk, response)
+    return response
 
 
 def category_page(request, slug):
@@ -125,10 +137,10 @@ def secure_downloads(request: HttpRequest, order_uuid=None, token=None) -> HttpR
     Accès par UUID (session) ou par token (partage).
     """
     if token:
-        dt = DownloadToken.objects.filter(token=token).select_related("order").first()
-        if not dt or not dt.is_valid():
+        order_id = resolve_order_token(token)
+        order = Order.objects.filter(pk=order_id).first() if order_id else None
+        if order is None:
             return HttpResponse("Lien de téléchargement invalide ou expiré.", status=410)
-        order = dt.order
     elif order_uuid:
         order = get_object_or_404(Order, pk=order_uuid)
         if order.status != "PAID":
@@ -146,12 +158,15 @@ def secure_downloads(request: HttpRequest, order_uuid=None, token=None) -> HttpR
         category__slug="ebook", is_published=True, title__iregex=r"A4|6.?x.?9"
     )
 
-    asset_links = []
-    for asset in assets:
-        signed = SignedUrlService.get_signed_url(asset, expires=900)
-        asset_links.append(
-            {"title": asset.title, "extension": asset.extension, "signed_url": signed}
-        )
+    urls = SignedUrlService.get_signed_urls(assets, expires=900)
+    asset_links = [
+        {
+            "title": asset.title,
+            "extension": asset.extension,
+            "signed_url": urls.get(asset.pk) or asset.get_download_url(),
+        }
+        for asset in assets
+    ]
 
     ctx = {"order": order, "asset_links": asset_links}
     return render(request, "downloads/secure_downloads.html", ctx)
@@ -201,8 +216,7 @@ def download_secure_with_token_view(request, order_uuid, token):
     if order.status != "PAID":
         return HttpResponseForbidden("Commande non payée.")
 
-    dt = get_object_or_404(DownloadToken, order=order, token=token)
-    if not dt.is_valid():
+    if resolve_order_token(token) != order.pk:
         return HttpResponseForbidden("Lien expiré.")
 
     assets = _get_two_assets_for_product(order.product)
@@ -233,7 +247,7 @@ def resend_fulfilment_email(request, order_uuid):
 
     try:
         # Utilise l'UUID comme référence; le service retrouvera l'URL ressources et le lien bonus
-        send_fulfilment_email(to_email=order.email, order_ref=str(order.uuid))
+        send_fulfilment_email(to_email=order.email, order_ref=str(order.uuid), dedup=False)
         messages.success(request, "Les liens de téléchargement ont été renvoyés à votre adresse email.")
     except Exception as e:
         messages.error(request, f"Erreur lors de l'envoi de l'email: {e}")
@@ -242,17 +256,17 @@ def resend_fulfilment_email(request, order_uuid):
 
 def asset_serve_view(request, asset_id):
     asset = get_object_or_404(DownloadableAsset, pk=asset_id, is_published=True)
-    filename = os.path.basename(asset.file.name)
-    return FileResponse(asset.file.open("rb"), as_attachment=True, filename=filename)
+    response = serve_file(
+        asset.file, request=request, filename=os.path.basename(asset.file.name), etag=asset.etag
+    )
+    stats.record_response(request, asset.pk, response)
+    return response
 
-def resources_overview(request, order_uuid):
-    """
-    Page unique listant toutes les ressources (hors ebook) groupées par catégorie,
-    accessible après paiement via la session sécurisée (mêmes gardes que la page secure).
-    """
+def _resources_order(request, order_uuid):
+    """(commande, None) si la session sécurisée couvre cette commande payée, sinon (None, 403)."""
     order = get_object_or_404(Order, uuid=order_uuid)
     if order.status != "PAID":
-        return HttpResponseForbidden("Commande non payée.")
+        return None, HttpResponseForbidden("Commande non payée.")
     session_email = request.session.get("order_email")
     paid_orders = set(request.session.get("paid_orders", []))
     valid_session = (
@@ -261,51 +275,68 @@ def resources_overview(request, order_uuid):
         and str(order.uuid) in paid_orders
     )
     if not valid_session:
-        return HttpResponseForbidden("Accès refusé.")
-    # Récupère uniquement les catégories “ressources” (exclut ebooks)
-    allowed_slugs = ("checklists", "outils-pratiques", "irregularites", "bonus")
-    categories = (
-        DownloadCategory.objects.filter(slug__in=allowed_slugs)
-        .order_by("order", "slug")
+        return None, HttpResponseForbidden("Accès refusé.")
+    return order, None
+
+
+def resources_overview(request, order_uuid):
+    """
+    Page unique listant toutes les ressources (hors ebook) groupées par catégorie,
+    accessible après paiement via la session sécurisée (mêmes gardes que la page secure).
+    """
+    order, denied = _resources_order(request, order_uuid)
+    if denied:
+        return denied
+    # Structure en cache versionné (downloads.resources) ; seules les URLs sont calculées ici.
+    cached = resources.groups()
+    urls = SignedUrlService.get_signed_urls(
+        [a for group in cached for a in group["assets"]], expires=900
     )
-    data = []
-    for cat in categories:
-        if (cat.slug or "").lower() == "ebook":
-            continue
-        assets = (
-            DownloadableAsset.objects.filter(category=cat, is_published=True).order_by(
-                "order", "id"
-            )
-        )
-        if not assets.exists():
-            continue
-        items = []
-        for a in assets:
-            try:
-                signed = SignedUrlService.get_signed_url(a, expires=900)
-            except Exception:
-                signed = a.get_download_url()
-            items.append(
+    data = [
+        {
+            "slug": group["slug"],
+            "title": group["title"],
+            "subtitle": group["subtitle"],
+            "description": group["description"],
+            "items": [
                 {
                     "id": a.id,
                     "title": a.title,
                     "short_desc": a.short_desc,
                     "extension": a.extension,
-                    "url": signed,
+                    "url": urls.get(a.pk) or a.get_download_url(),
                 }
-            )
-        data.append(
-            {
-                "slug": cat.slug,
-                "title": cat.title,
-                "subtitle": cat.subtitle,
-                "description": cat.description,
-                "items": items,
-            }
-        )
+                for a in group["assets"]
+            ],
+        }
+        for group in cached
+    ]
     ctx = {"order": order, "groups": data}
     return render(request, "downloads/resources_overview.html", ctx)
 
+
+def resources_bundle(request, order_uuid):
+    """
+    Toutes les ressources de la page ci-dessus en une archive ZIP produite à la volée
+    (downloads.bundle) ; `?categorie=<slug>` restreint à une catégorie.
+    """
+    order, denied = _resources_order(request, order_uuid)
+    if denied:
+        return denied
+    wanted = request.GET.getlist("categorie")
+    slugs = [s for s in resources.RESOURCE_SLUGS if not wanted or s in wanted]
+    entries = bundle.members(slugs)
+    if not entries:
+        raise Http404("Aucune ressource disponible.")
+    suffix = f"-{slugs[0]}" if wanted and len(slugs) == 1 else ""
+    response = StreamingHttpResponse(bundle.stream(entries), content_type="application/zip")
+    response["Content-Disposition"] = content_disposition_header(
+        True, f"ressources{suffix}-{order.uuid.hex[:8]}.zip"
+    )
+    response["Cache-Control"] = "private, no-store"
+    response["X-Accel-Buffering"] = "no"  # nginx : transmettre au fil de l'eau
+    return response
+
 from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib import messages
@@ -330,14 +361,14 @@ def kit_preparation_start(request):
             # Vérifier si l'entitlement existe
             exists = ExternalEntitlement.objects.filter(
                 order_ref__iexact=order_ref,
-                email__iexact=email,
+                email__lower=email,
                 category__slug="ebook",
             ).exists()
 
             # Debug: Afficher les entitlements trouvés
             all_matching = ExternalEntitlement.objects.filter(
                 order_ref__iexact=order_ref,
-                email__iexact=email,
+                email__lower=email,
             )
             logger.info(f"Entitlements trouvés: {list(all_matching.values('order_ref', 'email', 'category__slug'))}")
 
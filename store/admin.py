@@ -3,6 +3,7 @@ from django.contrib import admin
 
 from .models import (
     DownloadToken,
+    EmailOutbox,
     ExampleSlide,
     IrregularityCategory,
     IrregularityRow,
@@ -57,6 +58,16 @@ class OrderAdmin(admin.ModelAdmin):
 admin.site.register(DownloadToken)
 
 
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = (
+        "id", "kind", "to_email", "subject", "status", "attempts", "next_attempt_at", "sent_at",
+    )
+    list_filter = ("status", "kind")
+    search_fields = ("to_email", "subject", "dedup_key")
+    readonly_fields = ("created_at", "sent_at", "claimed_at", "attempts", "error")
+
+
 from .models import PreliminaryRow, PreliminaryTable
 
 
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "store"
+
+    def ready(self):
+        from django.db.models import CharField
+        from django.db.models.functions import Lower
+
+        # email__lower=… → LOWER(email) = …, servi par les index fonctionnels Lower("email")
+        # (email__iexact produit UPPER(…) sous Postgres : aucun index ne le sert).
+        CharField.register_lookup(Lower)
+
+        from . import signals  # noqa
@@ -5,6 +5,8 @@ from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 
+from store.services import outbox
+
 SITE_BASE_URL = os.getenv("SITE_BASE_URL", "http://127.0.0.1:8000")
 
 
@@ -47,5 +49,5 @@ def send_payment_links(order, links: Iterable[Dict[str, Any]] | None = None, req
 
     msg = EmailMultiAlternatives(subject, text_body, from_email, to)
     msg.attach_alternative(html_body, "text/html")
-    msg.send(fail_silently=False)
+    outbox.enqueue(msg, kind="paid_links", dedup_key=f"paid_links:{order.pk}")
 
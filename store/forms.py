@@ -9,6 +9,8 @@ class CheckoutForm(forms.Form):
     last_name = forms.CharField(required=False)
     phone = forms.CharField(required=False)
     amount_fcfa = forms.IntegerField(required=False)
+    # Clé d'idempotence générée à l'affichage (store.services.checkout).
+    idempotency_key = forms.CharField(required=False, max_length=64, widget=forms.HiddenInput)
 
 
 class PaymentForm(forms.Form):
@@ -0,0 +1,110 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from downloads.entitlements import entitled_categories
+from downloads.models import DownloadCategory, DownloadEntitlement, ExternalEntitlement
+from store.models import Order, Product
+
+PAID_STATUSES = ["PAID", "SUCCEEDED", "COMPLETED"]
+INDEXES = {
+    "gate": ("dlent_email_lower_cat_idx", "extent_email_lower_cat_idx"),
+    "site_purchase": ("order_email_lower_status_idx",),
+    "user_orders": ("order_email_lower_status_idx",),
+    "iexact (avant)": ("order_email_lower_status_idx",),
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark des recherches par email (contrôle d'accès, achats site, mes commandes) : "
+        "plans EXPLAIN et latences. Jeu de données synthétique, annulé en fin de run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=20000, help="Lignes par table")
+        parser.add_argument("--repeat", type=int, default=200, help="Exécutions par requête")
+        parser.add_argument("--plans", action="store_true", help="Afficher les plans complets")
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self._run(opts)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, rows: int) -> list[str]:
+        tag = f"{random.getrandbits(32):x}"
+        product = Product.objects.create(slug=f"bench-{tag}", title="Bench", price_fcfa=1)
+        categories = [
+            DownloadCategory.objects.create(
+                slug=f"bench-{tag}-{i}", title=f"Bench {i}", page_path=f"/bench-{tag}-{i}"
+            )
+            for i in range(4)
+        ]
+        emails = [f"Buyer{i}@Bench.example" for i in range(rows)]
+        Order.objects.bulk_create(
+            [
+                Order(
+                    product=product, email=e, amount_fcfa=1,
+                    status=random.choice(["PAID", "PENDING", "FAILED"]),
+                    provider_ref=f"BENCH-{tag}-{i}",
+                )
+                for i, e in enumerate(emails)
+            ],
+            batch_size=1000,
+        )
+        ExternalEntitlement.objects.bulk_create(
+            [ExternalEntitlement(email=e, category=random.choice(categories)) for e in emails],
+            batch_size=1000,
+        )
+        DownloadEntitlement.objects.bulk_create(
+            [DownloadEntitlement(email=e, category=random.choice(categories)) for e in emails],
+            batch_size=1000,
+        )
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                for model in (Order, ExternalEntitlement, DownloadEntitlement):
+                    cursor.execute(f'ANALYZE "{model._meta.db_table}"')
+        return emails
+
+    def _queries(self, email: str) -> dict:
+        email = email.lower()
+        return {
+            "gate": entitled_categories(None, [email], "").values_list("slug", flat=True),
+            "site_purchase": Order.objects.filter(
+                email__lower=email, status__in=PAID_STATUSES
+            ).values_list("status", flat=True)[:1],
+            "user_orders": Order.objects.filter(email__lower=email).order_by("-created_at"),
+            # Référence : forme historique, UPPER(email) sous Postgres, non indexable.
+            "iexact (avant)": Order.objects.filter(
+                email__iexact=email, status__in=PAID_STATUSES
+            ).values_list("status", flat=True)[:1],
+        }
+
+    def _run(self, opts):
+        self.stdout.write(f"Base : {connection.vendor} — {opts['rows']} lignes par table")
+        emails = self._seed(opts["rows"])
+        sample = random.sample(emails, min(opts["repeat"], len(emails)))
+
+        for name, qs in self._queries(sample[0]).items():
+            plan = qs.explain()
+            used = [idx for idx in INDEXES[name] if idx in plan]
+            index_only = "Index Only Scan" in plan or "COVERING INDEX" in plan
+            start = time.perf_counter()
+            for email in sample:
+                list(self._queries(email)[name])
+            per_query = (time.perf_counter() - start) / len(sample) * 1000
+            verdict = "index seul" if index_only else ("index" if used else "SCAN")
+            self.stdout.write(
+                f"{name:<15} {per_query:7.3f} ms/requête  {verdict:<10} {', '.join(used) or '—'}"
+            )
+            if opts["plans"] or not used:
+                self.stdout.write(plan)
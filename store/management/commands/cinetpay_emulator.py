@@ -0,0 +1,54 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from store.services.cinetpay_emulator import CinetPayEmulator
+
+
+class Command(BaseCommand):
+    help = (
+        "Lance un émulateur CinetPay local (/v2/payment, /v2/payment/check) avec latence "
+        "et pannes injectables. Pointer l'app dessus via CINETPAY_API_URL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency", type=float, default=0.0, help="Latence fixe (s)")
+        parser.add_argument("--jitter", type=float, default=0.0, help="Gigue aléatoire (s)")
+        parser.add_argument(
+            "--fail-rate", type=float, default=0.0, help="Part des appels API en échec (0-1)"
+        )
+        parser.add_argument("--fail-status", type=int, default=503)
+        parser.add_argument("--outcome", choices=["ACCEPTED", "REFUSED"], default="ACCEPTED")
+        parser.add_argument(
+            "--no-notify", action="store_true", help="Ne pas appeler notify_url après paiement"
+        )
+        parser.add_argument(
+            "--notify-delay", type=float, default=0.0, help="Délai (s) avant le webhook"
+        )
+
+    def handle(self, *args, **opts):
+        emulator = CinetPayEmulator(
+            opts["host"],
+            opts["port"],
+            latency=opts["latency"],
+            jitter=opts["jitter"],
+            fail_rate=opts["fail_rate"],
+            fail_status=opts["fail_status"],
+            outcome=opts["outcome"],
+            notify=not opts["no_notify"],
+            notify_delay=opts["notify_delay"],
+            webhook_secret=os.getenv("CINETPAY_WEBHOOK_SECRET"),
+            webhook_header=os.getenv("CINETPAY_WEBHOOK_HEADER", "x-token"),
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Émulateur CinetPay sur http://{opts['host']}:{opts['port']} (Ctrl-C pour arrêter)"
+            )
+        )
+        try:
+            emulator.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Appels: {emulator.counters}")
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.services.webhooks import drain_inbox
+
+
+class Command(BaseCommand):
+    help = "Traite les webhooks CinetPay en attente dans l'inbox (PaymentWebhookLog non traités)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=getattr(settings, "PAYMENT_WEBHOOK_INBOX_BATCH", 50),
+            help="Nombre de lignes réservées par lot (défaut: PAYMENT_WEBHOOK_INBOX_BATCH)",
+        )
+        parser.add_argument(
+            "--max-batches", type=int, default=None, help="Arrêter après N lots"
+        )
+        parser.add_argument(
+            "--loop", action="store_true", help="Tourner en continu (consommateur sans Celery)"
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=2.0,
+            help="Pause (s) quand l'inbox est vide en mode --loop",
+        )
+
+    def handle(self, *args, **opts):
+        batch_size = opts["batch_size"]
+        max_batches = opts["max_batches"]
+        if not opts["loop"]:
+            count = drain_inbox(batch_size=batch_size, max_batches=max_batches)
+            self.stdout.write(self.style.SUCCESS(f"Webhooks traités: {count}"))
+            return
+
+        self.stdout.write("Consommation de l'inbox en continu (Ctrl+C pour arrêter)...")
+        try:
+            while True:
+                count = drain_inbox(batch_size=batch_size, max_batches=max_batches)
+                if count:
+                    self.stdout.write(f"Webhooks traités: {count}")
+                else:
+                    time.sleep(opts["sleep"])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS("Arrêt."))
@@ -0,0 +1,74 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from store.models import Order, Product
+from store.services.cinetpay_emulator import CinetPayEmulator
+from store.services.loadtest import EMAIL_DOMAIN, STEPS, run_funnel
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge hors ligne du tunnel buy → paiement → webhook → retour → "
+        "téléchargement contre l'émulateur CinetPay (à lancer sur une base de recette)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--product", required=True, help="Slug du produit acheté")
+        parser.add_argument("--buyers", type=int, default=50, help="Nombre d'acheteurs virtuels")
+        parser.add_argument("--concurrency", type=int, default=8, help="Acheteurs simultanés")
+        parser.add_argument("--version", default="a4", choices=["a4", "6x9"])
+        parser.add_argument("--latency", type=float, default=0.0, help="Latence émulée (s)")
+        parser.add_argument("--jitter", type=float, default=0.0, help="Gigue émulée (s)")
+        parser.add_argument(
+            "--fail-rate", type=float, default=0.0, help="Part des appels CinetPay en échec (0-1)"
+        )
+        parser.add_argument("--json", action="store_true", help="Rapport JSON brut")
+        parser.add_argument(
+            "--keep", action="store_true", help="Conserver les commandes créées par le run"
+        )
+
+    def handle(self, *args, **opts):
+        if not Product.objects.filter(slug=opts["product"], is_published=True).exists():
+            raise CommandError(f"Produit publié introuvable: {opts['product']}")
+
+        emulator = CinetPayEmulator(
+            latency=opts["latency"],
+            jitter=opts["jitter"],
+            fail_rate=opts["fail_rate"],
+            notify=False,
+        )
+        # Jamais d'email réel vers les acheteurs virtuels.
+        with emulator, override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"
+        ):
+            report = run_funnel(
+                product_slug=opts["product"],
+                buyers=opts["buyers"],
+                concurrency=opts["concurrency"],
+                version=opts["version"],
+                emulator=emulator,
+            )
+        if not opts["keep"]:
+            Order.objects.filter(email__endswith=f"@{EMAIL_DOMAIN}").delete()
+
+        if opts["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(
+            f"{report['buyers']} acheteurs, concurrence {report['concurrency']} — "
+            f"{report['completed']} tunnels complets en {report['elapsed']} s "
+            f"({report['throughput']} /s)"
+        )
+        self.stdout.write(f"{'étape':<10}{'n':>6}{'err':>6}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for step in STEPS:
+            s = report["steps"][step]
+            cells = [
+                f"{s[k] * 1000:>8.1f}ms" if s[k] is not None else f"{'-':>10}"
+                for k in ("p50", "p95", "p99")
+            ]
+            self.stdout.write(f"{step:<10}{s['count']:>6}{s['errors']:>6}" + "".join(cells))
+            if s["error_kinds"]:
+                self.stdout.write(self.style.WARNING(f"  erreurs: {s['error_kinds']}"))
+        self.stdout.write(f"Appels émulateur: {report['emulator']}")
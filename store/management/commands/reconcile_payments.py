@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.services.reconcile import reconcile
+
+
+class Command(BaseCommand):
+    help = "Réconcilie avec CinetPay les commandes restées en attente (webhook manquant)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stale-minutes",
+            type=int,
+            default=settings.PAYMENT_RECONCILE_STALE_MINUTES,
+            help="Ignorer les lignes plus récentes que N minutes",
+        )
+        parser.add_argument(
+            "--max-age-hours",
+            type=int,
+            default=settings.PAYMENT_RECONCILE_MAX_AGE_HOURS,
+            help="Ignorer les lignes plus anciennes que N heures",
+        )
+        parser.add_argument("--chunk-size", type=int, default=settings.PAYMENT_RECONCILE_CHUNK)
+        parser.add_argument(
+            "--workers", type=int, default=settings.PAYMENT_RECONCILE_WORKERS,
+            help="Appels check_transaction simultanés",
+        )
+        parser.add_argument(
+            "--rate", type=float, default=settings.PAYMENT_RECONCILE_RATE,
+            help="Débit max d'appels CinetPay par seconde (0 = illimité)",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=None, help="Nombre max de lignes vérifiées"
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Vérifier sans modifier les statuts"
+        )
+
+    def handle(self, *args, **opts):
+        counts = reconcile(
+            stale_after=timedelta(minutes=opts["stale_minutes"]),
+            max_age=timedelta(hours=opts["max_age_hours"]),
+            chunk_size=opts["chunk_size"],
+            workers=opts["workers"],
+            rate=opts["rate"],
+            limit=opts["limit"],
+            dry_run=opts["dry_run"],
+        )
+        if counts is None:
+            self.stdout.write(self.style.WARNING("Une réconciliation est déjà en cours."))
+            return
+        prefix = "[dry-run] " if opts["dry_run"] else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}Vérifiés: {counts['checked']} — payés: {counts['paid']}, "
+                f"échoués: {counts['failed']}, en attente: {counts['pending']}, "
+                f"erreurs: {counts['error']}"
+            )
+        )
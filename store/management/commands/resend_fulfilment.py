@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store.services.resend import SOURCES, run_campaign
+
+
+class Command(BaseCommand):
+    help = (
+        "Renvoie l'email de fulfilment à tous les acheteurs (Order PAID, ExternalEntitlement), "
+        "à débit plafonné. Relancer la même campagne reprend là où elle s'est arrêtée."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--campaign", required=True,
+            help="Nom de la campagne (clé de reprise et de dédoublonnage)",
+        )
+        parser.add_argument(
+            "--source", choices=(*SOURCES, "all"), default="all",
+            help="Population ciblée",
+        )
+        parser.add_argument(
+            "--rate", type=float, default=settings.EMAIL_RESEND_RATE,
+            help="Messages par seconde (0 = illimité)",
+        )
+        parser.add_argument("--chunk-size", type=int, default=200)
+        parser.add_argument("--limit", type=int, default=None, help="Nombre max d'envois")
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Compter les destinataires sans envoyer"
+        )
+
+    def handle(self, *args, **opts):
+        if opts["chunk_size"] <= 0:
+            raise CommandError("--chunk-size doit être > 0")
+        sources = SOURCES if opts["source"] == "all" else (opts["source"],)
+
+        def progress(c):
+            self.stdout.write(
+                f"… vus {c['seen']}, envoyés {c['sent']}, en retry {c['retry']}, "
+                f"échecs {c['failed']}"
+            )
+
+        counts = run_campaign(
+            opts["campaign"],
+            sources=sources,
+            rate=opts["rate"],
+            chunk_size=opts["chunk_size"],
+            limit=opts["limit"],
+            dry_run=opts["dry_run"],
+            progress=None if opts["dry_run"] else progress,
+        )
+        prefix = "[dry-run] " if opts["dry_run"] else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}Campagne {opts['campaign']} — destinataires: {counts['queued']}, "
+                f"déjà servis/doublons: {counts['skipped']}, envoyés: {counts['sent']}, "
+                f"en retry: {counts['retry']}, échecs: {counts['failed']} "
+                f"({counts['elapsed']} s, {counts['rate'] or 0} msg/s)"
+            )
+        )
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0015_add_kit_complet_models"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paymentwebhooklog",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="paymentwebhooklog",
+            name="claimed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="paymentwebhooklog",
+            name="endpoint",
+            field=models.CharField(blank=True, default="", max_length=16),
+        ),
+        migrations.AddField(
+            model_name="paymentwebhooklog",
+            name="error",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="paymentwebhooklog",
+            name="headers",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="paymentwebhooklog",
+            name="processed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="paymentwebhooklog",
+            index=models.Index(
+                fields=["processed", "created_at"], name="webhooklog_inbox_idx"
+            ),
+        ),
+    ]
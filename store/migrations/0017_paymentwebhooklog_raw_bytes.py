@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0016_paymentwebhooklog_inbox"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paymentwebhooklog",
+            name="raw_bytes",
+            field=models.BinaryField(blank=True, default=b""),
+        ),
+    ]
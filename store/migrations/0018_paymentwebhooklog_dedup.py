@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0017_paymentwebhooklog_raw_bytes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paymentwebhooklog",
+            name="body_sha256",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name="paymentwebhooklog",
+            index=models.Index(
+                fields=["order_ref", "body_sha256"], name="webhooklog_dedup_idx"
+            ),
+        ),
+    ]
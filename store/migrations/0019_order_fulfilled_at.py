@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0018_paymentwebhooklog_dedup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="fulfilled_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
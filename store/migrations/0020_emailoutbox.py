@@ -0,0 +1,79 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0019_order_fulfilled_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmailOutbox",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("kind", models.CharField(db_index=True, max_length=32)),
+                (
+                    "dedup_key",
+                    models.CharField(
+                        blank=True, max_length=191, null=True, unique=True
+                    ),
+                ),
+                ("to_email", models.EmailField(max_length=254)),
+                (
+                    "from_email",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                ("reply_to", models.JSONField(blank=True, default=list)),
+                ("subject", models.CharField(max_length=255)),
+                ("body_text", models.TextField(blank=True, default="")),
+                ("body_html", models.TextField(blank=True, default="")),
+                ("attachments", models.JSONField(blank=True, default=list)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "En file"),
+                            ("SENT", "Envoyé"),
+                            ("FAILED", "Abandonné"),
+                        ],
+                        default="PENDING",
+                        max_length=8,
+                    ),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("claimed_at", models.DateTimeField(blank=True, null=True)),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+                ("error", models.TextField(blank=True, default="")),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "next_attempt_at"], name="emailoutbox_due_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:36
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0020_emailoutbox"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                django.db.models.functions.text.Lower("email"),
+                models.F("status"),
+                name="order_email_lower_status_idx",
+            ),
+        ),
+    ]
@@ -5,6 +5,7 @@ from uuid import uuid4
 from django.contrib.auth import get_user_model
 from django.core.validators import EmailValidator
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 from django.core.exceptions import ValidationError
@@ -128,10 +129,20 @@ class Order(models.Model):
     uuid = models.UUIDField(default=uuid4, editable=False, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     paid_at = models.DateTimeField(null=True, blank=True)
+    # Posé par le fulfilment asynchrone une fois l'e-mail client envoyé.
+    fulfilled_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"Order#{self.pk} - {self.product} - {self.email}"
 
+    class Meta:
+        indexes = [
+            # Recherches par acheteur (email__lower=…) : achats site, « mes commandes », checkout.
+            models.Index(
+                Lower("email"), models.F("status"), name="order_email_lower_status_idx"
+            ),
+        ]
+
     @property
     def amount_xof(self) -> int:
         """Compat pour anciens appels CinetPay qui lisaient amount_xof."""
@@ -145,7 +156,7 @@ class Order(models.Model):
     # ---- Helpers de paiement / fulfilment ----
     def mark_paid(self, provider: str | None = None, provider_tx: str | None = None, trigger_fulfillment: bool = True, save: bool = True):
         """
-        Marque la commande comme payée et déclenche le fulfilment.
+        Marque la commande comme payée et planifie le fulfilment (tâche Celery après commit).
         'provider' est informatif ici (pas stocké en DB dans ce modèle minimal).
         Si 'provider_tx' est renseigné, on l'enregistre dans cinetpay_payment_id par compat.
         """
@@ -161,6 +172,8 @@ class Order(models.Model):
                 self.save(update_fields=["status", "paid_at", "cinetpay_payment_id"])
             except Exception:
                 self.save()
+        from store.services import order_status
+        order_status.publish(self.provider_ref, self.status)
         if trigger_fulfillment:
             try:
                 from store.services import fulfillment
@@ -570,12 +583,67 @@ class PaymentWebhookLog(models.Model):
     processed = models.BooleanField(default=False)
     http_status = models.PositiveSmallIntegerField(default=0)
     created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # Inbox (persist-then-ack) : rejouée par store.services.webhooks.drain_inbox
+    endpoint = models.CharField(max_length=16, blank=True, default="")  # callback | notify | form
+    headers = models.JSONField(default=dict, blank=True)
+    raw_bytes = models.BinaryField(blank=True, default=b"")  # corps exact, rejoué tel quel
+    body_sha256 = models.CharField(max_length=64, blank=True, default="")  # dédoublonnage
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["processed", "created_at"], name="webhooklog_inbox_idx"),
+            models.Index(fields=["order_ref", "body_sha256"], name="webhooklog_dedup_idx"),
+        ]
+
+    def __str__(self):
+        return f"Webhook {self.provider} {self.order_ref or '-'} ({self.http_status})"
+
+
+class EmailOutbox(models.Model):
+    """
+    E-mail transactionnel en file (une ligne par destinataire), inséré dans la
+    transaction du changement métier ; envoyé par store.services.outbox.drain.
+    """
+
+    PENDING, SENT, FAILED = "PENDING", "SENT", "FAILED"
+    STATUS_CHOICES = [
+        (PENDING, "En file"),
+        (SENT, "Envoyé"),
+        (FAILED, "Abandonné"),
+    ]
+
+    kind = models.CharField(max_length=32, db_index=True)  # fulfilment | paid_links | …
+    # Clé logique + destinataire : un même message n'est mis en file qu'une fois.
+    dedup_key = models.CharField(max_length=191, unique=True, null=True, blank=True)
+    to_email = models.EmailField()
+    from_email = models.CharField(max_length=255, blank=True, default="")
+    reply_to = models.JSONField(default=list, blank=True)
+    subject = models.CharField(max_length=255)
+    body_text = models.TextField(blank=True, default="")
+    body_html = models.TextField(blank=True, default="")
+    # [{"name", "mimetype", "content_b64"}] (pièces jointes des demandes de devis)
+    attachments = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="emailoutbox_due_idx"),
+        ]
 
     def __str__(self):
-        return f"Token for Order#{self.order.pk}"
+        return f"{self.kind} → {self.to_email} ({self.status})"
 
 # store/models.py
 class BonusRequest(models.Model):
@@ -0,0 +1,81 @@
+"""
+Instantané du catalogue publié (produit, offres, médias, slides d'exemples).
+
+- `snapshot()` : construit une fois par processus (4 requêtes), puis servi depuis la
+  mémoire tant que le tampon de version partagé (cache) n'a pas bougé — une lecture de
+  cache par appel, aucune requête SQL. Un worker Passenger voit donc une modification
+  de l'admin dès la requête suivante.
+- `bump_version()` (store.signals) : toute écriture sur Product, OfferTier, MediaAsset
+  ou ExampleSlide change le tampon et vide la mémoire du processus courant.
+  Les `QuerySet.update()` ne déclenchent pas de signal : appeler `bump_version()` à la main.
+- Sans cache partagé (LocMem multi-workers, DummyCache en dev), CATALOG_SNAPSHOT_MAX_AGE
+  borne la durée pendant laquelle un autre worker peut servir un instantané périmé.
+
+Les instances sont partagées entre requêtes : lecture seule.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+
+from store.models import ExampleSlide, MediaAsset, OfferTier, Product
+
+VERSION_KEY = "store:catalog:version"
+
+# (version, construit à, instantané) — remplacé d'un bloc, jamais modifié en place.
+_memo: tuple[int, float, "CatalogSnapshot"] | None = None
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    product: Product | None
+    tiers: tuple[OfferTier, ...] = ()
+    media: tuple[MediaAsset, ...] = ()
+    slides: tuple[ExampleSlide, ...] = ()
+
+    def tier(self, kind: str) -> OfferTier | None:
+        return next((t for t in self.tiers if t.kind == kind), None)
+
+
+def version() -> int:
+    return cache.get_or_set(VERSION_KEY, 1, None) or 1
+
+
+def bump_version() -> None:
+    global _memo
+    _memo = None
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+
+
+def _build() -> CatalogSnapshot:
+    product = Product.objects.filter(is_published=True).order_by("pk").first()
+    if product is None:
+        return CatalogSnapshot(product=None)
+    tiers = OfferTier.objects.filter(product=product).order_by("pk")
+    media = MediaAsset.objects.filter(product=product).order_by("pk")
+    slides = ExampleSlide.objects.filter(product=product).order_by("order", "id")
+    for obj in (*tiers, *media, *slides):
+        # Évite une requête par objet sur `obj.product` (ex. OfferTier.__str__).
+        obj.product = product
+    return CatalogSnapshot(
+        product=product, tiers=tuple(tiers), media=tuple(media), slides=tuple(slides)
+    )
+
+
+def snapshot() -> CatalogSnapshot:
+    """Catalogue publié courant, mémorisé dans le processus."""
+    global _memo
+    current = version()
+    max_age = getattr(settings, "CATALOG_SNAPSHOT_MAX_AGE", 300)
+    memo = _memo
+    if memo is not None and memo[0] == current and time.monotonic() - memo[1] < max_age:
+        return memo[2]
+    snap = _build()
+    _memo = (current, time.monotonic(), snap)
+    return snap
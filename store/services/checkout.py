@@ -0,0 +1,106 @@
+# store/services/checkout.py
+"""
+Checkout idempotent : un double-clic, un retour arrière ou une resoumission ne
+recrée ni Order ni session de paiement CinetPay.
+
+- Clé d'idempotence (champ caché du formulaire, générée à l'affichage) :
+  la même soumission renvoie la même payment_url.
+- Fenêtre de réutilisation : même email + produit + offre, commande non payée
+  récente → on renvoie sa payment_url (mise en cache à l'init) au lieu de
+  rappeler /v2/payment.
+- Deux POST simultanés avec la même clé : le premier réserve la clé (cache.add),
+  le second attend brièvement l'URL plutôt que d'initialiser en double.
+"""
+from __future__ import annotations
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from store.models import Order
+from store.services import metrics
+
+CACHE_PREFIX = "checkout"
+REUSABLE_STATUSES = ("CREATED", "PENDING")
+# Durée max d'un init CinetPay (read timeout compris) : au-delà, la réservation expire.
+CLAIM_TIMEOUT = 30
+
+
+def reuse_window() -> timedelta:
+    return timedelta(minutes=getattr(settings, "CHECKOUT_REUSE_MINUTES", 20))
+
+
+def _key_url(idempotency_key: str) -> str:
+    return f"{CACHE_PREFIX}:key:{idempotency_key}"
+
+
+def _key_claim(idempotency_key: str) -> str:
+    return f"{CACHE_PREFIX}:claim:{idempotency_key}"
+
+
+def _order_url(order_pk: int) -> str:
+    return f"{CACHE_PREFIX}:order:{order_pk}"
+
+
+def find_reusable(*, product, tier_id, email: str, idempotency_key: str = "") -> str | None:
+    """payment_url à réutiliser pour cette soumission, ou None."""
+    if idempotency_key:
+        url = cache.get(_key_url(idempotency_key))
+        if url:
+            metrics.incr("checkout.reused")
+            return url
+    order_pk = (
+        Order.objects.filter(
+            product=product,
+            tier_id=tier_id,
+            email__lower=email.strip().lower(),
+            status__in=REUSABLE_STATUSES,
+            created_at__gte=timezone.now() - reuse_window(),
+        )
+        .order_by("-created_at")
+        .values_list("pk", flat=True)
+        .first()
+    )
+    if order_pk is not None:
+        url = cache.get(_order_url(order_pk))
+        if url:
+            metrics.incr("checkout.reused")
+            return url
+    return None
+
+
+def claim(idempotency_key: str) -> bool:
+    """Réserve la clé pour l'init en cours ; False si une autre requête l'a déjà."""
+    if not idempotency_key:
+        return True
+    return cache.add(_key_claim(idempotency_key), 1, CLAIM_TIMEOUT)
+
+
+def wait_for(idempotency_key: str, timeout: float = 5.0, interval: float = 0.2) -> str | None:
+    """Attend l'URL publiée par la requête qui détient la réservation."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        url = cache.get(_key_url(idempotency_key))
+        if url:
+            metrics.incr("checkout.reused")
+            return url
+        time.sleep(interval)
+    return None
+
+
+def remember(order: Order, payment_url: str, idempotency_key: str = "") -> None:
+    ttl = int(reuse_window().total_seconds())
+    values = {_order_url(order.pk): payment_url}
+    if idempotency_key:
+        values[_key_url(idempotency_key)] = payment_url
+    cache.set_many(values, ttl)
+    metrics.incr("checkout.init")
+
+
+def release(idempotency_key: str) -> None:
+    """Init en échec : libère la clé pour qu'une nouvelle tentative puisse passer."""
+    if idempotency_key:
+        cache.delete(_key_claim(idempotency_key))
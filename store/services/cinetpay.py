@@ -5,10 +5,17 @@ import hmac
 import json
 import logging
 import os
+import random
+import threading
+import time
 from decimal import Decimal, InvalidOperation
 
 import requests
+from django.core.cache import cache
 from django.urls import reverse
+from requests.adapters import HTTPAdapter
+
+from store.services import metrics
 
 # =========================
 #  Config & constantes
@@ -30,8 +37,27 @@ NOTIFY_URL_ENV = os.getenv("CINETPAY_NOTIFY_URL")
 ENV_MODE = os.getenv("CINETPAY_ENV", "sandbox").lower()  # "sandbox" | "production"
 CHANNELS = os.getenv("CINETPAY_CHANNELS", "CREDIT_CARD")  # "ALL", "CREDIT_CARD", etc.
 
-
-
+# Client HTTP : connexions keep-alive réutilisées (évite un handshake TCP+TLS par appel)
+CONNECT_TIMEOUT = float(os.getenv("CINETPAY_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("CINETPAY_READ_TIMEOUT", "20"))
+POOL_CONNECTIONS = int(os.getenv("CINETPAY_POOL_CONNECTIONS", "2"))
+POOL_MAXSIZE = int(os.getenv("CINETPAY_POOL_MAXSIZE", "10"))
+# Retries uniquement sur les appels idempotents (le check ne crée rien côté CinetPay)
+CHECK_RETRIES = int(os.getenv("CINETPAY_CHECK_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("CINETPAY_RETRY_BACKOFF", "0.3"))
+IDEMPOTENT_PATHS = frozenset({"/v2/payment/check"})
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Timeout de lecture adaptatif : ADAPTIVE_FACTOR × p99 observé, borné par
+# [ADAPTIVE_FLOOR, READ_TIMEOUT], dès ADAPTIVE_MIN_SAMPLES mesures sur l'endpoint.
+ADAPTIVE_TIMEOUT = os.getenv("CINETPAY_ADAPTIVE_TIMEOUT", "1") == "1"
+ADAPTIVE_FACTOR = float(os.getenv("CINETPAY_ADAPTIVE_FACTOR", "4"))
+ADAPTIVE_FLOOR = float(os.getenv("CINETPAY_ADAPTIVE_FLOOR", "5"))
+ADAPTIVE_MIN_SAMPLES = int(os.getenv("CINETPAY_ADAPTIVE_MIN_SAMPLES", "20"))
+# Disjoncteur (état partagé via le cache : Redis recommandé, cf. CACHE_REDIS_URL)
+BREAKER_FAILURES = int(os.getenv("CINETPAY_BREAKER_FAILURES", "5"))
+BREAKER_WINDOW = int(os.getenv("CINETPAY_BREAKER_WINDOW", "60"))
+BREAKER_COOLDOWN = int(os.getenv("CINETPAY_BREAKER_COOLDOWN", "30"))
+BREAKER_SLOW_CALL = float(os.getenv("CINETPAY_BREAKER_SLOW_CALL", "8"))
 
 
 class CinetPayError(Exception):
@@ -40,6 +66,106 @@ class CinetPayError(Exception):
     pass
 
 
+class CircuitOpenError(CinetPayError):
+    """Disjoncteur ouvert : appel refusé sans toucher au réseau."""
+
+    pass
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur à état partagé dans le cache (tous les workers voient le même état).
+
+    - closed : appels normaux ; échecs (réseau, 5xx/429, appel plus lent que
+      `slow_call`) comptés sur une fenêtre fixe de `window` s ; `failures` échecs
+      → open.
+    - open : tout appel lève CircuitOpenError immédiatement, pendant `cooldown` s.
+    - half_open : un seul appel « sonde » passe (réservé via cache.add) ; succès →
+      closed, échec → open pour un nouveau cooldown.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, *, failures, window, cooldown, slow_call, clock=time.time):
+        self.name = name
+        self.failures = failures
+        self.window = window
+        self.cooldown = cooldown
+        self.slow_call = slow_call
+        self.clock = clock
+
+    def _key(self, suffix: str) -> str:
+        return f"breaker:{self.name}:{suffix}"
+
+    def state(self) -> str:
+        opened_at = cache.get(self._key("opened_at"))
+        if opened_at is None:
+            return self.CLOSED
+        if self.clock() - opened_at >= self.cooldown:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def before_call(self) -> bool:
+        """Autorise l'appel (retourne True s'il s'agit de la sonde) ou lève CircuitOpenError."""
+        state = self.state()
+        if state == self.CLOSED:
+            return False
+        if state == self.HALF_OPEN and cache.add(self._key("probe"), 1, self.cooldown):
+            logger.warning("[CinetPay][breaker] half-open : appel sonde")
+            return True
+        metrics.incr(f"{self.name}.breaker.rejected")
+        raise CircuitOpenError("CinetPay indisponible (disjoncteur ouvert)")
+
+    def record(self, ok: bool, elapsed: float, probe: bool = False) -> None:
+        if ok and elapsed > self.slow_call:
+            ok = False
+        if probe:
+            if ok:
+                self.reset()
+            else:
+                self._trip()
+            return
+        if ok:
+            return
+        key = self._key("failures")
+        cache.add(key, 0, self.window)
+        try:
+            count = cache.incr(key)
+        except ValueError:  # clé expirée entre add et incr (ou cache factice)
+            count = 1
+        if count >= self.failures:
+            self._trip()
+
+    def _trip(self) -> None:
+        cache.set(self._key("opened_at"), self.clock(), self.cooldown * 10)
+        cache.delete_many([self._key("failures"), self._key("probe")])
+        metrics.incr(f"{self.name}.breaker.opened")
+        logger.error("[CinetPay][breaker] ouvert pour %ss", self.cooldown)
+
+    def reset(self) -> None:
+        cache.delete_many([self._key(k) for k in ("opened_at", "failures", "probe")])
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state(),
+            "failures": cache.get(self._key("failures")) or 0,
+            "opened_at": cache.get(self._key("opened_at")),
+            "threshold": self.failures,
+            "window": self.window,
+            "cooldown": self.cooldown,
+            "slow_call": self.slow_call,
+        }
+
+
+breaker = CircuitBreaker(
+    "cinetpay",
+    failures=BREAKER_FAILURES,
+    window=BREAKER_WINDOW,
+    cooldown=BREAKER_COOLDOWN,
+    slow_call=BREAKER_SLOW_CALL,
+)
+
+
 # =========================
 #  Utils
 # =========================
@@ -105,25 +231,106 @@ def _amount_to_int(value) -> int:
     return ivalue
 
 
-def _post(path: str, json_payload: dict, timeout: int = 25) -> dict:
-    """POST JSON avec gestion d’erreurs lisibles."""
-    url = f"{API_URL.rstrip('/')}{path}"
-    headers = {"Content-Type": "application/json"}
+_session: requests.Session | None = None
+_session_pid: int | None = None
+_session_lock = threading.Lock()
 
-    try:
-        
-        r = requests.post(url, json=json_payload, headers=headers, timeout=timeout)
-        
-        if path == "/v2/payment":
-            lvl = logger.error if r.status_code >= 400 else logger.info
-            lvl("CINETPAY_INIT status=%s body=%s", r.status_code, r.text[:2000])
-        elif path == "/v2/payment/check":
-            lvl = logger.error if r.status_code >= 400 else logger.info
-            lvl("CINETPAY_CHECK status=%s body=%s", r.status_code, r.text[:2000])
-            
-    except requests.RequestException as e:
-        logger.error(f"[CinetPay][_post] HTTP error: {e}")
-        raise CinetPayError(f"Erreur réseau vers CinetPay: {e}")
+
+def get_session() -> requests.Session:
+    """
+    Session HTTP partagée par le processus (pool de connexions borné, keep-alive).
+    Recréée après un fork (workers Passenger / Celery prefork) pour ne jamais
+    partager un socket entre processus.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                s = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_CONNECTIONS,
+                    pool_maxsize=POOL_MAXSIZE,
+                    pool_block=False,
+                    max_retries=0,  # retries gérés dans _post (idempotence + jitter)
+                )
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                s.headers.update({"Content-Type": "application/json"})
+                _session, _session_pid = s, pid
+    return _session
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Backoff exponentiel avec « full jitter » : uniform(0, base * 2^attempt)."""
+    return random.uniform(0, RETRY_BACKOFF * (2 ** attempt))
+
+
+def _read_timeout(path: str) -> float:
+    """READ_TIMEOUT, ou moins si l'historique de l'endpoint montre des réponses rapides."""
+    if not ADAPTIVE_TIMEOUT:
+        return READ_TIMEOUT
+    p99 = metrics.quantile(f"cinetpay.{path}", 0.99, min_count=ADAPTIVE_MIN_SAMPLES)
+    if p99 is None:
+        return READ_TIMEOUT
+    return min(READ_TIMEOUT, max(ADAPTIVE_FLOOR, ADAPTIVE_FACTOR * p99))
+
+
+def _post(
+    path: str,
+    json_payload: dict,
+    timeout: float | tuple | None = None,
+    retries: int | None = None,
+) -> dict:
+    """
+    POST JSON avec gestion d’erreurs lisibles.
+    `retries` : budget de retries de l'appelant (None → CHECK_RETRIES sur les chemins
+    idempotents). Les chemins non idempotents ne sont jamais rejoués.
+    """
+    url = f"{API_URL.rstrip('/')}{path}"
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, _read_timeout(path))
+    if path not in IDEMPOTENT_PATHS:
+        retries = 0
+    elif retries is None:
+        retries = CHECK_RETRIES
+
+    attempt = 0
+    while True:
+        probe = breaker.before_call()
+        start = time.perf_counter()
+        try:
+            r = get_session().post(url, json=json_payload, timeout=timeout)
+        except requests.RequestException as e:
+            elapsed = time.perf_counter() - start
+            metrics.observe(f"cinetpay.{path}", elapsed)
+            breaker.record(False, elapsed, probe)
+            if attempt < retries:
+                logger.warning("[CinetPay][_post] %s retry %s/%s after error: %s",
+                               path, attempt + 1, retries, e)
+                time.sleep(_backoff_delay(attempt))
+                attempt += 1
+                continue
+            logger.error(f"[CinetPay][_post] HTTP error: {e}")
+            raise CinetPayError(f"Erreur réseau vers CinetPay: {e}")
+        elapsed = time.perf_counter() - start
+        metrics.observe(f"cinetpay.{path}", elapsed)
+        breaker.record(r.status_code not in RETRY_STATUSES, elapsed, probe)
+
+        if r.status_code in RETRY_STATUSES and attempt < retries:
+            logger.warning("[CinetPay][_post] %s retry %s/%s after HTTP %s",
+                           path, attempt + 1, retries, r.status_code)
+            time.sleep(_backoff_delay(attempt))
+            attempt += 1
+            continue
+        break
+
+    if path == "/v2/payment":
+        lvl = logger.error if r.status_code >= 400 else logger.info
+        lvl("CINETPAY_INIT status=%s body=%s", r.status_code, r.text[:2000])
+    elif path == "/v2/payment/check":
+        lvl = logger.error if r.status_code >= 400 else logger.info
+        lvl("CINETPAY_CHECK status=%s body=%s", r.status_code, r.text[:2000])
 
     # On veut toujours renvoyer une erreur lisible côté app
     try:
@@ -235,14 +442,17 @@ def init_payment(
     return payment_url
 
 
-def check_transaction(transaction_id: str) -> dict:
-    """Vérifie l'état d'une transaction CinetPay (serveur à serveur)."""
+def check_transaction(transaction_id: str, *, retries: int | None = None) -> dict:
+    """
+    Vérifie l'état d'une transaction CinetPay (serveur à serveur).
+    Dans une requête HTTP, passer retries=0 : les retries sont réservés aux workers.
+    """
     if not API_KEY or not SITE_ID:
         raise CinetPayError("CINETPAY_API_KEY / CINETPAY_SITE_ID manquants dans l'environnement.")
 
     payload = {"transaction_id": str(transaction_id), "site_id": SITE_ID, "apikey": API_KEY}
     logger.info(f"[CinetPay][check] tx={transaction_id}")
-    return _post("/v2/payment/check", payload)
+    return _post("/v2/payment/check", payload, retries=retries)
 
 
 # =========================
@@ -303,7 +513,7 @@ def init_payment_auto(order, request) -> str:
     return pay_url
 
 
-def safe_check(transaction_id: str) -> dict:
+def safe_check(transaction_id: str, *, retries: int | None = None) -> dict:
     """
     En dev (clé/site non configurés), renvoie un statut 'ACCEPTED' pour faciliter les tests.
     En prod, fait le vrai check.
@@ -315,18 +525,25 @@ def safe_check(transaction_id: str) -> dict:
         return {"code": "00", "data": {"status": "ACCEPTED"}}
 
     try:
-        return check_transaction(transaction_id)
+        return check_transaction(transaction_id, retries=retries)
     except CinetPayError as e:
         logger.error("[CinetPay][safe_check] error=%s", e)
         raise
 
 
-def payment_check(order_id: str) -> tuple[bool, str | None]:
+def payment_check(order_id: str, *, raise_on_error: bool = False) -> tuple[bool, str | None]:
     """
     Vérifie le paiement côté CinetPay. Retourne (paid?, provider_tx_id ou None).
+    raise_on_error=True : propage CinetPayError (réseau/HTTP) au lieu de répondre
+    « non payé », pour que l'appelant (worker) puisse réessayer.
     """
     try:
         resp = check_transaction(order_id)
+    except CinetPayError as e:
+        if raise_on_error:
+            raise
+        logger.error(f"[CinetPay][payment_check] Exception: {e}")
+        return False, None
     except Exception as e:
         logger.error(f"[CinetPay][payment_check] Exception: {e}")
         return False, None
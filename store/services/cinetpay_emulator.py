@@ -0,0 +1,297 @@
+# store/services/cinetpay_emulator.py
+"""
+Émulateur CinetPay local (aucun appel sortant) pour les tests de charge du tunnel.
+
+Implémente le strict nécessaire de l'API v2 :
+- POST /v2/payment        → code "201" + payment_url pointant sur l'émulateur ;
+- POST /v2/payment/check  → statut courant de la transaction ;
+- GET  /pay/<tx>          → « l'acheteur paie » : statut final, webhook vers notify_url,
+                            puis 302 vers return_url?transaction_id=<tx>.
+
+Latence (fixe + gigue) et injection de pannes (HTTP 5xx) configurables.
+Utilisable dans le processus (`with CinetPayEmulator(...) as emu:`) ou sur
+localhost via la commande `cinetpay_emulator`. Pointer le client dessus :
+CINETPAY_API_URL=http://127.0.0.1:<port> (ou `point_client_at(emu)`).
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode
+
+import requests
+
+from store.services import cinetpay
+
+logger = logging.getLogger(__name__)
+
+WAITING = "WAITING_CUSTOMER_PAYMENT"
+API_PATHS = ("/v2/payment", "/v2/payment/check")
+
+
+class CinetPayEmulator:
+    """
+    Serveur HTTP multi-thread en mémoire. `latency`/`jitter` en secondes ;
+    `fail_rate` ∈ [0, 1] : part des appels API qui répondent `fail_status`.
+    `notify=False` : pas de webhook (le pilote de charge le rejoue lui-même).
+    `notifier(url, raw, headers)` remplace l'envoi HTTP du webhook (tests).
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        fail_rate: float = 0.0,
+        fail_status: int = 503,
+        outcome: str = "ACCEPTED",
+        notify: bool = True,
+        notify_delay: float = 0.0,
+        webhook_secret: str | None = None,
+        webhook_header: str = "x-token",
+        notifier=None,
+        seed: int | None = None,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.outcome = outcome.upper()
+        self.notify = notify
+        self.notify_delay = notify_delay
+        self.webhook_secret = webhook_secret
+        self.webhook_header = webhook_header
+        self.notifier = notifier or self._post_webhook
+        self.transactions: dict[str, dict] = {}
+        self.counters: dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    # ------------------------------------------------------------------ cycle de vie
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "CinetPayEmulator":
+        handler = type("Handler", (_Handler,), {"emulator": self})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="cinetpay-emulator", daemon=True
+        )
+        self._thread.start()
+        logger.info("[emulator] CinetPay émulé sur %s", self.base_url)
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def serve_forever(self) -> None:
+        """Mode commande : bloque jusqu'à Ctrl-C."""
+        self.start()
+        try:
+            while self._thread.is_alive():
+                self._thread.join(0.5)
+        finally:
+            self.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ------------------------------------------------------------------ comportement
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def _delay(self) -> None:
+        wait = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if wait > 0:
+            time.sleep(wait)
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self.fail_rate > 0 and self._random.random() < self.fail_rate
+
+    def init(self, payload: dict) -> tuple[int, dict]:
+        tx = str(payload.get("transaction_id") or "")
+        if not (payload.get("apikey") and payload.get("site_id") and tx):
+            return 200, {"code": "608", "message": "MINIMUM_REQUIRED_FIELDS", "data": {}}
+        if not isinstance(payload.get("amount"), int):
+            return 200, {"code": "624", "message": "amount must be an integer", "data": {}}
+        with self._lock:
+            self.transactions[tx] = {
+                "status": WAITING,
+                "amount": payload["amount"],
+                "currency": payload.get("currency", "XOF"),
+                "return_url": payload.get("return_url"),
+                "notify_url": payload.get("notify_url"),
+            }
+        token = hashlib.sha1(tx.encode()).hexdigest()
+        return 200, {
+            "code": "201",
+            "message": "CREATED",
+            "data": {"payment_token": token, "payment_url": f"{self.base_url}/pay/{tx}"},
+        }
+
+    def check(self, payload: dict) -> tuple[int, dict]:
+        tx = str(payload.get("transaction_id") or "")
+        with self._lock:
+            state = dict(self.transactions.get(tx) or {})
+        if not state:
+            return 200, {"code": "627", "message": "TRANSACTION_NOT_FOUND", "data": {}}
+        status = state["status"]
+        code = "00" if status == "ACCEPTED" else ("600" if status == "REFUSED" else "662")
+        return 200, {
+            "code": code,
+            "message": status,
+            "data": {
+                "status": status,
+                "amount": str(state["amount"]),
+                "currency": state["currency"],
+                "payment_method": "OMCI",
+                "operator_id": f"EMU-{tx[-12:]}",
+            },
+        }
+
+    def pay(self, tx: str) -> str | None:
+        """L'acheteur valide le paiement ; retourne l'URL de retour (ou None si inconnue)."""
+        with self._lock:
+            state = self.transactions.get(tx)
+            if state is None:
+                return None
+            state["status"] = self.outcome
+            return_url, notify_url = state["return_url"], state["notify_url"]
+        if self.notify and notify_url:
+            threading.Thread(
+                target=self._notify, args=(tx, notify_url), name="cinetpay-emulator-notify",
+                daemon=True,
+            ).start()
+        if not return_url:
+            return None
+        sep = "&" if "?" in return_url else "?"
+        return f"{return_url}{sep}{urlencode({'transaction_id': tx})}"
+
+    def webhook_request(self, tx: str) -> tuple[bytes, dict]:
+        """Corps + en-têtes du webhook signé (même format que cinetpay_simulate_webhook)."""
+        with self._lock:
+            state = dict(self.transactions.get(tx) or {})
+        payload = {
+            "cpm_trans_id": tx,
+            "transaction_id": tx,
+            "status": state.get("status", WAITING),
+            "amount": state.get("amount"),
+            "currency": state.get("currency", "XOF"),
+        }
+        raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.webhook_secret:
+            headers[self.webhook_header] = hmac.new(
+                self.webhook_secret.encode("utf-8"), raw, hashlib.sha256
+            ).hexdigest()
+        return raw, headers
+
+    def _notify(self, tx: str, url: str) -> None:
+        if self.notify_delay:
+            time.sleep(self.notify_delay)
+        raw, headers = self.webhook_request(tx)
+        try:
+            self.notifier(url, raw, headers)
+            self._count("notify")
+        except Exception:
+            self._count("notify_error")
+            logger.exception("[emulator] webhook %s → %s", tx, url)
+
+    @staticmethod
+    def _post_webhook(url: str, raw: bytes, headers: dict) -> None:
+        requests.post(url, data=raw, headers=headers, timeout=10)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    emulator: CinetPayEmulator = None
+    protocol_version = "HTTP/1.1"  # keep-alive : comme le vrai service derrière le pool
+
+    def log_message(self, fmt, *args):
+        logger.debug("[emulator] " + fmt, *args)
+
+    def _send(self, status: int, body: dict | None = None, headers: dict | None = None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        emu = self.emulator
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        emu._count(self.path)
+        if self.path not in API_PATHS:
+            return self._send(404, {"code": "404", "message": "NOT_FOUND"})
+        emu._delay()
+        if emu._should_fail():
+            emu._count("injected_failure")
+            body = {"code": str(emu.fail_status), "message": "INJECTED"}
+            return self._send(emu.fail_status, body)
+        try:
+            payload = json.loads(raw.decode("utf-8") or "{}")
+        except ValueError:
+            return self._send(400, {"code": "400", "message": "INVALID_JSON"})
+        status, body = (emu.init if self.path == "/v2/payment" else emu.check)(payload)
+        return self._send(status, body)
+
+    def do_GET(self):
+        emu = self.emulator
+        if not self.path.startswith("/pay/"):
+            return self._send(404, {"code": "404", "message": "NOT_FOUND"})
+        emu._count("/pay")
+        tx = self.path[len("/pay/"):].split("?", 1)[0]
+        location = emu.pay(tx)
+        if location is None:
+            return self._send(404 if tx not in emu.transactions else 200, {"transaction_id": tx})
+        return self._send(302, headers={"Location": location})
+
+
+@contextmanager
+def point_client_at(emulator: CinetPayEmulator, *, return_url=None, notify_url=None):
+    """
+    Redirige le client `store.services.cinetpay` vers l'émulateur le temps du bloc
+    (constantes module lues à l'import : on les permute puis on les restaure).
+    """
+    names = ("API_URL", "API_KEY", "SITE_ID", "RETURN_URL_ENV", "NOTIFY_URL_ENV")
+    saved = {n: getattr(cinetpay, n) for n in names}
+    cinetpay.API_URL = emulator.base_url
+    cinetpay.API_KEY = saved["API_KEY"] or "emulator-key"
+    cinetpay.SITE_ID = saved["SITE_ID"] or "000000"
+    if return_url:
+        cinetpay.RETURN_URL_ENV = return_url
+    if notify_url:
+        cinetpay.NOTIFY_URL_ENV = notify_url
+    try:
+        yield emulator
+    finally:
+        for n, v in saved.items():
+            setattr(cinetpay, n, v)
@@ -1,42 +1,121 @@
+"""
+Fulfilment post-paiement, exécuté par Celery (tâche `fulfil_order`) et non plus
+dans la requête ou le webhook qui a marqué la commande payée.
+
+- `after_payment(order)` : appelé par Order.mark_paid ; planifie la tâche après
+  commit avec le seul identifiant de la commande.
+- `fulfil(order_id)` : étapes idempotentes, rejouables sans effet de bord :
+    1. liens de téléchargement (lecture seule ; les jetons sont sans état) ;
+    2. e-mail client, mis en file une seule fois (outbox, dédoublonnée par
+       commande) : marqueur Order.fulfilled_at posé ensuite, étape réservée via
+       le cache pour écarter deux workers simultanés.
+  Un échec de préparation du mail lève FulfilmentError : la tâche réessaie avec
+  backoff. Les pannes SMTP relèvent ensuite de l'outbox (store.services.outbox).
+"""
 from __future__ import annotations
+
 import logging
 from typing import TYPE_CHECKING
 
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
 if TYPE_CHECKING:
     from store.models import Order
 
 logger = logging.getLogger(__name__)
 
+# Réservation de l'envoi : couvre un envoi SMTP lent, expire si le worker meurt.
+SEND_CLAIM_TIMEOUT = 300
+
+
+class FulfilmentError(Exception):
+    """Étape de fulfilment en échec (réessayable)."""
+
 
 def after_payment(order: "Order") -> None:
-    logger.info(f"[FULFILLMENT] Start for order={order.id} provider_ref={getattr(order,'provider_ref',None)} paid_at={order.paid_at}")
+    """
+    Planifie le fulfilment après commit. Broker indisponible : on journalise ;
+    la commande reste PAID sans fulfilled_at et pourra être relivrée.
+    """
+    order_id = order.pk
+
+    def _send():
+        from store.services.payments import PUBLISH_RETRY_POLICY
+        from store.tasks import fulfil_order
+
+        try:
+            fulfil_order.apply_async(
+                (order_id,), retry=True, retry_policy=PUBLISH_RETRY_POLICY
+            )
+        except Exception:
+            logger.exception("[FULFILLMENT] Broker indisponible, order=%s non planifiée", order_id)
+
+    transaction.on_commit(_send)
+
+
+def _claim_key(order_id: int) -> str:
+    return f"fulfil:send:{order_id}"
+
+
+def _links(order: "Order") -> list:
+    from downloads.services import attach_links_to_order
 
-    links = []
     try:
-        from downloads.services import attach_links_to_order
-        links = attach_links_to_order(order)
+        return attach_links_to_order(order)
     except Exception:
         logger.exception("[FULFILLMENT] Génération des liens a échoué (non bloquant).")
+        return []
 
-    # Bonus éventuels (optionnels)
-    try:
-        # Laisse en place si tu ajoutes un module de bonus ensuite
-        pass
-    except Exception:
-        logger.exception("[FULFILLMENT] Bonus: erreur (non bloquant).")
 
+def _send_email(order: "Order", links: list) -> None:
     try:
         # Email complet (liens ebook, ressources, bonus tokenisé)
         from store.services.mailing import send_fulfilment_email
-        send_fulfilment_email(to_email=order.email, order_ref=getattr(order, "provider_ref", None))
+
+        send_fulfilment_email(to_email=order.email, order_ref=order.provider_ref)
+        return
     except Exception:
-        logger.exception("[FULFILLMENT] Email client (mailing): échec (non bloquant).")
-        # Fallback minimal (liens produits uniquement)
-        try:
-            from store.emails import send_payment_links
-            send_payment_links(order, links=links)
-        except Exception:
-            logger.exception("[FULFILLMENT] Email client (fallback): échec (non bloquant).")
+        logger.exception("[FULFILLMENT] Email client (mailing): échec, repli sur l'email minimal.")
+    # Fallback minimal (liens produits uniquement)
+    try:
+        from store.emails import send_payment_links
 
-    logger.info(f"[FULFILLMENT] Done for order={order.id}")
+        send_payment_links(order, links=links)
+    except Exception as e:
+        raise FulfilmentError(f"email order={order.pk}: {e}") from e
 
+
+def fulfil(order_id: int) -> str:
+    """
+    Exécute les étapes de fulfilment pour une commande payée.
+    Retourne un code court : unknown_order | not_paid | already_fulfilled | in_progress
+    | fulfilled. Lève FulfilmentError si l'e-mail n'a pas pu partir.
+    """
+    from store.models import Order
+
+    order = Order.objects.select_related("product").filter(pk=order_id).first()
+    if order is None:
+        logger.error("[FULFILLMENT] order=%s introuvable", order_id)
+        return "unknown_order"
+    if not order.is_paid:
+        return "not_paid"
+    if order.fulfilled_at:
+        return "already_fulfilled"
+
+    logger.info("[FULFILLMENT] Start for order=%s provider_ref=%s", order.pk, order.provider_ref)
+    links = _links(order)
+
+    if not cache.add(_claim_key(order.pk), 1, SEND_CLAIM_TIMEOUT):
+        return "in_progress"
+    try:
+        _send_email(order, links)
+    except FulfilmentError:
+        cache.delete(_claim_key(order.pk))
+        raise
+    Order.objects.filter(pk=order.pk, fulfilled_at__isnull=True).update(
+        fulfilled_at=timezone.now()
+    )
+    logger.info("[FULFILLMENT] Done for order=%s", order.pk)
+    return "fulfilled"
@@ -0,0 +1,218 @@
+# store/services/loadtest.py
+"""
+Pilote de charge du tunnel d'achat, hors ligne, contre l'émulateur CinetPay.
+
+Chaque acheteur virtuel enchaîne, dans le processus (vues appelées via RequestFactory,
+sans serveur HTTP ni routage) :
+    buy → pay (émulateur) → webhook → return → download
+et chaque étape est chronométrée. Le rapport donne le débit (tunnels complets/s)
+et, par étape, p50/p95/p99, max et erreurs (statut HTTP inattendu ou exception).
+Un acheteur s'arrête à la première étape en échec.
+
+Le webhook rejoué est l'endpoint JSON legacy (`payment_notify`) : c'est lui qui
+règle une Order (check S2S vers l'émulateur puis mark_order_paid).
+"""
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.db import close_old_connections, connections
+from django.test import RequestFactory
+
+from store.services.cinetpay_emulator import CinetPayEmulator, point_client_at
+
+STEPS = ("buy", "pay", "webhook", "return", "download")
+EMAIL_DOMAIN = "loadtest.invalid"
+
+RETURN_URL = "http://testserver/payment/return/"
+NOTIFY_URL = "http://testserver/payment/notify/"
+
+
+def percentile(samples: list[float], q: float) -> float | None:
+    """Percentile « nearest rank » (q ∈ [0, 100]) sur des échantillons bruts."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class StepFailed(Exception):
+    pass
+
+
+class FunnelStats:
+    """Échantillons bruts par étape (thread-safe) ; les percentiles sont exacts."""
+
+    def __init__(self):
+        self.samples = {s: [] for s in STEPS}
+        self.errors = {s: {} for s in STEPS}
+        self.completed = 0
+        self._lock = threading.Lock()
+
+    def record(self, step: str, seconds: float, error: str | None = None) -> None:
+        with self._lock:
+            self.samples[step].append(seconds)
+            if error:
+                self.errors[step][error] = self.errors[step].get(error, 0) + 1
+
+    def done(self) -> None:
+        with self._lock:
+            self.completed += 1
+
+    def report(self, elapsed: float) -> dict:
+        steps = {}
+        for step in STEPS:
+            samples = self.samples[step]
+            steps[step] = {
+                "count": len(samples),
+                "errors": sum(self.errors[step].values()),
+                "p50": percentile(samples, 50),
+                "p95": percentile(samples, 95),
+                "p99": percentile(samples, 99),
+                "max": max(samples) if samples else None,
+                "error_kinds": dict(self.errors[step]),
+            }
+        return {
+            "elapsed": round(elapsed, 3),
+            "completed": self.completed,
+            "throughput": round(self.completed / elapsed, 3) if elapsed else None,
+            "steps": steps,
+        }
+
+
+class _Buyer:
+    def __init__(self, n: int, product_slug: str, version: str, stats: FunnelStats):
+        self.n = n
+        self.slug = product_slug
+        self.version = version
+        self.stats = stats
+        self.rf = RequestFactory()
+        self.tx = None
+        self.token = None
+
+    def _step(self, name: str, fn):
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except StepFailed as e:
+            self.stats.record(name, time.perf_counter() - start, str(e))
+            raise
+        except Exception as e:
+            self.stats.record(name, time.perf_counter() - start, type(e).__name__)
+            raise StepFailed(name) from e
+        self.stats.record(name, time.perf_counter() - start)
+        return result
+
+    def buy(self):
+        from store import views
+
+        email = f"buyer{self.n}-{uuid.uuid4().hex[:8]}@{EMAIL_DOMAIN}"
+        resp = views.buy(self.rf.post(f"/buy/{self.slug}/", {"email": email}), slug=self.slug)
+        if resp.status_code != 302:
+            raise StepFailed(f"HTTP {resp.status_code}")
+        return resp["Location"]
+
+    def pay(self, payment_url: str):
+        resp = requests.get(payment_url, allow_redirects=False, timeout=30)
+        if resp.status_code != 302:
+            raise StepFailed(f"HTTP {resp.status_code}")
+        self.tx = payment_url.rstrip("/").rsplit("/", 1)[-1]
+
+    def webhook(self):
+        from store import views
+
+        raw = json.dumps({"transaction_id": self.tx}).encode()
+        req = self.rf.post("/payment/notify/", data=raw, content_type="application/json")
+        resp = views.payment_notify(req)
+        if resp.status_code != 200:
+            raise StepFailed(f"HTTP {resp.status_code}")
+
+    def return_(self):
+        from store import views
+
+        resp = views.cinetpay_return(self.rf.get(RETURN_URL, {"transaction_id": self.tx}))
+        if resp.status_code != 302:
+            raise StepFailed(f"HTTP {resp.status_code}")
+        self.token = resp["Location"].rstrip("/").rsplit("/", 1)[-1]
+
+    def download(self):
+        from store import views
+
+        resp = views.download_version(
+            self.rf.get(f"/download/{self.token}/{self.version}/"),
+            token=self.token,
+            version=self.version,
+        )
+        if resp.status_code != 200:
+            raise StepFailed(f"HTTP {resp.status_code}")
+        for _ in getattr(resp, "streaming_content", [resp.content]):
+            pass
+        resp.close()
+
+    def run(self) -> None:
+        try:
+            payment_url = self._step("buy", self.buy)
+            self._step("pay", lambda: self.pay(payment_url))
+            self._step("webhook", self.webhook)
+            self._step("return", self.return_)
+            self._step("download", self.download)
+        except StepFailed:
+            return
+        self.stats.done()
+
+
+def _run_buyer(n, product_slug, version, stats, own_connection: bool):
+    if own_connection:
+        close_old_connections()
+    try:
+        _Buyer(n, product_slug, version, stats).run()
+    finally:
+        if own_connection:
+            connections.close_all()
+
+
+def run_funnel(
+    *,
+    product_slug: str,
+    buyers: int = 20,
+    concurrency: int = 4,
+    version: str = "a4",
+    emulator: CinetPayEmulator | None = None,
+) -> dict:
+    """
+    Lance `buyers` acheteurs virtuels, `concurrency` à la fois. Sans `emulator`,
+    un émulateur sans latence est démarré pour la durée du run.
+    concurrency=1 : tout tourne dans le thread appelant (utile sous SQLite).
+    """
+    own = emulator is None
+    emu = emulator or CinetPayEmulator(notify=False)
+    if own:
+        emu.start()
+    stats = FunnelStats()
+    start = time.perf_counter()
+    try:
+        with point_client_at(emu, return_url=RETURN_URL, notify_url=NOTIFY_URL):
+            if concurrency <= 1:
+                for n in range(buyers):
+                    _run_buyer(n, product_slug, version, stats, own_connection=False)
+            else:
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    futures = [
+                        pool.submit(_run_buyer, n, product_slug, version, stats, True)
+                        for n in range(buyers)
+                    ]
+                    for f in futures:
+                        f.result()
+    finally:
+        if own:
+            emu.stop()
+    report = stats.report(time.perf_counter() - start)
+    report.update(buyers=buyers, concurrency=concurrency, emulator=dict(emu.counters))
+    return report
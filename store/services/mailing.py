@@ -1,13 +1,11 @@
+import hashlib
+
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
-from downloads.models import (
-    DownloadableAsset,
-    DownloadCategory,
-    ExternalEntitlement,
-)
-from downloads.services import SignedUrlService
+from downloads.manifest import build_link_manifest
 from security.links import issue_bonus_start_link
+from store.services import outbox
 
 
 def _get_site_base_url() -> str:
@@ -20,58 +18,14 @@ def _get_site_base_url() -> str:
     return base.rstrip("/")
 
 
-def _ebook_variant_assets() -> list[DownloadableAsset]:
-    # Prefer assets in category 'ebook'; fallback by title regex anywhere
-    qs = DownloadableAsset.objects.filter(
-        category__slug="ebook",
-        is_published=True,
-        title__iregex=r"A4|6.?x.?9",
-    )
-    if qs.exists():
-        return list(qs.order_by("title"))
-    return list(
-        DownloadableAsset.objects.filter(
-            is_published=True,
-            title__iregex=r"A4|6.?x.?9",
-        ).order_by("title")
-    )
-
-
 def _signed_links_for_entitlements(email: str) -> list[dict]:
-    links: list[dict] = []
-    # EBOOK A4/6x9
-    for asset in _ebook_variant_assets():
-        try:
-            signed_url = SignedUrlService.get_signed_url(asset, expires=60 * 15)
-            links.append({"title": asset.title, "url": signed_url})
-        except Exception:
-            continue
-    # Other categories (if any entitlement exists)
-    extra_slugs = ("checklists", "outils-pratiques", "irregularites", "bonus")
-    ent_cats = (
-        ExternalEntitlement.objects.filter(
-            email__iexact=email,
-            category__slug__in=extra_slugs,
-        )
-        .values_list("category__slug", flat=True)
-        .distinct()
-    )
-    for slug in ent_cats:
-        cat = DownloadCategory.objects.filter(slug=slug).first()
-        if not cat:
-            continue
-        for asset in cat.assets.filter(is_published=True).order_by("order"):
-            try:
-                signed_url = SignedUrlService.get_signed_url(asset, expires=60 * 15)
-                links.append({"title": f"{cat.title} — {asset.title}", "url": signed_url})
-            except Exception:
-                continue
-    return links
+    # Manifeste résolu en une requête et mis en cache (downloads.manifest)
+    return build_link_manifest(email, expires=60 * 15)
 
 
-def send_fulfilment_email(*, to_email: str, order_ref: str | None = None) -> None:
+def build_fulfilment_email(*, to_email: str, order_ref: str | None = None):
     """
-    Envoie l'email de fulfilment (achats site ou externes) avec:
+    Construit l'email de fulfilment (achats site ou externes) avec:
     - liens signés ebook A4/6x9
     - autres bonus/ressources en fonction des entitlements
     - lien tokenisé /bonus/kit-preparation/start
@@ -121,7 +75,22 @@ def send_fulfilment_email(*, to_email: str, order_ref: str | None = None) -> Non
         subject=subject, body=text_body, from_email=sender, to=[to_email]
     )
     msg.attach_alternative(html_body, "text/html")
-    msg.send(fail_silently=False)
+    return msg
+
+
+def send_fulfilment_email(
+    *, to_email: str, order_ref: str | None = None, dedup: bool = True
+) -> None:
+    """
+    Met en file l'email de fulfilment (voir build_fulfilment_email).
+    `dedup=False` : renvoi explicite, même si ce mail est déjà parti pour `order_ref`.
+    """
+    msg = build_fulfilment_email(to_email=to_email, order_ref=order_ref)
+    outbox.enqueue(
+        msg,
+        kind="fulfilment",
+        dedup_key=f"fulfilment:{order_ref}" if order_ref and dedup else None,
+    )
 
 
 def send_bonus_published_email(*, to_email: str, pdf_url: str) -> None:
@@ -135,6 +104,7 @@ def send_bonus_published_email(*, to_email: str, pdf_url: str) -> None:
     html_body = render_to_string("emails/bonus_published.html", ctx)
     msg = EmailMultiAlternatives(subject=subject, body=text_body, from_email=sender, to=[to_email])
     msg.attach_alternative(html_body, "text/html")
-    msg.send(fail_silently=False)
+    digest = hashlib.sha256(pdf_url.encode("utf-8")).hexdigest()[:16]
+    outbox.enqueue(msg, kind="bonus_published", dedup_key=f"bonus_published:{digest}")
 
 
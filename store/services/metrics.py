@@ -0,0 +1,113 @@
+# store/services/metrics.py
+"""
+Métriques légères, locales au processus (pas de dépendance Prometheus).
+
+- Histogrammes de latence par nom (ex: "cinetpay./v2/payment/check").
+- Compteurs simples par nom (ex: "webhook.dedup.hit").
+- Thread-safe : les workers Passenger/Celery peuvent appeler `observe()` en parallèle.
+- `snapshot()` renvoie un dict sérialisable, exposé aux staff par la vue
+  `store:ops_metrics` (instantané du worker qui répond, identifié par son pid).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Bornes supérieures (secondes) des buckets ; le dernier bucket capte le reste.
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0)
+
+_lock = threading.Lock()
+_histograms: dict[str, "Histogram"] = {}
+_counters: dict[str, int] = {}
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float | None:
+        """Estimation (borne haute du bucket) du quantile q ∈ [0, 1]."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def as_dict(self) -> dict:
+        labels = [f"le_{b:g}" for b in self.buckets] + ["le_inf"]
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "avg": round(self.total / self.count, 6) if self.count else None,
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+def observe(name: str, seconds: float) -> None:
+    with _lock:
+        h = _histograms.get(name)
+        if h is None:
+            h = _histograms[name] = Histogram()
+        h.observe(seconds)
+
+
+def quantile(name: str, q: float, min_count: int = 1) -> float | None:
+    """Quantile estimé d'un histogramme, ou None s'il a moins de `min_count` mesures."""
+    with _lock:
+        h = _histograms.get(name)
+        if h is None or h.count < min_count:
+            return None
+        return h.quantile(q)
+
+
+def incr(name: str, n: int = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+@contextmanager
+def timed(name: str):
+    """`with timed("x"):` → enregistre la durée du bloc, même en cas d'exception."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def snapshot(prefix: str = "") -> dict:
+    """Histogrammes (dict) et compteurs (int) dont le nom commence par `prefix`."""
+    with _lock:
+        data = {k: h.as_dict() for k, h in _histograms.items() if k.startswith(prefix)}
+        data.update((k, v) for k, v in _counters.items() if k.startswith(prefix))
+    return dict(sorted(data.items()))
+
+
+def reset() -> None:
+    """Vide toutes les métriques (tests, rechargements)."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
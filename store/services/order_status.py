@@ -0,0 +1,41 @@
+# store/services/order_status.py
+"""
+Statut de commande en cache, lu par la page d'attente au retour de CinetPay.
+
+La page de retour amorce la clé (une lecture DB) ; le traitement du paiement
+(webhook, worker, réconciliation) la met à jour après commit. Chaque poll de la
+page d'attente ne coûte alors qu'un GET de cache ; la base n'est relue qu'au
+passage en PAID (émission du lien) ou si la clé a été évincée.
+"""
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CACHE_PREFIX = "order:status"
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "ORDER_STATUS_CACHE_TTL", 3600))
+
+
+def cache_key(order_ref: str) -> str:
+    return f"{CACHE_PREFIX}:{order_ref}"
+
+
+def read(order_ref: str) -> str | None:
+    return cache.get(cache_key(order_ref))
+
+
+def seed(order_ref: str, status: str) -> None:
+    """Amorce sans écraser une valeur plus fraîche publiée entre-temps."""
+    if order_ref:
+        cache.add(cache_key(order_ref), status, _ttl())
+
+
+def publish(order_ref: str | None, status: str) -> None:
+    """Publie le nouveau statut une fois la transaction validée (jamais avant le commit)."""
+    if not order_ref:
+        return
+    transaction.on_commit(lambda: cache.set(cache_key(order_ref), status, _ttl()))
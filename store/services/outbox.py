@@ -0,0 +1,245 @@
+# store/services/outbox.py
+"""
+Outbox des e-mails transactionnels.
+
+- `enqueue(message, kind=..., dedup_key=...)` : une ligne EmailOutbox par
+  destinataire, insérée dans la transaction de l'appelant (le mail n'existe que
+  si le changement métier est commité). Après commit, la tâche `drain_email_outbox`
+  est planifiée ; Beat la relance aussi périodiquement.
+- `drain()` : lots réservés via SELECT ... FOR UPDATE SKIP LOCKED, envoyés sur
+  UNE connexion `get_connection()` ouverte une fois par lot (un seul handshake
+  SMTP/SSL au lieu d'un par message).
+- Échec d'envoi : backoff exponentiel (next_attempt_at), abandon (FAILED)
+  après EMAIL_OUTBOX_MAX_ATTEMPTS tentatives.
+- Dédoublonnage par destinataire : `dedup_key` + adresse, contrainte d'unicité.
+
+EMAIL_OUTBOX=0 : envoi immédiat dans l'appelant (comportement historique).
+"""
+from __future__ import annotations
+
+import base64
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from store.models import EmailOutbox
+from store.services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Un worker mort en plein lot : ses lignes redeviennent éligibles après ce délai.
+CLAIM_TIMEOUT = timedelta(minutes=10)
+BACKOFF_BASE = 60  # s, doublé à chaque tentative
+BACKOFF_MAX = 3600
+
+
+def enabled() -> bool:
+    return getattr(settings, "EMAIL_OUTBOX", True)
+
+
+def max_attempts() -> int:
+    return getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 8)
+
+
+def _html(message) -> str:
+    for content, mimetype in getattr(message, "alternatives", None) or []:
+        if mimetype == "text/html":
+            return content
+    return ""
+
+
+def _attachments(message) -> list[dict]:
+    out = []
+    for name, content, mimetype in message.attachments:
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        out.append({
+            "name": name,
+            "mimetype": mimetype or "application/octet-stream",
+            "content_b64": base64.b64encode(content).decode("ascii"),
+        })
+    return out
+
+
+def recipient_key(dedup_key: str, to: str) -> str:
+    """Clé de dédoublonnage d'un destinataire (colonne EmailOutbox.dedup_key)."""
+    return f"{dedup_key}:{to.lower()}"[:191]
+
+
+def enqueue(
+    message, *, kind: str, dedup_key: str | None = None, schedule: bool = True
+) -> list[EmailOutbox]:
+    """
+    Met `message` (EmailMessage / EmailMultiAlternatives) en file, une ligne par
+    destinataire de `to`. Un destinataire déjà en file pour la même `dedup_key`
+    est ignoré. Retourne les lignes créées.
+    `schedule=False` : pas de drain planifié (l'appelant envoie lui-même, cf. resend).
+    """
+    if not enabled():
+        message.send(fail_silently=False)
+        return []
+
+    common = {
+        "kind": kind,
+        "from_email": message.from_email or "",
+        "reply_to": list(message.reply_to or []),
+        "subject": message.subject,
+        "body_text": message.body or "",
+        "body_html": _html(message),
+        "attachments": _attachments(message),
+    }
+    created = []
+    with transaction.atomic():
+        for to in message.to:
+            if dedup_key:
+                row, is_new = EmailOutbox.objects.get_or_create(
+                    dedup_key=recipient_key(dedup_key, to),
+                    defaults={"to_email": to, **common},
+                )
+                if not is_new:
+                    metrics.incr("email.dedup")
+                    continue
+            else:
+                row = EmailOutbox.objects.create(to_email=to, **common)
+            created.append(row)
+    if created and schedule:
+        transaction.on_commit(_kick)
+    return created
+
+
+def _kick() -> None:
+    from store.services.payments import PUBLISH_RETRY_POLICY
+    from store.tasks import drain_email_outbox
+
+    try:
+        drain_email_outbox.apply_async(retry=True, retry_policy=PUBLISH_RETRY_POLICY)
+    except Exception:
+        # Beat reprendra la file ; le mail est déjà persisté.
+        logger.exception("[outbox] Broker indisponible, envoi différé")
+
+
+def to_message(row: EmailOutbox, connection=None) -> EmailMultiAlternatives:
+    msg = EmailMultiAlternatives(
+        subject=row.subject,
+        body=row.body_text,
+        from_email=row.from_email or None,
+        to=[row.to_email],
+        reply_to=row.reply_to or None,
+        connection=connection,
+    )
+    if row.body_html:
+        msg.attach_alternative(row.body_html, "text/html")
+    for a in row.attachments or []:
+        msg.attach(a["name"], base64.b64decode(a["content_b64"]), a["mimetype"])
+    return msg
+
+
+def claim_batch(batch_size: int = 50, *, dedup_keys=None) -> list[EmailOutbox]:
+    """
+    Réserve jusqu'à `batch_size` e-mails dus (FIFO), sans attendre les lignes
+    verrouillées. `dedup_keys` restreint la réservation à ces lignes.
+    """
+    now = timezone.now()
+    qs = EmailOutbox.objects.select_for_update(skip_locked=True).filter(
+        status=EmailOutbox.PENDING, next_attempt_at__lte=now
+    )
+    if dedup_keys is not None:
+        qs = qs.filter(dedup_key__in=dedup_keys)
+    with transaction.atomic():
+        rows = list(
+            qs.filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - CLAIM_TIMEOUT))
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        if rows:
+            EmailOutbox.objects.filter(pk__in=[r.pk for r in rows]).update(
+                claimed_at=now, attempts=F("attempts") + 1
+            )
+    for r in rows:
+        r.attempts += 1
+    return rows
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** max(0, attempts - 1), BACKOFF_MAX))
+
+
+def _mark_sent(row: EmailOutbox) -> None:
+    EmailOutbox.objects.filter(pk=row.pk).update(
+        status=EmailOutbox.SENT, sent_at=timezone.now(), claimed_at=None, error=""
+    )
+    metrics.incr("email.sent")
+
+
+def _mark_failed(row: EmailOutbox, error: Exception) -> str:
+    if row.attempts >= max_attempts():
+        status, next_at = EmailOutbox.FAILED, timezone.now()
+        metrics.incr("email.failed")
+        logger.error("[outbox] abandon %s → %s : %s", row.kind, row.to_email, error)
+    else:
+        status, next_at = EmailOutbox.PENDING, timezone.now() + _backoff(row.attempts)
+        metrics.incr("email.retry")
+    EmailOutbox.objects.filter(pk=row.pk).update(
+        status=status, next_attempt_at=next_at, claimed_at=None, error=str(error)[:1000]
+    )
+    return status
+
+
+def _reopen(connection) -> None:
+    try:
+        connection.close()
+        connection.open()
+    except Exception:
+        logger.warning("[outbox] réouverture SMTP impossible", exc_info=True)
+
+
+def send_batch(rows: list[EmailOutbox], *, limiter=None) -> dict:
+    """
+    Envoie un lot sur une seule connexion ; retourne {"sent", "retry", "failed"}.
+    `limiter` (RateLimiter) : débit plafonné, un créneau par message.
+    """
+    counts = {"sent": 0, "retry": 0, "failed": 0}
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning("[outbox] connexion SMTP impossible : %s", e)
+        for row in rows:
+            status = _mark_failed(row, e)
+            counts["failed" if status == EmailOutbox.FAILED else "retry"] += 1
+        return counts
+    try:
+        with metrics.timed("email.batch"):
+            for row in rows:
+                if limiter is not None:
+                    limiter.acquire()
+                try:
+                    to_message(row, connection).send(fail_silently=False)
+                except Exception as e:
+                    status = _mark_failed(row, e)
+                    counts["failed" if status == EmailOutbox.FAILED else "retry"] += 1
+                    _reopen(connection)  # session SMTP possiblement coupée
+                else:
+                    _mark_sent(row)
+                    counts["sent"] += 1
+    finally:
+        connection.close()
+    return counts
+
+
+def drain(batch_size: int = 50, max_batches: int | None = None) -> dict:
+    """Vide la file par lots ; retourne les compteurs cumulés."""
+    totals = {"sent": 0, "retry": 0, "failed": 0}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = claim_batch(batch_size)
+        if not rows:
+            break
+        for k, v in send_batch(rows).items():
+            totals[k] += v
+        batches += 1
+    return totals
@@ -0,0 +1,185 @@
+# store/services/payments.py
+"""
+Pipeline webhook CinetPay en deux phases.
+
+Phase 1 (vue HTTP, quelques ms) : signature vérifiée, événement journalisé, ack 200.
+Phase 2 (worker Celery) : check S2S + livraison, SANS verrou de ligne ni transaction
+ouverte pendant les appels réseau/SMTP. Les changements d'état passent par des
+UPDATE conditionnels (compare-and-set sur `status`) : un seul worker « gagne »
+la transition vers PAID et déclenche la livraison.
+
+La livraison est une étape distincte, confirmée par l'événement DELIVERED : un échec
+SMTP lève DeliveryError et la tâche Celery la rejoue, sans refaire le check.
+"""
+from __future__ import annotations
+
+import logging
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from store.models import Order, Payment, PaymentEvent
+from store.services import order_status
+from store.services.cinetpay import payment_check
+from store.utils.tokens import issue_order_download_token
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ("PAID",)
+
+# Publication vers le broker : on abandonne vite plutôt que de retenir l'ack webhook.
+PUBLISH_RETRY_POLICY = {
+    "max_retries": 1,
+    "interval_start": 0,
+    "interval_step": 0.2,
+    "interval_max": 0.2,
+}
+
+
+class DeliveryError(Exception):
+    """Paiement acquis (PAID) mais livraison non confirmée : à réessayer."""
+
+
+def _event(payment: Payment, kind: str, payload: dict | None = None) -> None:
+    try:
+        PaymentEvent.objects.create(payment=payment, kind=kind, payload=payload or {})
+    except Exception:
+        logger.exception("Failed to persist %s for %s", kind, payment.order_id)
+
+
+def _compare_and_set(payment: Payment, new_status: str, **fields) -> bool:
+    """
+    Transition optimiste : n'écrit que si la ligne n'est pas déjà dans un état final.
+    Retourne True si CE processus a effectué la transition.
+    """
+    updated = (
+        Payment.objects.filter(pk=payment.pk)
+        .exclude(status__in=FINAL_STATUSES)
+        .update(status=new_status, updated_at=timezone.now(), **fields)
+    )
+    if updated:
+        payment.status = new_status
+        for k, v in fields.items():
+            setattr(payment, k, v)
+    return bool(updated)
+
+
+def _delivered(payment: Payment) -> bool:
+    return PaymentEvent.objects.filter(payment=payment, kind="DELIVERED").exists()
+
+
+def _deliver(payment: Payment) -> str:
+    try:
+        deliver_ebook(payment)
+    except Exception as e:
+        logger.exception("Delivery error for %s: %s", payment.order_id, e)
+        raise DeliveryError(str(e)) from e
+    return "delivered"
+
+
+def settle_payment(order_id: str, *, retry_delivery: bool = False) -> str:
+    """
+    Phase 2 : vérifie la transaction côté CinetPay puis livre (une seule fois).
+    Lève CinetPayError (réseau) ou DeliveryError (SMTP…) pour laisser Celery réessayer.
+    `retry_delivery=True` (retry de la tâche) : un paiement déjà PAID mais sans
+    événement DELIVERED est relivré.
+    Retourne un code court : unknown_order | already_paid | check_failed | delivered.
+    """
+    payment = Payment.objects.filter(order_id=order_id).first()
+    if payment is None:
+        logger.error("Settlement for unknown order_id=%s", order_id)
+        return "unknown_order"
+    if payment.status in FINAL_STATUSES:
+        if retry_delivery and not _delivered(payment):
+            return _deliver(payment)
+        return "already_paid"
+
+    # Appel réseau hors transaction : aucun verrou ni connexion Postgres bloqués.
+    ok, provider_tx_id = payment_check(order_id, raise_on_error=True)
+
+    if not ok:
+        if _compare_and_set(payment, "FAILED"):
+            _event(payment, "CHECK_FAIL")
+        return "check_failed"
+
+    fields = {"provider_tx_id": provider_tx_id} if provider_tx_id else {}
+    if not _compare_and_set(payment, "PAID", **fields):
+        # Un autre worker a déjà effectué la transition → pas de double livraison.
+        return "already_paid"
+    _event(payment, "CHECK_OK", {"provider_tx_id": provider_tx_id})
+    return _deliver(payment)
+
+
+def mark_order_paid(order: Order, provider_tx: str | None = None) -> bool:
+    """
+    Passe une Order en PAID par UPDATE conditionnel puis déclenche le fulfilment
+    (une seule fois, même si plusieurs webhooks arrivent en parallèle).
+    """
+    now = timezone.now()
+    fields = {"cinetpay_payment_id": provider_tx} if provider_tx else {}
+    updated = (
+        Order.objects.filter(pk=order.pk)
+        .exclude(status__in=FINAL_STATUSES)
+        .update(status="PAID", paid_at=now, **fields)
+    )
+    if not updated:
+        return False
+    order.mark_paid(provider="cinetpay", provider_tx=provider_tx, save=False)
+    order.paid_at = now
+    return True
+
+
+def mark_order_failed(order: Order) -> bool:
+    """Passe une Order en FAILED, sauf si elle est déjà payée."""
+    updated = (
+        Order.objects.filter(pk=order.pk)
+        .exclude(status__in=FINAL_STATUSES)
+        .update(status="FAILED")
+    )
+    if updated:
+        order.status = "FAILED"
+        order_status.publish(order.provider_ref, "FAILED")
+    return bool(updated)
+
+
+def enqueue_settlement(order_id: str) -> None:
+    """
+    Planifie la phase 2 après commit. Broker indisponible : on journalise et on
+    n'essaie PAS de régler dans la requête (check S2S + SMTP hors ack). Le Payment
+    reste en attente ; un retry webhook CinetPay ou la réconciliation le reprendra.
+    """
+
+    def _send():
+        from store.tasks import process_payment_webhook
+
+        try:
+            process_payment_webhook.apply_async(
+                (order_id,), retry=True, retry_policy=PUBLISH_RETRY_POLICY
+            )
+        except Exception:
+            logger.exception("Broker indisponible, settlement non planifié pour %s", order_id)
+
+    transaction.on_commit(_send)
+
+
+def deliver_ebook(payment):
+    """
+    Génère un lien de téléchargement unique et expirable, envoie l'e-mail, journalise l'event.
+    """
+    order = Order.objects.filter(provider_ref=payment.order_id).first()
+    if not order:
+        return
+    token = issue_order_download_token(order)
+    base_url = settings.CINETPAY_RETURN_URL.rstrip("/")
+    download_url = f"{base_url}" + reverse("downloads:secure_token", args=[token])
+    subject = "Votre lien de téléchargement AuditShield"
+    message = (
+        f"Merci pour votre achat !\n\n"
+        f"Téléchargez votre ebook ici (valable 72h) : {download_url}\n\n"
+        f"Ceci est un lien personnel et temporaire."
+    )
+    send_mail(subject, message, None, [payment.email])
+    _event(payment, "DELIVERED", {"download_url": download_url})
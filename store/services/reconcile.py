@@ -0,0 +1,281 @@
+# store/services/reconcile.py
+"""
+Réconciliation en masse des commandes restées en attente (webhook jamais reçu).
+
+- Sélection des Order CREATED/PENDING « périmées », par lots paginés sur la clé primaire.
+- `check_transaction` appelé en parallèle via un pool de threads borné, avec un
+  débit plafonné (GCRA) pour ne pas se faire limiter par CinetPay.
+- Transitions appliquées en bloc (un UPDATE par statut et par lot) sur les seules
+  lignes encore en attente : un webhook concurrent qui a déjà payé la ligne gagne.
+  Le Payment jumeau (Payment.order_id == Order.provider_ref) est aligné dans la
+  même transaction, sans seconde livraison.
+- Fulfilment déclenché après commit, uniquement pour les lignes passées en PAID ici.
+- Un seul run à la fois : verrou consultatif Postgres (pg_try_advisory_lock),
+  partagé entre Beat, workers et commande manuelle.
+
+Les Payment sans Order ne sont pas balayés ici : `deliver_ebook` n'a rien à livrer
+sans Order ; leur règlement reste l'affaire de `settle_payment` (webhook / retry).
+
+Les threads ne font que du HTTP ; toutes les écritures DB restent dans le thread appelant.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from store.models import Order, Payment
+from store.services import cinetpay, metrics, order_status
+from store.services.cinetpay import CinetPayError
+
+logger = logging.getLogger(__name__)
+
+ORDER_PENDING_STATUSES = ("CREATED", "PENDING")
+PAYMENT_PENDING_STATUSES = ("INIT", "PENDING")
+
+PAID_STATUSES = ("ACCEPTED", "PAID", "SUCCESS", "COMPLETED")
+FAILED_STATUSES = ("REFUSED", "CANCELED", "CANCELLED", "FAILED")
+
+PAID = "paid"
+FAILED = "failed"
+PENDING = "pending"
+ERROR = "error"
+
+# Clé du verrou consultatif Postgres (entier 64 bits arbitraire mais stable).
+ADVISORY_LOCK_ID = 0x5EC0_9A7E
+# Hors Postgres (tests SQLite) : verrou local au processus.
+_local_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    Limiteur de débit thread-safe (GCRA) : au plus `rate` acquisitions par seconde,
+    avec une rafale initiale de `burst` (0 = illimité). Chaque appel réserve son
+    créneau sous verrou puis dort hors verrou : pas de boucle, pas de dérive flottante.
+    `clock`/`sleep` sont injectables (tests).
+    """
+
+    def __init__(self, rate: float, burst: int | None = None, clock=None, sleep=None):
+        self.rate = float(rate or 0)
+        self.burst = burst or max(1, int(self.rate))
+        self.clock = clock or time.monotonic
+        self.sleep = sleep or time.sleep
+        self._tat = None  # « theoretical arrival time » du prochain créneau
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        interval = 1.0 / self.rate
+        with self._lock:
+            now = self.clock()
+            tat = now if self._tat is None else max(self._tat, now)
+            allowed_at = tat - (self.burst - 1) * interval
+            self._tat = tat + interval
+        wait = allowed_at - now
+        if wait > 0:
+            self.sleep(wait)
+
+
+def classify(resp: dict) -> tuple[str, str | None]:
+    """Réponse /v2/payment/check → (paid|failed|pending, provider_tx_id)."""
+    code = str(resp.get("code", ""))
+    data = resp.get("data") or {}
+    status = (data.get("status") or "").upper()
+    provider_tx_id = data.get("transaction_id") or data.get("cpm_trans_id")
+    if code in ("00", "201") and status in PAID_STATUSES:
+        return PAID, provider_tx_id
+    if status in FAILED_STATUSES:
+        return FAILED, provider_tx_id
+    return PENDING, provider_tx_id
+
+
+def _check(tx_id: str, limiter: RateLimiter) -> tuple[str, str | None]:
+    limiter.acquire()
+    try:
+        return classify(cinetpay.check_transaction(tx_id))
+    except CinetPayError as e:
+        logger.warning("[reconcile] check %s: %s", tx_id, e)
+        return ERROR, None
+    except Exception:
+        logger.exception("[reconcile] check %s", tx_id)
+        return ERROR, None
+
+
+def _chunks(qs, chunk_size: int):
+    """Pagination par clé primaire (stable même si les lignes changent de statut)."""
+    last_pk = 0
+    while True:
+        rows = list(qs.filter(pk__gt=last_pk).order_by("pk")[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1].pk
+
+
+def _claim_pending(model, ids, pending_statuses) -> list:
+    """
+    Verrouille les lignes encore en attente parmi `ids`
+    (SKIP LOCKED : un webhook en cours de traitement gagne).
+    """
+    if not ids:
+        return []
+    return list(
+        model.objects.select_for_update(skip_locked=True)
+        .filter(pk__in=ids, status__in=pending_statuses)
+    )
+
+
+def _apply(results: dict[int, tuple[str, str | None]]) -> tuple[list[Order], int]:
+    """Applique les verdicts ; retourne (Orders passées en PAID ici, nb passées en FAILED)."""
+    paid_ids = [pk for pk, (outcome, _) in results.items() if outcome == PAID]
+    failed_ids = [pk for pk, (outcome, _) in results.items() if outcome == FAILED]
+    now = timezone.now()
+    with transaction.atomic():
+        paid = _claim_pending(Order, paid_ids, ORDER_PENDING_STATUSES)
+        Order.objects.filter(pk__in=[o.pk for o in paid]).update(status="PAID", paid_at=now)
+        with_tx = []
+        for o in paid:
+            tx = results[o.pk][1]
+            if tx:
+                o.cinetpay_payment_id = tx
+                with_tx.append(o)
+        if with_tx:
+            Order.objects.bulk_update(with_tx, ["cinetpay_payment_id"])
+
+        failed = _claim_pending(Order, failed_ids, ORDER_PENDING_STATUSES)
+        Order.objects.filter(pk__in=[o.pk for o in failed]).update(status="FAILED")
+        for o in failed:
+            order_status.publish(o.provider_ref, "FAILED")
+
+        # Payment jumeau (même transaction) : aligné sans seconde livraison.
+        Payment.objects.filter(
+            order_id__in=[o.provider_ref for o in paid], status__in=PAYMENT_PENDING_STATUSES
+        ).update(status="PAID", updated_at=now)
+        Payment.objects.filter(
+            order_id__in=[o.provider_ref for o in failed], status__in=PAYMENT_PENDING_STATUSES
+        ).update(status="FAILED", updated_at=now)
+    return paid, len(failed)
+
+
+def _fulfil(orders: list[Order]) -> None:
+    for order in orders:
+        # Statut déjà écrit en bloc : mark_paid ne sert qu'à déclencher le fulfilment.
+        order.mark_paid(
+            provider="cinetpay", provider_tx=order.cinetpay_payment_id or None, save=False
+        )
+
+
+@contextmanager
+def single_flight():
+    """
+    Verrou d'exécution unique. Postgres : pg_try_advisory_lock (niveau session,
+    visible de tous les processus). Autres moteurs : verrou local au processus.
+    Produit True si le verrou est obtenu, False sinon (sans attendre).
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s)", [ADVISORY_LOCK_ID])
+            acquired = cur.fetchone()[0]
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with connection.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_unlock(%s)", [ADVISORY_LOCK_ID])
+        return
+
+    acquired = _local_lock.acquire(blocking=False)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            _local_lock.release()
+
+
+def reconcile(
+    *,
+    stale_after: timedelta | None = None,
+    max_age: timedelta | None = None,
+    chunk_size: int | None = None,
+    workers: int | None = None,
+    rate: float | None = None,
+    limit: int | None = None,
+    dry_run: bool = False,
+) -> dict | None:
+    """
+    Balaye les Order en attente et applique le verdict CinetPay.
+
+    Retourne des compteurs, ou None si un autre run est déjà en cours :
+    - checked : transactions vérifiées ;
+    - paid / failed : lignes effectivement passées en PAID / FAILED par ce run
+      (en dry-run : verdicts qui auraient déclenché la transition) ;
+    - pending / error : verdicts « toujours en attente » / erreurs réseau.
+    """
+    with single_flight() as acquired:
+        if not acquired:
+            logger.info("[reconcile] run déjà en cours, abandon")
+            return None
+        return _reconcile(
+            stale_after=stale_after,
+            max_age=max_age,
+            chunk_size=chunk_size,
+            workers=workers,
+            rate=rate,
+            limit=limit,
+            dry_run=dry_run,
+        )
+
+
+def _reconcile(*, stale_after, max_age, chunk_size, workers, rate, limit, dry_run) -> dict:
+    stale_after = stale_after or timedelta(
+        minutes=getattr(settings, "PAYMENT_RECONCILE_STALE_MINUTES", 15)
+    )
+    max_age = max_age or timedelta(
+        hours=getattr(settings, "PAYMENT_RECONCILE_MAX_AGE_HOURS", 72)
+    )
+    chunk_size = chunk_size or getattr(settings, "PAYMENT_RECONCILE_CHUNK", 200)
+    workers = workers or getattr(settings, "PAYMENT_RECONCILE_WORKERS", 8)
+    if rate is None:
+        rate = getattr(settings, "PAYMENT_RECONCILE_RATE", 10.0)
+
+    now = timezone.now()
+    qs = (
+        Order.objects.filter(
+            status__in=ORDER_PENDING_STATUSES,
+            created_at__lt=now - stale_after,
+            created_at__gte=now - max_age,
+        )
+        .exclude(provider_ref__isnull=True)
+        .select_related("product")
+    )
+
+    counts = {"checked": 0, PAID: 0, FAILED: 0, PENDING: 0, ERROR: 0}
+    limiter = RateLimiter(rate)
+    with metrics.timed("reconcile.run"), ThreadPoolExecutor(max_workers=workers) as pool:
+        for rows in _chunks(qs, chunk_size):
+            if limit is not None:
+                rows = rows[: max(0, limit - counts["checked"])]
+                if not rows:
+                    break
+            outcomes = pool.map(lambda o: _check(o.provider_ref, limiter), rows)
+            results = dict(zip((o.pk for o in rows), outcomes))
+            counts["checked"] += len(rows)
+            for outcome, _ in results.values():
+                if outcome in (PENDING, ERROR) or dry_run:
+                    counts[outcome] += 1
+            if not dry_run:
+                newly_paid, failed = _apply(results)
+                counts[PAID] += len(newly_paid)
+                counts[FAILED] += failed
+                if newly_paid:
+                    transaction.on_commit(lambda orders=newly_paid: _fulfil(orders))
+            logger.info("[reconcile] lot de %d → %s", len(rows), counts)
+    return counts
@@ -0,0 +1,115 @@
+# store/services/resend.py
+"""
+Campagne de renvoi de l'email de fulfilment (nouveaux livrables) à tous les acheteurs.
+
+- Populations : Order PAID puis ExternalEntitlement, lues en flux (`iterator()`)
+  et traitées par tranches : mémoire constante quel que soit le volume.
+- Un destinataire = une ligne EmailOutbox de clé `resend:<campagne>:<email>` :
+  c'est à la fois le dédoublonnage (un acheteur présent dans les deux populations
+  ne reçoit qu'un mail) et le point de reprise (une campagne relancée saute les
+  destinataires déjà servis, une requête par tranche).
+- Envoi par tranche sur une seule connexion SMTP, débit plafonné (RateLimiter).
+  Les échecs restent en file avec backoff : le drain de l'outbox les reprendra.
+"""
+from __future__ import annotations
+
+import logging
+import time
+
+from downloads.models import ExternalEntitlement
+from store.models import EmailOutbox, Order
+from store.services import outbox
+from store.services.mailing import build_fulfilment_email
+from store.services.reconcile import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+SOURCES = ("orders", "entitlements")
+KIND = "resend"
+
+
+def _recipients(sources, chunk_size: int):
+    """(email, order_ref) en flux, dans l'ordre des clés primaires."""
+    if "orders" in sources:
+        qs = Order.objects.filter(status="PAID").exclude(email="").order_by("pk")
+        yield from qs.values_list("email", "provider_ref").iterator(chunk_size=chunk_size)
+    if "entitlements" in sources:
+        qs = ExternalEntitlement.objects.exclude(email="")
+        yield from qs.order_by("pk").values_list("email", "order_ref").iterator(
+            chunk_size=chunk_size
+        )
+
+
+def _chunks(iterable, size: int):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_campaign(
+    campaign: str,
+    *,
+    sources=SOURCES,
+    rate: float = 5.0,
+    chunk_size: int = 200,
+    limit: int | None = None,
+    dry_run: bool = False,
+    progress=None,
+) -> dict:
+    """
+    Envoie l'email de fulfilment à chaque destinataire pas encore servi par `campaign`.
+    Retourne {"seen", "skipped", "queued", "sent", "retry", "failed", "elapsed", "rate"}.
+    `progress(counts)` est appelé après chaque tranche.
+    """
+    prefix = f"{KIND}:{campaign}"
+    limiter = RateLimiter(rate)
+    counts = {"seen": 0, "skipped": 0, "queued": 0, "sent": 0, "retry": 0, "failed": 0}
+    start = time.monotonic()
+
+    for chunk in _chunks(_recipients(sources, chunk_size), chunk_size):
+        by_key = {}
+        for email, order_ref in chunk:
+            by_key.setdefault(outbox.recipient_key(prefix, email), (email, order_ref))
+        counts["seen"] += len(chunk)
+        done = set(
+            EmailOutbox.objects.filter(dedup_key__in=list(by_key))
+            .values_list("dedup_key", flat=True)
+        )
+        for key, (email, order_ref) in by_key.items():
+            if key in done:
+                continue
+            if limit is not None and counts["queued"] >= limit:
+                break
+            counts["queued"] += 1
+            if dry_run:
+                continue
+            try:
+                msg = build_fulfilment_email(to_email=email, order_ref=order_ref)
+            except Exception:
+                logger.exception("[resend] %s : construction du mail pour %s", campaign, email)
+                counts["failed"] += 1
+                continue
+            outbox.enqueue(msg, kind=KIND, dedup_key=prefix, schedule=False)
+        counts["skipped"] = counts["seen"] - counts["queued"]
+
+        if not dry_run:
+            # Lignes nouvelles + restes d'un run interrompu (toujours PENDING).
+            rows = outbox.claim_batch(len(by_key), dedup_keys=list(by_key))
+            if rows:
+                for k, v in outbox.send_batch(rows, limiter=limiter).items():
+                    counts[k] += v
+        if progress:
+            progress(dict(counts))
+        if limit is not None and counts["queued"] >= limit:
+            break
+
+    elapsed = time.monotonic() - start
+    counts["elapsed"] = round(elapsed, 3)
+    counts["rate"] = round(counts["sent"] / elapsed, 2) if elapsed else None
+    logger.info("[resend] %s : %s", campaign, counts)
+    return counts
@@ -0,0 +1,189 @@
+# store/services/watermark.py
+"""
+Personnalisation des PDF d'ebook à la volée (download_version).
+
+- Pied de page « Propriété de : nom / email — commande <ref> » sur chaque page.
+- Source analysée une fois par processus (PdfReader gardé en LRU, clé chemin + mtime
+  + taille) ; par acheteur on ne génère que le petit flux de pied de page.
+- Pas de fusion de contenus (merge_page relit chaque page) : le flux existant est
+  encadré par `q … Q` et le pied de page ajouté en flux supplémentaire, la police
+  Helvetica étant déclarée dans les ressources de la page.
+- Résultat écrit une fois par commande/version dans PDF_WATERMARK_CACHE_DIR (nom
+  atomique), puis servi par store.utils.delivery (Range, ETag, x-accel) ; éviction
+  LRU (mtime rafraîchi à chaque service) au-delà de PDF_WATERMARK_CACHE_MAX_BYTES.
+
+Sans PyPDF2, PDF chiffré, stockage sans chemin local ou erreur : `stamped_pdf`
+renvoie None et l'appelant sert le fichier d'origine.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    from PyPDF2 import PdfReader, PdfWriter
+    from PyPDF2.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject
+except Exception:  # dépendance facultative
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+FONT_NAME = "/AsWm"
+FONT_SIZE = 7
+MARGIN = 12  # pt depuis le bas de page
+SOURCE_CACHE_SIZE = 4
+
+_sources: OrderedDict = OrderedDict()
+_sources_lock = threading.Lock()
+# PdfReader n'est pas sûr entre threads (lecture paresseuse sur un même flux).
+_stamp_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return PdfReader is not None and getattr(settings, "PDF_WATERMARK", True)
+
+
+def _cache_dir() -> Path:
+    return Path(
+        getattr(settings, "PDF_WATERMARK_CACHE_DIR", None)
+        or Path(settings.PRIVATE_MEDIA_ROOT) / "_watermarked"
+    )
+
+
+def _fingerprint(path: str) -> tuple[tuple, str]:
+    """Clé (chemin, mtime, taille) du source et son empreinte courte, sans le lire."""
+    stat = os.stat(path)
+    key = (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+    return key, hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:12]
+
+
+def _reader(key: tuple):
+    """PdfReader du source, analysé une fois par processus."""
+    with _sources_lock:
+        if key in _sources:
+            _sources.move_to_end(key)
+            return _sources[key]
+    reader = PdfReader(key[0])
+    if reader.is_encrypted:
+        raise ValueError("PDF chiffré")
+    len(reader.pages)  # arbre des pages aplati une fois (ressources héritées)
+    with _sources_lock:
+        _sources[key] = reader
+        while len(_sources) > SOURCE_CACHE_SIZE:
+            _sources.popitem(last=False)
+    return reader
+
+
+def footer_text(order) -> str:
+    name = " ".join(p for p in (order.first_name, order.last_name) if p).strip()
+    owner = f"{name} / {order.email}" if name else order.email
+    return f"Propriété de : {owner} — commande {order.uuid}"
+
+
+def _pdf_string(text: str) -> bytes:
+    raw = text.encode("cp1252", errors="replace")  # WinAnsiEncoding
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _stream(writer, data: bytes):
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return writer._add_object(stream)
+
+
+def _stamp(reader, text: str, out) -> None:
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+        NameObject("/Encoding"): NameObject("/WinAnsiEncoding"),
+    }))
+    label = _pdf_string(text)
+    save = _stream(writer, b"q\n")
+    footers = {}  # un flux par origine de page (souvent un seul)
+    for source_page in reader.pages:
+        page = writer.add_page(source_page)
+        box = page.mediabox
+        origin = (float(box.left), float(box.bottom))
+        if origin not in footers:
+            footers[origin] = _stream(writer, (
+                b"Q\nq BT 0.45 g " + FONT_NAME.encode() + b" %d Tf %.2f %.2f Td "
+                % (FONT_SIZE, origin[0] + 36, origin[1] + MARGIN) + label + b" Tj ET Q\n"
+            ))
+
+        contents = page.get("/Contents")
+        parts = ArrayObject([save])
+        if contents is not None:
+            resolved = contents.get_object()
+            parts.extend(resolved if isinstance(resolved, ArrayObject) else [contents])
+        parts.append(footers[origin])
+        page[NameObject("/Contents")] = parts
+
+        # Dictionnaires souvent partagés entre pages : complétés en place, pas recopiés.
+        if "/Resources" not in page:
+            page[NameObject("/Resources")] = DictionaryObject()
+        resources = page["/Resources"].get_object()
+        if "/Font" not in resources:
+            resources[NameObject("/Font")] = DictionaryObject()
+        resources["/Font"].get_object()[NameObject(FONT_NAME)] = font
+    writer.write(out)
+
+
+def _evict(directory: Path, keep: Path) -> None:
+    budget = getattr(settings, "PDF_WATERMARK_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+    files = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".pdf") and entry.is_file():
+            st = entry.stat()
+            files.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= budget:
+            break
+        if path == str(keep):
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+def stamped_pdf(source_file, order, *, variant: str = "") -> Path | None:
+    """Chemin du PDF personnalisé pour cette commande (généré au besoin), sinon None."""
+    if not enabled() or not source_file.name.lower().endswith(".pdf"):
+        return None
+    try:
+        path = source_file.path
+    except (NotImplementedError, AttributeError, ValueError):
+        return None
+    try:
+        key, fingerprint = _fingerprint(path)
+        directory = _cache_dir()
+        target = directory / f"{order.uuid.hex}-{variant or 'pdf'}-{fingerprint}.pdf"
+        if target.is_file():
+            os.utime(target)  # LRU
+            return target
+        reader = _reader(key)
+        directory.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as tmp:
+            try:
+                with _stamp_lock:
+                    _stamp(reader, footer_text(order), tmp)
+            except BaseException:
+                os.unlink(tmp.name)
+                raise
+        os.replace(tmp.name, target)
+        _evict(directory, keep=target)
+        return target
+    except Exception:
+        logger.exception(f"[watermark] commande {order.pk} : PDF servi sans personnalisation")
+        return None
@@ -0,0 +1,409 @@
+# store/services/webhooks.py
+"""
+Traitement des webhooks CinetPay + « inbox » durable (persist-then-ack).
+
+Trois points d'entrée historiques, un handler chacun :
+- "callback" : JSON signé (en-tête HMAC configurable)   → vue `cinetpay_callback`
+- "notify"   : JSON legacy, sans signature               → vue `payment_notify`
+- "form"     : form-data + en-tête x-token (HMAC champs) → vue `payment_callback`
+
+Mode inline (défaut) : la vue appelle directement le handler.
+Mode inbox (PAYMENT_WEBHOOK_INBOX=1), pour le seul webhook routé et signé
+(`cinetpay_callback`) : la vue vérifie la signature, ajoute corps brut (octets
+exacts) + en-têtes + signature dans PaymentWebhookLog et répond 200 immédiatement ;
+`drain_inbox()` (tâche Celery ou commande `drain_webhook_inbox`) rejoue ensuite
+les lignes non traitées par lots, réservées via SELECT ... FOR UPDATE SKIP LOCKED.
+`payment_notify` / `payment_callback` (non routés, compat) restent inline.
+
+Dédoublonnage (les deux modes, webhook callback) : CinetPay renvoie les mêmes
+notifications. Un rejeu exact (même sha256 du corps, même transaction) reçoit
+la réponse mise en cache, avant toute vérification HMAC, verrou ou écriture.
+Cache partagé d'abord, puis repli en base via PaymentWebhookLog (body_sha256).
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.http import QueryDict
+from django.utils import timezone
+
+from store.models import Order, Payment, PaymentEvent, PaymentWebhookLog
+from store.services import cinetpay, metrics
+from store.services.cinetpay import verify_signature
+from store.services.payments import enqueue_settlement, mark_order_failed, mark_order_paid
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT_CALLBACK = "callback"
+ENDPOINT_NOTIFY = "notify"
+ENDPOINT_FORM = "form"
+
+# Une ligne réservée mais jamais finalisée (worker tué) redevient éligible après ce délai.
+CLAIM_TIMEOUT = timedelta(minutes=10)
+# Au-delà, la ligne est close en erreur (évite de rejouer indéfiniment un message empoisonné).
+MAX_ATTEMPTS = 5
+
+# En-têtes jamais persistés.
+_SKIPPED_HEADERS = {"cookie", "authorization"}
+
+DEDUP_CACHE_PREFIX = "webhook:dedup"
+
+
+def inbox_enabled() -> bool:
+    return bool(getattr(settings, "PAYMENT_WEBHOOK_INBOX", False))
+
+
+# -----------------------------------------------------------------------------
+# Webhook HMAC (form-data) — compat
+# -----------------------------------------------------------------------------
+SECRET = os.getenv("CINETPAY_SECRET", "")
+
+FIELDS_ORDER = [
+    "cpm_site_id",
+    "cpm_trans_id",
+    "cpm_trans_date",
+    "cpm_amount",
+    "cpm_currency",
+    "signature",
+    "payment_method",
+    "cel_phone_num",
+    "cpm_phone_prefixe",
+    "cpm_language",
+    "cpm_version",
+    "cpm_payment_config",
+    "cpm_page_action",
+    "cpm_custom",
+    "cpm_designation",
+    "cpm_error_message",
+]
+
+
+def _cinetpay_token(form: dict) -> str:
+    data = "".join(form.get(k, "") for k in FIELDS_ORDER)
+    return hmac.new(SECRET.encode(), data.encode(), hashlib.sha256).hexdigest()
+
+
+def verify_form_token(form, received: str | None) -> bool:
+    expected = _cinetpay_token({k: form.get(k, "") for k in FIELDS_ORDER})
+    return bool(received) and hmac.compare_digest(received, expected)
+
+
+# -----------------------------------------------------------------------------
+# Handlers : (corps brut, signature) → (http_status, body)
+# body est un dict (réponse JSON) ou une str (réponse texte).
+# -----------------------------------------------------------------------------
+def handle_callback(raw: bytes, signature: str | None) -> tuple[int, dict | str]:
+    """
+    Webhook JSON signé. Ack immédiat : le check S2S et la livraison tournent
+    dans un worker (store.services.payments.settle_payment).
+    """
+    if not signature or not verify_signature(signature, raw):
+        logger.warning(
+            "Invalid signature: body_len=%d body_sha256=%s",
+            len(raw),
+            hashlib.sha256(raw).hexdigest(),
+        )
+        return 400, "Invalid signature"
+
+    try:
+        payload = json.loads(raw.decode("utf-8"))
+    except Exception:
+        return 400, "Invalid JSON"
+
+    order_id = (
+        payload.get("transaction_id") or payload.get("cpm_trans_id") or payload.get("order_id")
+    )
+    if not order_id:
+        return 400, "Missing order_id"
+
+    # Phase 1 : lecture simple (pas de verrou), journalisation, ack rapide.
+    payment = Payment.objects.filter(order_id=order_id).first()
+    if payment is None:
+        logger.error("Webhook (legacy) for unknown order_id=%s", order_id)
+        return 200, {"ok": False, "reason": "unknown_order"}
+
+    try:
+        PaymentEvent.objects.create(payment=payment, kind="WEBHOOK", payload=payload)
+    except Exception:
+        logger.exception("Failed to persist PaymentEvent for %s", order_id)
+
+    if payment.status == "PAID":
+        return 200, {"ok": True, "idempotent": True}
+
+    try:
+        amt = payload.get("amount")
+        cur = payload.get("currency")
+        if amt is not None and int(amt) != int(payment.amount):
+            logger.warning(
+                "Amount mismatch for %s: payload=%s db=%s", order_id, amt, payment.amount
+            )
+        if cur and cur != payment.currency:
+            logger.warning(
+                "Currency mismatch for %s: payload=%s db=%s", order_id, cur, payment.currency
+            )
+    except Exception:
+        pass
+
+    # Phase 2 (check S2S + livraison) dans un worker, après commit.
+    enqueue_settlement(order_id)
+    return 200, {"ok": True, "queued": True}
+
+
+def handle_notify(raw: bytes, signature: str | None = None) -> tuple[int, dict | str]:
+    """
+    Ancien endpoint JSON (compat). Conservé si déjà déclaré côté CinetPay.
+    """
+    try:
+        try:
+            payload = json.loads(raw.decode())
+        except Exception:
+            logger.warning("[CinetPay][notify] Invalid JSON")
+            return 400, {"detail": "Invalid JSON"}
+        masked = {k: ("***" if "key" in k else v) for k, v in payload.items()}
+        logger.info(f"[CinetPay][notify] Payload: {masked}")
+        transaction_id = payload.get("transaction_id")
+        if not transaction_id:
+            return 400, {"detail": "Missing transaction_id"}
+        order = Order.objects.filter(provider_ref=transaction_id).first()
+        if not order:
+            logger.warning(
+                "[CinetPay][notify] Order not found for transaction_id=%s", transaction_id
+            )
+            return 404, {"detail": "Order not found"}
+        try:
+            # Chemin requête : pas de retry, l'ack reste borné à un seul appel.
+            check = cinetpay.safe_check(transaction_id, retries=0)
+        except Exception as e:
+            logger.error(f"[CinetPay][notify] CinetPay check error: {str(e)}")
+            return 502, {"detail": "CinetPay check error"}
+        status = (check.get("data") or {}).get("status", "")
+        logger.info(f"[CinetPay][notify] Order {order.id} - check status: {status}")
+        if status in ("ACCEPTED", "SUCCESS", "PAID"):
+            mark_order_paid(order)
+        elif status in ("REFUSED", "CANCELED", "FAILED"):
+            mark_order_failed(order)
+        return 200, {"detail": "OK"}
+    except Exception as e:
+        logger.error(f"[CinetPay][notify] Unexpected error: {str(e)}")
+        return 500, {"detail": "Unexpected error"}
+
+
+def handle_form(raw: bytes, signature: str | None) -> tuple[int, dict | str]:
+    """
+    Webhook form-data (x-token = HMAC des champs dans FIELDS_ORDER).
+    """
+    form = QueryDict(raw)
+    if not verify_form_token(form, signature):
+        return 400, "Invalid signature"
+
+    tx_id = form.get("cpm_trans_id")
+    order = Order.objects.filter(cinetpay_payment_id=tx_id).first()
+    if not order:
+        return 404, "Order not found"
+
+    res = cinetpay.safe_check(tx_id, retries=0)
+    if res.get("code") == "00" and (res.get("data") or {}).get("status") == "ACCEPTED":
+        mark_order_paid(order)
+    else:
+        mark_order_failed(order)
+    return 200, "OK"
+
+
+# Handlers rejouables depuis l'inbox.
+HANDLERS = {
+    ENDPOINT_CALLBACK: handle_callback,
+}
+
+
+# -----------------------------------------------------------------------------
+# Inbox : ingestion (vue) puis consommation (worker)
+# -----------------------------------------------------------------------------
+def _order_ref(raw: bytes) -> str:
+    """Référence commande best-effort (admin, recherche) ; jamais bloquante."""
+    try:
+        data = json.loads(raw.decode("utf-8"))
+        ref = data.get("transaction_id") or data.get("cpm_trans_id") or data.get("order_id")
+    except Exception:
+        return ""
+    return str(ref or "")[:128]
+
+
+def _digest(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()
+
+
+def record(endpoint: str, request, signature: str | None = None) -> PaymentWebhookLog:
+    """
+    Persist-then-ack : un INSERT, aucun appel réseau. La vue répond 200 juste après.
+    Le corps est conservé octet pour octet (raw_bytes) : le rejeu revérifie le HMAC
+    sur exactement ce qui a été reçu. raw_body n'en est qu'une copie lisible (admin).
+    """
+    raw = request.body or b""
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in _SKIPPED_HEADERS}
+    return PaymentWebhookLog.objects.create(
+        endpoint=endpoint,
+        order_ref=_order_ref(raw),
+        signature=(signature or "")[:128],
+        headers=headers,
+        raw_bytes=raw,
+        body_sha256=_digest(raw),
+        raw_body=raw.decode("utf-8", errors="replace"),
+    )
+
+
+def _raw(log: PaymentWebhookLog) -> bytes:
+    if log.raw_bytes:
+        return bytes(log.raw_bytes)
+    return log.raw_body.encode("utf-8")
+
+
+# -----------------------------------------------------------------------------
+# Dédoublonnage des rejeux : clé = endpoint + transaction + sha256(corps brut)
+# -----------------------------------------------------------------------------
+def dedup_ttl() -> int:
+    return int(getattr(settings, "PAYMENT_WEBHOOK_DEDUP_TTL", 86400))
+
+
+def _dedup_key(endpoint: str, order_ref: str, digest: str) -> str:
+    return f"{DEDUP_CACHE_PREFIX}:{endpoint}:{order_ref}:{digest}"
+
+
+def _replayable(http_status: int, body) -> bool:
+    """Seuls les acks positifs sont rejoués ; un refus doit toujours être recalculé."""
+    return http_status == 200 and isinstance(body, dict) and bool(body.get("ok"))
+
+
+def dedup_lookup(endpoint: str, raw: bytes) -> tuple[int, dict | str] | None:
+    """
+    Réponse déjà servie pour ce corps exact, ou None. Aucune écriture, aucun verrou :
+    un GET de cache, puis (miss) une lecture indexée de PaymentWebhookLog.
+    Une ligne encore en file dans l'inbox compte comme déjà reçue.
+    """
+    order_ref = _order_ref(raw)
+    if not order_ref:
+        return None
+    digest = _digest(raw)
+    key = _dedup_key(endpoint, order_ref, digest)
+    cached = cache.get(key)
+    if cached is not None:
+        metrics.incr("webhook.dedup.hit")
+        return cached
+
+    seen = (
+        PaymentWebhookLog.objects.filter(
+            endpoint=endpoint,
+            order_ref=order_ref,
+            body_sha256=digest,
+            created_at__gte=timezone.now() - timedelta(seconds=dedup_ttl()),
+        )
+        .exclude(processed=True, http_status__gte=300)
+        .exists()
+    )
+    if seen:
+        metrics.incr("webhook.dedup.db_hit")
+        response = (200, {"ok": True, "duplicate": True})
+        cache.set(key, response, dedup_ttl())
+        return response
+    metrics.incr("webhook.dedup.miss")
+    return None
+
+
+def dedup_remember(
+    endpoint: str, raw: bytes, http_status: int, body, *, persist: bool = True
+) -> None:
+    """
+    Mémorise un ack positif (cache + ligne PaymentWebhookLog si `persist`).
+    En mode inbox la ligne existe déjà (record) : persist=False.
+    """
+    if not _replayable(http_status, body):
+        return
+    order_ref = _order_ref(raw)
+    if not order_ref:
+        return
+    digest = _digest(raw)
+    cache.set(_dedup_key(endpoint, order_ref, digest), (http_status, body), dedup_ttl())
+    if persist:
+        PaymentWebhookLog.objects.create(
+            endpoint=endpoint,
+            order_ref=order_ref,
+            body_sha256=digest,
+            raw_body=raw.decode("utf-8", errors="replace"),
+            processed=True,
+            http_status=http_status,
+            processed_at=timezone.now(),
+        )
+
+
+def claim_batch(batch_size: int = 50) -> list[PaymentWebhookLog]:
+    """
+    Réserve jusqu'à `batch_size` lignes non traitées (FIFO). La transaction ne
+    dure que le temps du SELECT ... FOR UPDATE SKIP LOCKED + UPDATE de réservation :
+    les workers concurrents sautent les lignes verrouillées au lieu d'attendre,
+    et le traitement (appels réseau) se fait ensuite hors transaction.
+    """
+    stale = timezone.now() - CLAIM_TIMEOUT
+    with transaction.atomic():
+        rows = list(
+            PaymentWebhookLog.objects.select_for_update(skip_locked=True)
+            .filter(processed=False)
+            .filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale))
+            .order_by("created_at", "id")[:batch_size]
+        )
+        if rows:
+            PaymentWebhookLog.objects.filter(pk__in=[r.pk for r in rows]).update(
+                claimed_at=timezone.now(), attempts=F("attempts") + 1
+            )
+    for r in rows:
+        r.attempts += 1
+    return rows
+
+
+def process_log(log: PaymentWebhookLog) -> int:
+    """
+    Rejoue une ligne d'inbox. Un statut < 500 clôt la ligne ; un 5xx (ou une
+    exception) la laisse en file : elle sera reprise après CLAIM_TIMEOUT, jusqu'à
+    MAX_ATTEMPTS tentatives.
+    """
+    handler = HANDLERS.get(log.endpoint)
+    error = ""
+    if handler is None:
+        http_status, error = 400, f"Unknown endpoint {log.endpoint!r}"
+    else:
+        try:
+            http_status, _ = handler(_raw(log), log.signature or None)
+        except Exception as e:
+            logger.exception("[webhook-inbox] log=%s endpoint=%s", log.pk, log.endpoint)
+            http_status, error = 500, str(e)
+
+    done = http_status < 500 or log.attempts >= MAX_ATTEMPTS
+    PaymentWebhookLog.objects.filter(pk=log.pk).update(
+        processed=done,
+        http_status=http_status,
+        error=error[:1000],
+        processed_at=timezone.now() if done else None,
+    )
+    return http_status
+
+
+def drain_inbox(batch_size: int = 50, max_batches: int | None = None) -> int:
+    """Vide l'inbox par lots ; retourne le nombre de lignes traitées."""
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = claim_batch(batch_size)
+        if not rows:
+            break
+        for log in rows:
+            process_log(log)
+        total += len(rows)
+        batches += 1
+    return total
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ExampleSlide, MediaAsset, OfferTier, Product
+from .services import catalog
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=OfferTier)
+@receiver([post_save, post_delete], sender=MediaAsset)
+@receiver([post_save, post_delete], sender=ExampleSlide)
+def invalidate_catalog(sender, **kwargs):
+    """Catalogue modifié (admin, seed…) : les instantanés des workers sont périmés."""
+    catalog.bump_version()
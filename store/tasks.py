@@ -361,3 +361,119 @@ L'équipe AuditSansPeur
         fail_silently=False
     )
 
+
+@shared_task(bind=True, max_retries=5)
+def process_payment_webhook(self, order_id):
+    """
+    Phase 2 du webhook CinetPay : check S2S + livraison, hors de la requête HTTP.
+    Les erreurs réseau CinetPay et les échecs de livraison sont réessayés avec
+    backoff exponentiel ; un retry relivre un paiement PAID non encore livré.
+    """
+    from store.services.cinetpay import CinetPayError
+    from store.services.payments import DeliveryError, settle_payment
+
+    try:
+        result = settle_payment(order_id, retry_delivery=self.request.retries > 0)
+    except (CinetPayError, DeliveryError) as e:
+        countdown = min(30 * (2 ** self.request.retries), 900)
+        logger.warning(f"[process_payment_webhook] {order_id}: retry dans {countdown}s ({e})")
+        raise self.retry(exc=e, countdown=countdown)
+    logger.info(f"[process_payment_webhook] {order_id}: {result}")
+    return result
+
+
+@shared_task(bind=True, max_retries=6)
+def fulfil_order(self, order_id):
+    """
+    Fulfilment d'une commande payée (liens + e-mail), planifié après commit par
+    Order.mark_paid. Étapes idempotentes : un retry ou un doublon ne renvoie pas
+    l'e-mail déjà parti. Échec SMTP → retry avec backoff exponentiel.
+    """
+    from store.services.fulfillment import FulfilmentError, fulfil
+
+    try:
+        result = fulfil(order_id)
+    except FulfilmentError as e:
+        countdown = min(60 * (2 ** self.request.retries), 3600)
+        logger.warning(f"[fulfil_order] {order_id}: retry dans {countdown}s ({e})")
+        raise self.retry(exc=e, countdown=countdown)
+    logger.info(f"[fulfil_order] {order_id}: {result}")
+    return result
+
+
+@shared_task(bind=True, max_retries=5)
+def record_download_token_use(self, token):
+    """
+    Persiste une consommation de jeton de téléchargement à usage limité
+    (store.utils.tokens.consume) : hors du chemin de la requête de téléchargement.
+    """
+    from store.utils.tokens import record_use
+
+    try:
+        record_use(token)
+    except Exception as e:
+        countdown = min(30 * (2 ** self.request.retries), 900)
+        raise self.retry(exc=e, countdown=countdown)
+
+
+@shared_task
+def drain_webhook_inbox(batch_size=None, max_batches=20):
+    """
+    Consomme l'inbox PaymentWebhookLog (mode PAYMENT_WEBHOOK_INBOX).
+    Plusieurs workers peuvent tourner en parallèle : les lignes sont réservées
+    via SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    from store.services.webhooks import drain_inbox, inbox_enabled
+
+    if not inbox_enabled():
+        return 0
+    batch_size = batch_size or getattr(settings, "PAYMENT_WEBHOOK_INBOX_BATCH", 50)
+    count = drain_inbox(batch_size=batch_size, max_batches=max_batches)
+    if count:
+        logger.info(f"[drain_webhook_inbox] {count} webhook(s) traité(s)")
+    return count
+
+
+@shared_task
+def drain_email_outbox(batch_size=None, max_batches=20):
+    """
+    Envoie les e-mails en file (store.services.outbox) par lots, une connexion
+    SMTP par lot. Planifiée après chaque mise en file et par Celery Beat.
+    """
+    from store.services.outbox import drain
+
+    batch_size = batch_size or getattr(settings, "EMAIL_OUTBOX_BATCH", 50)
+    counts = drain(batch_size=batch_size, max_batches=max_batches)
+    if any(counts.values()):
+        logger.info(f"[drain_email_outbox] {counts}")
+    return counts
+
+
+@shared_task(soft_time_limit=1800)
+def reconcile_payments(limit=None):
+    """
+    Balaye les commandes restées en attente et applique le verdict CinetPay
+    (voir store.services.reconcile). Planifiée par Celery Beat.
+    """
+    from store.services.reconcile import reconcile
+
+    counts = reconcile(limit=limit)
+    if counts is None:
+        logger.info("[reconcile_payments] run précédent encore en cours, ignoré")
+    else:
+        logger.info(f"[reconcile_payments] {counts}")
+    return counts
+
+
+@shared_task
+def flush_download_stats():
+    """
+    Reporte les compteurs de téléchargement du cache dans DownloadStat
+    (voir downloads.stats). Planifiée par Celery Beat.
+    """
+    from downloads.stats import flush
+
+    flushed = flush()
+    if flushed:
+        logger.info(f"[flush_download_stats] {flushed} téléchargement(s) reporté(s)")
+    return flushed
@@ -0,0 +1,92 @@
+import pytest
+from django.http import HttpResponse
+from django.urls import reverse
+
+from core import views as core_views
+from store import views
+from store.models import ExampleSlide, MediaAsset, OfferTier, Product
+from store.services import catalog
+
+
+@pytest.fixture
+def product(db):
+    product = Product.objects.create(slug="audit-sans-peur", title="Audit", is_published=True)
+    OfferTier.objects.create(product=product, kind=OfferTier.STANDARD, title="Ebook")
+    OfferTier.objects.create(product=product, kind=OfferTier.FORMATION, title="Formation")
+    MediaAsset.objects.create(
+        product=product, kind=MediaAsset.VIDEO, title="Vidéo", file_or_url="x"
+    )
+    for i in (2, 1):
+        ExampleSlide.objects.create(
+            product=product, title=f"S{i}", irregularity="-", remedy="-", order=i
+        )
+    return product
+
+
+@pytest.fixture
+def contexts(monkeypatch):
+    """Contextes passés aux templates (base.html n'est pas rendu ici)."""
+    seen = []
+
+    def render(request, template, ctx=None, **kwargs):
+        seen.append(ctx)
+        return HttpResponse()
+
+    monkeypatch.setattr(views, "render", render)
+    monkeypatch.setattr(core_views, "render", render)
+    return seen
+
+
+@pytest.mark.django_db
+def test_public_pages_read_the_catalog_from_memory(
+    product, contexts, client, locmem_cache, django_assert_num_queries
+):
+    snap = catalog.snapshot()
+    assert [s.title for s in snap.slides] == ["S1", "S2"]
+    assert snap.tier(OfferTier.STANDARD).title == "Ebook"
+
+    urls = [
+        reverse("store:product_detail", args=[product.slug]),
+        reverse("store:offers"),
+        reverse("store:examples"),
+        reverse("store:examples_block"),
+        reverse("core:home"),
+    ]
+    with django_assert_num_queries(0):
+        for url in urls:
+            assert client.get(url).status_code == 200
+    detail, offers, examples, block, home = contexts
+    assert detail["standard_tier"].title == "Ebook" and len(detail["media"]) == 1
+    assert (offers["standard"].title, offers["formation"].title) == ("Ebook", "Formation")
+    assert [s.title for s in examples["slides"]] == [s.title for s in block["slides"]]
+    assert home["product"] == product and len(home["examples"]) == 2
+
+
+@pytest.mark.django_db
+def test_admin_edit_visible_on_next_request(product, locmem_cache):
+    first = catalog.snapshot()
+    assert catalog.snapshot() is first
+
+    product.title = "Audit 2"
+    product.save()
+    assert catalog.snapshot().product.title == "Audit 2"
+
+    OfferTier.objects.filter(kind=OfferTier.FORMATION).delete()
+    assert len(catalog.snapshot().tiers) == 1
+
+
+@pytest.mark.django_db
+def test_other_worker_edit_seen_via_shared_version(product, locmem_cache, settings):
+    from django.core.cache import cache
+
+    stale = catalog.snapshot()
+    # Modification faite dans un autre worker : seul le tampon partagé a bougé ici.
+    Product.objects.filter(pk=product.pk).update(is_published=False)
+    assert catalog.snapshot() is stale
+    cache.incr(catalog.VERSION_KEY)
+    assert catalog.snapshot().product is None
+
+    # Cache non partagé : la mémoire expire d'elle-même.
+    Product.objects.filter(pk=product.pk).update(is_published=True)
+    settings.CATALOG_SNAPSHOT_MAX_AGE = 0
+    assert catalog.snapshot().product == product
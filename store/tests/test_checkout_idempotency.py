@@ -0,0 +1,68 @@
+from unittest.mock import patch
+
+import pytest
+from django.urls import reverse
+
+from store.models import OfferTier, Order, Product
+from store.services import checkout
+
+PAY_URL = "https://checkout.cinetpay.test/pay/abc"
+
+
+@pytest.fixture
+def product(db):
+    product = Product.objects.create(
+        slug="p-checkout", title="P", price_fcfa=15000, is_published=True
+    )
+    OfferTier.objects.create(product=product, kind=OfferTier.STANDARD)
+    return product
+
+
+def _buy(client, product, **extra):
+    data = {"email": "buyer@example.com", **extra}
+    return client.post(reverse("store:buy", args=[product.slug]), data)
+
+
+@pytest.mark.django_db
+def test_resubmit_with_same_key_reuses_payment_session(client, product, locmem_cache):
+    with patch("store.views.cinetpay.init_payment_auto", return_value=PAY_URL) as minit:
+        first = _buy(client, product, idempotency_key="k1")
+        second = _buy(client, product, idempotency_key="k1")
+    assert first["Location"] == second["Location"] == PAY_URL
+    assert minit.call_count == 1
+    assert Order.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_same_buyer_within_window_reuses_unpaid_order(client, product, locmem_cache, settings):
+    with patch("store.views.cinetpay.init_payment_auto", return_value=PAY_URL) as minit:
+        _buy(client, product, idempotency_key="k1")
+        _buy(client, product, idempotency_key="k2", email="BUYER@example.com")
+        assert minit.call_count == 1
+
+        Order.objects.update(status="PAID")  # commande réglée : nouvel achat
+        _buy(client, product, idempotency_key="k3")
+        assert minit.call_count == 2
+
+        settings.CHECKOUT_REUSE_MINUTES = 0  # hors fenêtre
+        _buy(client, product, idempotency_key="k4")
+    assert minit.call_count == 3
+    assert Order.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_failed_init_releases_key(client, product, locmem_cache):
+    with patch("store.views.cinetpay.init_payment_auto", side_effect=RuntimeError("down")):
+        assert _buy(client, product, idempotency_key="k1").status_code == 500
+    assert not Order.objects.exists()
+    assert checkout.claim("k1")
+
+
+@pytest.mark.django_db
+def test_concurrent_submit_waits_for_first_url(locmem_cache):
+    assert checkout.claim("k1")
+    assert not checkout.claim("k1")
+    assert checkout.wait_for("k1", timeout=0.05, interval=0.01) is None
+    order = Order(pk=1)
+    checkout.remember(order, PAY_URL, "k1")
+    assert checkout.wait_for("k1", timeout=0.05) == PAY_URL
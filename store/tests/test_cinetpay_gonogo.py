@@ -9,6 +9,7 @@ from django.test import Client, TestCase
 from django.urls import reverse
 
 from store.models import Payment
+from store.services.payments import settle_payment
 
 HEADER = os.getenv("CINETPAY_WEBHOOK_HEADER", "x-token")
 SECRET = "testsecret"
@@ -53,6 +54,17 @@ class CinetpayGoNoGoTests(TestCase):
         self.client = Client()
         os.environ["CINETPAY_WEBHOOK_SECRET"] = SECRET
         os.environ["CINETPAY_WEBHOOK_HEADER"] = HEADER
+        # Phase 2 exécutée inline (pas de broker en test)
+        patcher = patch(
+            "store.tasks.process_payment_webhook.apply_async",
+            side_effect=lambda args, **kw: settle_payment(*args),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _post(self, *args, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(*args, **kwargs)
 
     def test_return_page_never_delivers(self):
         resp = self.client.get(reverse("store:payment_return"))
@@ -64,7 +76,7 @@ class CinetpayGoNoGoTests(TestCase):
         )
         body = make_payload(p.order_id)
         raw = raw_json_bytes(body)
-        resp = self.client.post("/payment/callback/", data=raw, content_type="application/json")
+        resp = self._post("/payment/callback/", data=raw, content_type="application/json")
         self.assertEqual(resp.status_code, 400)
 
     def test_webhook_invalid_signature(self):
@@ -73,13 +85,13 @@ class CinetpayGoNoGoTests(TestCase):
         )
         body = make_payload(p.order_id)
         raw = raw_json_bytes(body)
-        resp = self.client.post(
+        resp = self._post(
             "/payment/callback/", data=raw, content_type="application/json", **{hdr_key(): "bad"}
         )
         self.assertEqual(resp.status_code, 400)
 
-    @patch("store.views.payment_check", return_value=(False, None))
-    @patch("store.views.deliver_ebook")
+    @patch("store.services.payments.payment_check", return_value=(False, None))
+    @patch("store.services.payments.deliver_ebook")
     def test_webhook_valid_signature_check_ko(self, mock_deliver, mock_check):
         p = Payment.objects.create(
             order_id="ORD-KO", status="PENDING", amount=15000, currency="XOF"
@@ -87,7 +99,7 @@ class CinetpayGoNoGoTests(TestCase):
         body = make_payload(p.order_id)
         raw = raw_json_bytes(body)
         sig = sig_hex(raw)
-        resp = self.client.post(
+        resp = self._post(
             "/payment/callback/", data=raw, content_type="application/json", **{hdr_key(): sig}
         )
         self.assertEqual(resp.status_code, 200)
@@ -95,8 +107,8 @@ class CinetpayGoNoGoTests(TestCase):
         self.assertEqual(p.status, "FAILED")
         mock_deliver.assert_not_called()
 
-    @patch("store.views.payment_check", return_value=(True, "PROVIDER123"))
-    @patch("store.views.deliver_ebook")
+    @patch("store.services.payments.payment_check", return_value=(True, "PROVIDER123"))
+    @patch("store.services.payments.deliver_ebook")
     def test_webhook_valid_signature_check_ok(self, mock_deliver, mock_check):
         p = Payment.objects.create(
             order_id="ORD-OK", status="PENDING", amount=15000, currency="XOF"
@@ -104,7 +116,7 @@ class CinetpayGoNoGoTests(TestCase):
         body = make_payload(p.order_id)
         raw = raw_json_bytes(body)
         sig = sig_hex(raw)
-        resp = self.client.post(
+        resp = self._post(
             "/payment/callback/", data=raw, content_type="application/json", **{hdr_key(): sig}
         )
         self.assertEqual(resp.status_code, 200)
@@ -112,8 +124,8 @@ class CinetpayGoNoGoTests(TestCase):
         self.assertEqual(p.status, "PAID")
         mock_deliver.assert_called_once()
 
-    @patch("store.views.payment_check", return_value=(True, "PROVIDER123"))
-    @patch("store.views.deliver_ebook")
+    @patch("store.services.payments.payment_check", return_value=(True, "PROVIDER123"))
+    @patch("store.services.payments.deliver_ebook")
     def test_webhook_idempotence(self, mock_deliver, mock_check):
         p = Payment.objects.create(
             order_id="ORD-IDEMPOT", status="PENDING", amount=15000, currency="XOF"
@@ -122,12 +134,12 @@ class CinetpayGoNoGoTests(TestCase):
         raw = raw_json_bytes(body)
         sig = sig_hex(raw)
         # Premier appel : livraison
-        resp1 = self.client.post(
+        resp1 = self._post(
             "/payment/callback/", data=raw, content_type="application/json", **{hdr_key(): sig}
         )
         self.assertEqual(resp1.status_code, 200)
         # Deuxième appel : pas de double livraison
-        resp2 = self.client.post(
+        resp2 = self._post(
             "/payment/callback/", data=raw, content_type="application/json", **{hdr_key(): sig}
         )
         self.assertEqual(resp2.status_code, 200)
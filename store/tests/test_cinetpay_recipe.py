@@ -9,6 +9,7 @@ from django.test import Client, TestCase
 from django.urls import reverse
 
 from store.models import Payment
+from store.services.payments import settle_payment
 
 HEADER = os.getenv("CINETPAY_WEBHOOK_HEADER", "x-token")
 SECRET = "testsecret"
@@ -60,6 +61,17 @@ class CinetpayRecipeTests(TestCase):
         self.client = Client()
         os.environ["CINETPAY_WEBHOOK_SECRET"] = SECRET
         os.environ["CINETPAY_WEBHOOK_HEADER"] = HEADER
+        # Phase 2 exécutée inline (pas de broker en test)
+        patcher = patch(
+            "store.tasks.process_payment_webhook.apply_async",
+            side_effect=lambda args, **kw: settle_payment(*args),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _post(self, *args, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(*args, **kwargs)
 
     def test_return_page_does_not_deliver(self):
         try:
@@ -77,10 +89,10 @@ class CinetpayRecipeTests(TestCase):
             "amount": 15000,
             "currency": "XOF",
         }
-        r = self.client.post(cb_url(), data=json.dumps(body), content_type="application/json")
+        r = self._post(cb_url(), data=json.dumps(body), content_type="application/json")
         self.assertEqual(r.status_code, 400)
 
-    @patch("store.views.payment_check", return_value=(False, None))
+    @patch("store.services.payments.payment_check", return_value=(False, None))
     def test_webhook_bad_check_sets_failed(self, mcheck):
         p = Payment.objects.create(
             order_id="ORD-KO", amount=15000, currency="XOF", status="PENDING"
@@ -88,15 +100,15 @@ class CinetpayRecipeTests(TestCase):
         body = make_payload(p.order_id)
         raw = raw_json_bytes(body)
         sig = sig_hex(raw)
-        r = self.client.post(
+        r = self._post(
             cb_url(), data=raw, content_type="application/json", **{hdr_key(): sig}
         )
         self.assertEqual(r.status_code, 200)
         p.refresh_from_db()
         self.assertEqual(p.status, "FAILED")
 
-    @patch("store.views.payment_check", return_value=(True, "TX123"))
-    @patch("store.views.deliver_ebook")
+    @patch("store.services.payments.payment_check", return_value=(True, "TX123"))
+    @patch("store.services.payments.deliver_ebook")
     def test_webhook_ok_delivers_once(self, mdeliver, mcheck):
         p = Payment.objects.create(
             order_id="ORD-OK", amount=15000, currency="XOF", status="PENDING"
@@ -105,7 +117,7 @@ class CinetpayRecipeTests(TestCase):
         raw = raw_json_bytes(body)
         sig = sig_hex(raw)
 
-        r1 = self.client.post(
+        r1 = self._post(
             cb_url(), data=raw, content_type="application/json", **{hdr_key(): sig}
         )
         self.assertEqual(r1.status_code, 200)
@@ -113,14 +125,14 @@ class CinetpayRecipeTests(TestCase):
         self.assertEqual(p.status, "PAID")
         self.assertEqual(mdeliver.call_count, 1)
 
-        r2 = self.client.post(
+        r2 = self._post(
             cb_url(), data=raw, content_type="application/json", **{hdr_key(): sig}
         )
         self.assertEqual(r2.status_code, 200)
         self.assertEqual(mdeliver.call_count, 1)  # idempotence OK
 
-    @patch("store.views.payment_check", return_value=(True, "TX123"))
-    @patch("store.views.deliver_ebook")
+    @patch("store.services.payments.payment_check", return_value=(True, "TX123"))
+    @patch("store.services.payments.deliver_ebook")
     def test_webhook_ok_hex(self, mdeliver, mcheck):
         p = Payment.objects.create(
             order_id="ORD-HEX", amount=15000, currency="XOF", status="PENDING"
@@ -128,7 +140,7 @@ class CinetpayRecipeTests(TestCase):
         body = make_payload(p.order_id)
         raw = raw_json_bytes(body)
         sig = sig_hex(raw)
-        r = self.client.post(
+        r = self._post(
             cb_url(), data=raw, content_type="application/json", **{hdr_key(): sig}
         )
         self.assertEqual(r.status_code, 200)
@@ -136,14 +148,14 @@ class CinetpayRecipeTests(TestCase):
         self.assertEqual(p.status, "PAID")
         self.assertEqual(mdeliver.call_count, 1)
         # idempotence
-        r2 = self.client.post(
+        r2 = self._post(
             cb_url(), data=raw, content_type="application/json", **{hdr_key(): sig}
         )
         self.assertEqual(r2.status_code, 200)
         self.assertEqual(mdeliver.call_count, 1)
 
-    @patch("store.views.payment_check", return_value=(True, "TX124"))
-    @patch("store.views.deliver_ebook")
+    @patch("store.services.payments.payment_check", return_value=(True, "TX124"))
+    @patch("store.services.payments.deliver_ebook")
     def test_webhook_ok_b64(self, mdeliver, mcheck):
         p = Payment.objects.create(
             order_id="ORD-B64", amount=15000, currency="XOF", status="PENDING"
@@ -151,13 +163,13 @@ class CinetpayRecipeTests(TestCase):
         body = make_payload(p.order_id)
         raw = raw_json_bytes(body)
         sig = sig_b64(raw)
-        r = self.client.post(
+        r = self._post(
             cb_url(), data=raw, content_type="application/json", **{hdr_key(): sig}
         )
         self.assertEqual(r.status_code, 200)
 
-    @patch("store.views.payment_check", return_value=(True, "TX125"))
-    @patch("store.views.deliver_ebook")
+    @patch("store.services.payments.payment_check", return_value=(True, "TX125"))
+    @patch("store.services.payments.deliver_ebook")
     def test_webhook_ok_hexpref(self, mdeliver, mcheck):
         p = Payment.objects.create(
             order_id="ORD-PREF", amount=15000, currency="XOF", status="PENDING"
@@ -165,7 +177,7 @@ class CinetpayRecipeTests(TestCase):
         body = make_payload(p.order_id)
         raw = raw_json_bytes(body)
         sig = sig_hexpref(raw)
-        r = self.client.post(
+        r = self._post(
             cb_url(), data=raw, content_type="application/json", **{hdr_key(): sig}
         )
         self.assertEqual(r.status_code, 200)
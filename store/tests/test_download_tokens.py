@@ -0,0 +1,88 @@
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+
+from store.models import ClientInquiry, DownloadToken, Order, Product
+from store.utils import tokens
+
+
+@pytest.fixture
+def order(db):
+    product = Product.objects.create(slug="asp", title="Audit Sans Peur", price_fcfa=15000)
+    return Order.objects.create(
+        product=product, email="buyer@example.com", amount_fcfa=15000, status="PAID"
+    )
+
+
+@pytest.fixture
+def inquiry(db):
+    return ClientInquiry.objects.create(email="x@x.com", payment_status="PAID")
+
+
+def test_order_token_is_verified_without_queries(order, django_assert_num_queries):
+    token = tokens.issue_order_download_token(order, variant="a4")
+    assert ":" not in token and len(token) < 64
+    with django_assert_num_queries(0):
+        assert tokens.resolve_order_token(token, variant="a4") == order.pk
+        assert tokens.resolve_order_token(token, variant="6x9") is None
+        assert tokens.verify_download_token(token, kind=tokens.INQUIRY) is None
+
+
+def test_tampered_or_expired_token_is_rejected(order):
+    token = tokens.issue_order_download_token(order)
+    forged = token[:-2] + ("AA" if token[-2:] != "AA" else "BB")
+    assert tokens.verify_download_token(forged) is None
+    assert tokens.verify_download_token("n'importe quoi") is None
+    expired = tokens.issue_order_download_token(order, ttl=timedelta(seconds=-1))
+    assert tokens.verify_download_token(expired) is None
+
+
+def test_key_rotation(order, settings):
+    settings.DOWNLOAD_TOKEN_KEYS = ["ancienne"]
+    old = tokens.issue_order_download_token(order)
+    settings.DOWNLOAD_TOKEN_KEYS = ["nouvelle", "ancienne"]
+    assert tokens.verify_download_token(old).object_id == order.pk
+    assert tokens.verify_download_token(tokens.issue_order_download_token(order))
+    settings.DOWNLOAD_TOKEN_KEYS = ["nouvelle"]
+    assert tokens.verify_download_token(old) is None
+
+
+@pytest.mark.django_db
+def test_single_use_counter_is_persisted_after_commit(
+    inquiry, locmem_cache, django_capture_on_commit_callbacks
+):
+    token = tokens.issue_download_token(inquiry)
+    with django_capture_on_commit_callbacks(execute=True):
+        assert tokens.consume_token(token).object_id == inquiry.id
+        assert tokens.consume_token(token) is None
+    dt = DownloadToken.objects.get(token=token)
+    assert (dt.inquiry_id, dt.used_count, dt.max_uses) == (inquiry.id, 1, 1)
+
+    # Cache perdu : le compteur est ré-amorcé depuis la base.
+    cache.clear()
+    assert tokens.consume_token(token) is None
+
+
+@pytest.mark.django_db
+def test_without_cache_the_database_is_authoritative(inquiry):
+    # Cache de test par défaut : DummyCache (aucun incr possible).
+    token = tokens.issue_download_token(inquiry)
+    assert tokens.consume_token(token) is not None
+    assert tokens.consume_token(token) is None
+    assert DownloadToken.objects.get(token=token).used_count == 1
+
+
+@pytest.mark.django_db
+def test_legacy_database_token_still_resolves(order):
+    DownloadToken.objects.create(
+        order=order, token="legacy:abc:def", expires_at=timezone.now() + timedelta(hours=1)
+    )
+    assert tokens.resolve_order_token("legacy:abc:def") == order.pk
+    assert tokens.resolve_order_token("legacy:inconnu:x") is None
+
+
+def test_order_tokens_cannot_be_limited(order):
+    with pytest.raises(ValueError):
+        tokens.sign_download_token(tokens.ORDER, order.pk, ttl=timedelta(hours=1), max_uses=1)
@@ -0,0 +1,22 @@
+import pytest
+from django.core.management import call_command
+
+from downloads.entitlements import entitled_categories
+from store.models import Order
+
+
+@pytest.mark.django_db
+def test_email_lookups_use_lower_indexes():
+    gate = entitled_categories(None, ["buyer@example.com"], "").explain()
+    assert "dlent_email_lower_cat_idx" in gate
+    assert "extent_email_lower_cat_idx" in gate
+    orders = Order.objects.filter(email__lower="buyer@example.com", status="PAID").explain()
+    assert "order_email_lower_status_idx" in orders
+
+
+@pytest.mark.django_db
+def test_benchmark_leaves_no_rows(capsys):
+    call_command("bench_email_lookups", rows=50, repeat=5)
+    out = capsys.readouterr().out
+    assert "order_email_lower_status_idx" in out
+    assert not Order.objects.exists()
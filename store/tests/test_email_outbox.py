@@ -0,0 +1,119 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.core import mail
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from store.models import EmailOutbox
+from store.services import outbox
+from store.services.mailing import send_bonus_published_email
+
+
+def _msg(to, subject="Sujet"):
+    return EmailMessage(subject=subject, body="Corps", from_email="shop@example.com", to=to)
+
+
+@pytest.mark.django_db
+def test_batch_is_sent_over_a_single_connection():
+    outbox.enqueue(_msg(["a@example.com", "b@example.com"]), kind="test")
+    outbox.enqueue(_msg(["c@example.com"]), kind="test")
+    assert len(mail.outbox) == 0  # rien n'est envoyé dans l'appelant
+
+    with patch("store.services.outbox.get_connection", wraps=get_connection) as mconn:
+        counts = outbox.drain(batch_size=10)
+    assert counts == {"sent": 3, "retry": 0, "failed": 0}
+    assert mconn.call_count == 1
+    recipients = sorted(m.to[0] for m in mail.outbox)
+    assert recipients == ["a@example.com", "b@example.com", "c@example.com"]
+    assert set(EmailOutbox.objects.values_list("status", flat=True)) == {EmailOutbox.SENT}
+
+
+@pytest.mark.django_db
+def test_enqueue_follows_the_business_transaction():
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            outbox.enqueue(_msg(["a@example.com"]), kind="test")
+            raise RuntimeError("rollback")
+    assert not EmailOutbox.objects.exists()
+
+
+@pytest.mark.django_db
+def test_commit_schedules_the_drain(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        outbox.enqueue(_msg(["a@example.com"]), kind="test")
+    assert len(mail.outbox) == 1
+    assert EmailOutbox.objects.get().status == EmailOutbox.SENT
+
+
+@pytest.mark.django_db
+def test_same_message_is_queued_once_per_recipient():
+    send_bonus_published_email(to_email="buyer@example.com", pdf_url="https://x/kit.pdf")
+    send_bonus_published_email(to_email="Buyer@example.com", pdf_url="https://x/kit.pdf")
+    row = EmailOutbox.objects.get()
+    assert row.kind == "bonus_published"
+    assert row.body_html  # alternative HTML conservée
+    send_bonus_published_email(to_email="buyer@example.com", pdf_url="https://x/kit-v2.pdf")
+    assert EmailOutbox.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_failures_back_off_then_give_up(settings):
+    settings.EMAIL_OUTBOX_MAX_ATTEMPTS = 2
+    outbox.enqueue(_msg(["a@example.com"]), kind="test")
+    with patch("django.core.mail.EmailMessage.send", side_effect=OSError("SMTP down")):
+        assert outbox.drain() == {"sent": 0, "retry": 1, "failed": 0}
+        row = EmailOutbox.objects.get()
+        assert row.status == EmailOutbox.PENDING
+        assert row.next_attempt_at > timezone.now() + timedelta(seconds=50)
+        assert outbox.drain() == {"sent": 0, "retry": 0, "failed": 0}  # pas encore dû
+
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        assert outbox.drain() == {"sent": 0, "retry": 0, "failed": 1}
+    row.refresh_from_db()
+    assert row.status == EmailOutbox.FAILED
+    assert row.attempts == 2
+    assert "SMTP down" in row.error
+
+
+@pytest.mark.django_db
+def test_connection_failure_reschedules_the_whole_batch():
+    outbox.enqueue(_msg(["a@example.com", "b@example.com"]), kind="test")
+    refused = OSError("refused")
+    with patch("django.core.mail.backends.locmem.EmailBackend.open", side_effect=refused):
+        assert outbox.drain() == {"sent": 0, "retry": 2, "failed": 0}
+    assert EmailOutbox.objects.filter(status=EmailOutbox.PENDING, attempts=1).count() == 2
+
+
+@pytest.mark.django_db
+def test_attachments_and_reply_to_survive_the_queue():
+    msg = _msg(["contact@example.com"])
+    msg.reply_to = ["client@example.com"]
+    msg.attach("devis.pdf", b"%PDF-1.4", "application/pdf")
+    outbox.enqueue(msg, kind="kit_inquiry")
+    outbox.drain()
+    sent = mail.outbox[0]
+    assert sent.reply_to == ["client@example.com"]
+    assert sent.attachments[0][0] == "devis.pdf"
+    assert sent.attachments[0][1] == b"%PDF-1.4"
+
+
+@pytest.mark.django_db
+def test_disabled_outbox_sends_inline(settings):
+    settings.EMAIL_OUTBOX = False
+    assert outbox.enqueue(_msg(["a@example.com"]), kind="test") == []
+    assert len(mail.outbox) == 1
+    assert not EmailOutbox.objects.exists()
+
+
+@pytest.mark.django_db
+def test_explicit_resend_bypasses_dedup():
+    from store.services.mailing import send_fulfilment_email
+
+    with patch("store.services.mailing.build_link_manifest", return_value=[]):
+        send_fulfilment_email(to_email="buyer@example.com", order_ref="ORDER-1")
+        send_fulfilment_email(to_email="buyer@example.com", order_ref="ORDER-1")
+        send_fulfilment_email(to_email="buyer@example.com", order_ref="ORDER-1", dedup=False)
+    assert EmailOutbox.objects.filter(kind="fulfilment").count() == 2
@@ -0,0 +1,181 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import FileResponse, Http404
+from django.urls import reverse
+
+from downloads.models import DownloadableAsset, DownloadCategory
+from store.utils.delivery import serve_file
+
+
+@pytest.fixture
+def roots(settings, tmp_path):
+    media, private = tmp_path / "media", tmp_path / "private"
+    media.mkdir()
+    private.mkdir()
+    settings.MEDIA_ROOT = str(media)
+    settings.PRIVATE_MEDIA_ROOT = str(private)
+    settings.PDF_WATERMARK_CACHE_DIR = str(private / "_watermarked")
+    settings.FILE_DELIVERY_ACCEL_LOCATIONS = {
+        str(media): "/_protected/media/",
+        str(private): "/_protected/private/",
+    }
+    return media, private
+
+
+def _write(root, rel="downloads/guide été.pdf"):
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"%PDF-1.4 contenu")
+    return path
+
+
+def test_stream_is_the_default(roots, settings):
+    settings.FILE_DELIVERY_BACKEND = "stream"
+    resp = serve_file(_write(roots[0]))
+    assert isinstance(resp, FileResponse)
+    assert b"".join(resp.streaming_content) == b"%PDF-1.4 contenu"
+    resp.file_to_stream.close()
+
+
+def test_x_accel_maps_root_to_internal_location(roots, settings):
+    settings.FILE_DELIVERY_BACKEND = "x-accel"
+    resp = serve_file(_write(roots[1]), filename="guide.pdf")
+    assert resp["X-Accel-Redirect"] == "/_protected/private/downloads/guide%20%C3%A9t%C3%A9.pdf"
+    assert resp["Content-Type"] == "application/pdf"
+    assert resp["Content-Disposition"] == 'attachment; filename="guide.pdf"'
+    assert resp.content == b""
+
+
+def test_x_sendfile_sends_absolute_path(roots, settings):
+    settings.FILE_DELIVERY_BACKEND = "x-sendfile"
+    path = _write(roots[0])
+    resp = serve_file(path)
+    assert resp["X-Sendfile"] == str(path.resolve())
+    assert "filename*=utf-8''guide%20%C3%A9t%C3%A9.pdf" in resp["Content-Disposition"]
+
+
+def test_file_outside_declared_roots_is_streamed(roots, settings, tmp_path):
+    settings.FILE_DELIVERY_BACKEND = "x-accel"
+    resp = serve_file(_write(tmp_path / "ailleurs"))
+    assert isinstance(resp, FileResponse)
+    assert not resp.has_header("X-Accel-Redirect")
+    resp.file_to_stream.close()
+
+
+def test_missing_file_is_404(roots):
+    with pytest.raises(Http404):
+        serve_file(roots[0] / "absent.pdf")
+
+
+@pytest.mark.django_db
+def test_asset_view_is_offloaded(roots, settings, client):
+    settings.FILE_DELIVERY_BACKEND = "x-accel"
+    category = DownloadCategory.objects.create(slug="bonus", title="Bonus", page_path="/bonus")
+    asset = DownloadableAsset.objects.create(
+        category=category, slug="guide", title="Guide",
+        file=SimpleUploadedFile("guide.pdf", b"%PDF-1.4", content_type="application/pdf"),
+    )
+    resp = client.get(reverse("downloads:asset", args=[asset.pk]))
+    assert resp.status_code == 200
+    assert resp["X-Accel-Redirect"].startswith("/_protected/media/")
+    assert resp["X-Accel-Redirect"].endswith(".pdf")
+
+
+# --- GET conditionnel et Range -------------------------------------------------
+
+BODY = bytes(range(256)) * 4  # 1024 octets
+
+
+@pytest.fixture
+def pdf(roots):
+    path = roots[1] / "ebook-a4.pdf"
+    path.write_bytes(BODY)
+    return path
+
+
+def _get(rf, path, **headers):
+    return serve_file(path, request=rf.get("/", headers=headers))
+
+
+def _body(resp):
+    return b"".join(resp.streaming_content)
+
+
+def test_validators_and_accept_ranges(rf, pdf):
+    resp = _get(rf, pdf)
+    assert resp.status_code == 200
+    assert resp["ETag"].startswith('"400-')
+    assert resp["Last-Modified"].endswith("GMT")
+    assert resp["Accept-Ranges"] == "bytes"
+    assert "private" in resp["Cache-Control"]
+    resp.file_to_stream.close()
+
+
+def test_if_none_match_and_if_modified_since_give_304(rf, pdf):
+    first = _get(rf, pdf)
+    first.file_to_stream.close()
+    resp = _get(rf, pdf, if_none_match=first["ETag"])
+    assert resp.status_code == 304
+    assert resp["ETag"] == first["ETag"]
+    assert _get(rf, pdf, if_modified_since=first["Last-Modified"]).status_code == 304
+
+
+def test_single_range_is_206(rf, pdf):
+    resp = _get(rf, pdf, range="bytes=1000-")
+    assert resp.status_code == 206
+    assert resp["Content-Range"] == "bytes 1000-1023/1024"
+    assert resp["Content-Length"] == "24"
+    assert _body(resp) == BODY[1000:]
+
+
+def test_multiple_ranges_are_multipart(rf, pdf):
+    resp = _get(rf, pdf, range="bytes=0-9, -5")
+    assert resp.status_code == 206
+    assert resp["Content-Type"].startswith("multipart/byteranges; boundary=")
+    body = _body(resp)
+    assert int(resp["Content-Length"]) == len(body)
+    assert b"Content-Range: bytes 0-9/1024\r\n\r\n" + BODY[:10] in body
+    assert b"Content-Range: bytes 1019-1023/1024\r\n\r\n" + BODY[-5:] in body
+
+
+def test_overlapping_ranges_are_merged(rf, pdf):
+    resp = _get(rf, pdf, range="bytes=0-99,50-149")
+    assert resp["Content-Range"] == "bytes 0-149/1024"
+
+
+def test_unsatisfiable_range_is_416(rf, pdf):
+    resp = _get(rf, pdf, range="bytes=5000-")
+    assert resp.status_code == 416
+    assert resp["Content-Range"] == "bytes */1024"
+
+
+def test_stale_if_range_serves_full_file(rf, pdf):
+    resp = _get(rf, pdf, range="bytes=0-9", if_range='"autre"')
+    assert resp.status_code == 200
+    resp.file_to_stream.close()
+
+
+def test_offloaded_response_keeps_validators(rf, pdf, settings):
+    settings.FILE_DELIVERY_BACKEND = "x-sendfile"
+    resp = _get(rf, pdf, range="bytes=0-9")
+    assert resp.status_code == 200  # Range traité par le serveur frontal
+    assert resp["X-Sendfile"] and resp["ETag"]
+
+
+@pytest.mark.django_db
+def test_download_version_resumes(roots, client):
+    from store.models import Order, Product
+    from store.utils.tokens import issue_order_download_token
+
+    product = Product.objects.create(
+        slug="asp", title="Audit Sans Peur", price_fcfa=15000,
+        deliverable_file_a4=SimpleUploadedFile("asp-a4.pdf", BODY),
+    )
+    order = Order.objects.create(
+        product=product, email="buyer@example.com", amount_fcfa=15000, status="PAID"
+    )
+    url = reverse("store:download_version", args=[issue_order_download_token(order), "a4"])
+    resp = client.get(url, headers={"range": "bytes=512-"})
+    assert resp.status_code == 206
+    assert b"".join(resp.streaming_content) == BODY[512:]
+    assert client.get(url, headers={"if-none-match": resp["ETag"]}).status_code == 304
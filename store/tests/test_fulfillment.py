@@ -0,0 +1,67 @@
+from unittest.mock import patch
+
+import pytest
+
+from store import tasks
+from store.models import Order, Product
+from store.services import fulfillment
+from store.services.payments import mark_order_paid
+
+
+@pytest.fixture
+def order(db):
+    product = Product.objects.create(slug="p-fulfil", title="P", price_fcfa=15000)
+    return Order.objects.create(
+        product=product, email="buyer@example.com", amount_fcfa=15000, status="PENDING"
+    )
+
+
+@pytest.mark.django_db
+def test_mark_paid_enqueues_order_id_after_commit(order, django_capture_on_commit_callbacks):
+    with patch.object(tasks.fulfil_order, "apply_async") as menqueue, \
+            patch("store.services.mailing.send_fulfilment_email") as msend:
+        with django_capture_on_commit_callbacks(execute=False) as callbacks:
+            assert mark_order_paid(order, provider_tx="CP-1")
+        menqueue.assert_not_called()  # rien avant le commit
+        for cb in callbacks:
+            cb()
+    args, _ = menqueue.call_args
+    assert args[0] == (order.pk,)
+    msend.assert_not_called()  # aucun SMTP dans le chemin webhook
+
+
+@pytest.mark.django_db
+def test_fulfil_sends_once_and_marks_order(order, locmem_cache):
+    Order.objects.filter(pk=order.pk).update(status="PAID")
+    with patch("store.services.mailing.send_fulfilment_email") as msend:
+        assert fulfillment.fulfil(order.pk) == "fulfilled"
+        assert fulfillment.fulfil(order.pk) == "already_fulfilled"
+    assert msend.call_count == 1
+    order.refresh_from_db()
+    assert order.fulfilled_at is not None
+
+
+@pytest.mark.django_db
+def test_smtp_outage_is_retried_without_marking(order, locmem_cache):
+    Order.objects.filter(pk=order.pk).update(status="PAID")
+    down = OSError("SMTP down")
+    with patch("store.services.mailing.send_fulfilment_email", side_effect=down), \
+            patch("store.emails.send_payment_links", side_effect=down), \
+            patch.object(tasks.fulfil_order, "retry", side_effect=RuntimeError) as mretry:
+        with pytest.raises(RuntimeError):
+            tasks.fulfil_order.run(order.pk)
+    assert mretry.call_args.kwargs["countdown"] == 60
+    assert Order.objects.get(pk=order.pk).fulfilled_at is None
+
+    # La réservation est libérée : le retry suivant envoie.
+    with patch("store.services.mailing.send_fulfilment_email") as msend:
+        assert tasks.fulfil_order.run(order.pk) == "fulfilled"
+    assert msend.call_count == 1
+
+
+@pytest.mark.django_db
+def test_unpaid_order_is_not_fulfilled(order):
+    with patch("store.services.mailing.send_fulfilment_email") as msend:
+        assert fulfillment.fulfil(order.pk) == "not_paid"
+        assert fulfillment.fulfil(0) == "unknown_order"
+    msend.assert_not_called()
@@ -0,0 +1,67 @@
+import pytest
+
+from store.models import OfferTier, Order, Product
+from store.services import cinetpay, loadtest
+from store.services.cinetpay_emulator import CinetPayEmulator, point_client_at
+
+
+@pytest.fixture
+def emulator():
+    with CinetPayEmulator(notify=False, seed=1) as emu:
+        with point_client_at(emu, return_url="http://shop/ret/", notify_url="http://shop/n/"):
+            yield emu
+
+
+def test_emulator_init_then_check_follows_buyer_payment(emulator):
+    url = cinetpay.init_payment(transaction_id="TX-EMU-1", amount=15000, description="x")
+    assert url == f"{emulator.base_url}/pay/TX-EMU-1"
+    assert cinetpay.check_transaction("TX-EMU-1")["data"]["status"] == "WAITING_CUSTOMER_PAYMENT"
+
+    assert emulator.pay("TX-EMU-1") == "http://shop/ret/?transaction_id=TX-EMU-1"
+    assert cinetpay.payment_check("TX-EMU-1")[0] is True
+    assert emulator.counters["/v2/payment/check"] == 2
+
+
+def test_emulator_failure_injection_surfaces_as_cinetpay_error(emulator):
+    emulator.fail_rate = 1.0
+    with pytest.raises(cinetpay.CinetPayError):
+        cinetpay.check_transaction("TX-EMU-2", retries=0)
+    assert emulator.counters["injected_failure"] == 1
+
+
+def test_emulator_webhook_is_signed_for_our_callback(monkeypatch):
+    monkeypatch.setenv("CINETPAY_WEBHOOK_SECRET", "testsecret")
+    sent = []
+    emu = CinetPayEmulator(webhook_secret="testsecret", notifier=lambda *a: sent.append(a))
+    emu.init({"apikey": "k", "site_id": "1", "transaction_id": "TX-EMU-3", "amount": 100,
+              "notify_url": "http://shop/n/"})
+    emu.notify = False
+    emu.pay("TX-EMU-3")
+    raw, headers = emu.webhook_request("TX-EMU-3")
+    assert cinetpay.verify_signature(headers["x-token"], raw)
+    assert not sent
+
+
+def test_percentile_nearest_rank():
+    samples = [float(i) for i in range(1, 101)]
+    assert loadtest.percentile(samples, 50) == 50.0
+    assert loadtest.percentile(samples, 99) == 99.0
+    assert loadtest.percentile([], 95) is None
+
+
+@pytest.mark.django_db
+def test_run_funnel_times_each_step_and_pays_orders(settings):
+    settings.EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+    product = Product.objects.create(
+        slug="p-load", title="P", price_fcfa=15000, is_published=True
+    )
+    OfferTier.objects.create(product=product, kind=OfferTier.STANDARD)
+
+    report = loadtest.run_funnel(product_slug=product.slug, buyers=3, concurrency=1)
+
+    for step in ("buy", "pay", "webhook"):
+        assert report["steps"][step]["count"] == 3
+        assert report["steps"][step]["errors"] == 0
+        assert report["steps"][step]["p95"] is not None
+    assert report["emulator"]["/v2/payment"] == 3
+    assert list(Order.objects.values_list("status", flat=True)) == ["PAID"] * 3
@@ -0,0 +1,77 @@
+import pytest
+from django.http import Http404
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from store import views
+from store.models import DownloadToken, Order, Product
+from store.services import order_status
+from store.services.payments import mark_order_failed, mark_order_paid
+from store.utils.tokens import resolve_order_token
+
+HTMX = {"HTTP_HX_REQUEST": "true"}
+
+
+@pytest.fixture
+def order(db):
+    product = Product.objects.create(slug="p-status", title="P", price_fcfa=15000)
+    return Order.objects.create(
+        product=product, email="buyer@example.com", amount_fcfa=15000, status="PENDING"
+    )
+
+
+def _order_of_link(url):
+    match = resolve(url)
+    assert match.view_name == "store:download_options"
+    return resolve_order_token(match.kwargs["token"])
+
+
+def _return(client, order):
+    return client.get(reverse("store:cinetpay_return"), {"transaction_id": order.provider_ref})
+
+
+@pytest.mark.django_db
+def test_pending_polls_hit_cache_only(client, order, locmem_cache, django_assert_num_queries):
+    order_status.seed(order.provider_ref, order.status)  # amorcé par la page de retour
+    url = reverse("store:order_status", args=[order.provider_ref])
+    with django_assert_num_queries(0):
+        for _ in range(3):
+            poll = client.get(url, **HTMX)
+            assert poll.status_code == 200
+            assert b'hx-trigger="every 3s"' in poll.content
+
+
+@pytest.mark.django_db
+def test_webhook_flip_redirects_poll_to_downloads(
+    client, order, locmem_cache, django_capture_on_commit_callbacks
+):
+    order_status.seed(order.provider_ref, order.status)
+    with django_capture_on_commit_callbacks(execute=True):
+        mark_order_paid(order)
+    assert order_status.read(order.provider_ref) == "PAID"
+
+    poll = client.get(reverse("store:order_status", args=[order.provider_ref]), **HTMX)
+    assert poll.status_code == 204
+    assert _order_of_link(poll["HX-Redirect"]) == order.pk
+    # Retour ultérieur (commande payée) : redirection directe vers les téléchargements.
+    assert _order_of_link(_return(client, order)["Location"]) == order.pk
+
+
+@pytest.mark.django_db
+def test_failed_payment_stops_polling(
+    client, order, locmem_cache, django_capture_on_commit_callbacks
+):
+    order_status.seed(order.provider_ref, order.status)
+    with django_capture_on_commit_callbacks(execute=True):
+        mark_order_failed(order)
+    poll = client.get(reverse("store:order_status", args=[order.provider_ref]), **HTMX)
+    assert b"hx-trigger" not in poll.content
+    assert not DownloadToken.objects.exists()
+
+
+@pytest.mark.django_db
+def test_status_falls_back_to_db_on_cache_miss(client, order):
+    resp = client.get(reverse("store:order_status", args=[order.provider_ref]))
+    assert resp.json() == {"status": "PENDING"}
+    with pytest.raises(Http404):
+        views.order_status_view(RequestFactory().get("/"), ref="ORDER-unknown")
@@ -0,0 +1,123 @@
+from unittest.mock import patch
+
+import pytest
+
+from store.models import Payment, PaymentEvent
+from store.services.cinetpay import CinetPayError
+from store.services.payments import DeliveryError, enqueue_settlement, settle_payment
+
+
+@pytest.mark.django_db
+def test_settle_marks_paid_and_delivers_once():
+    p = Payment.objects.create(order_id="ORD-S1", amount=15000, status="PENDING")
+    with patch("store.services.payments.payment_check", return_value=(True, "TX-1")), \
+         patch("store.services.payments.deliver_ebook") as mdeliver:
+        assert settle_payment("ORD-S1") == "delivered"
+        assert settle_payment("ORD-S1") == "already_paid"
+    p.refresh_from_db()
+    assert p.status == "PAID"
+    assert p.provider_tx_id == "TX-1"
+    assert mdeliver.call_count == 1
+    assert PaymentEvent.objects.filter(payment=p, kind="CHECK_OK").count() == 1
+
+
+@pytest.mark.django_db
+def test_concurrent_settlement_loses_compare_and_set():
+    p = Payment.objects.create(order_id="ORD-S2", amount=15000, status="PENDING")
+
+    def _other_worker_wins(order_id, raise_on_error=False):
+        # Un autre worker passe la ligne en PAID pendant notre appel réseau.
+        Payment.objects.filter(pk=p.pk).update(status="PAID")
+        return True, "TX-2"
+
+    with patch("store.services.payments.payment_check", side_effect=_other_worker_wins), \
+         patch("store.services.payments.deliver_ebook") as mdeliver:
+        assert settle_payment("ORD-S2") == "already_paid"
+    mdeliver.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_failed_check_never_downgrades_paid():
+    p = Payment.objects.create(order_id="ORD-S3", amount=15000, status="PENDING")
+
+    def _paid_meanwhile(order_id, raise_on_error=False):
+        Payment.objects.filter(pk=p.pk).update(status="PAID")
+        return False, None
+
+    with patch("store.services.payments.payment_check", side_effect=_paid_meanwhile):
+        settle_payment("ORD-S3")
+    p.refresh_from_db()
+    assert p.status == "PAID"
+
+
+@pytest.mark.django_db
+def test_network_error_propagates_for_retry():
+    Payment.objects.create(order_id="ORD-S4", amount=15000, status="PENDING")
+    with patch("store.services.cinetpay.check_transaction", side_effect=CinetPayError("timeout")):
+        with pytest.raises(CinetPayError):
+            settle_payment("ORD-S4")
+    assert Payment.objects.get(order_id="ORD-S4").status == "PENDING"
+
+
+@pytest.mark.django_db
+def test_failed_delivery_is_retried_without_rechecking():
+    p = Payment.objects.create(order_id="ORD-S6", amount=15000, status="PENDING")
+    with patch("store.services.payments.payment_check", return_value=(True, "TX-6")) as mcheck, \
+         patch("store.services.payments.deliver_ebook", side_effect=OSError("smtp down")):
+        with pytest.raises(DeliveryError):
+            settle_payment("ORD-S6")
+    assert Payment.objects.get(pk=p.pk).status == "PAID"
+
+    # Un nouveau webhook ne relivre pas ; le retry de la tâche, si.
+    with patch("store.services.payments.payment_check") as mcheck, \
+         patch("store.services.payments.deliver_ebook") as mdeliver:
+        assert settle_payment("ORD-S6") == "already_paid"
+        mdeliver.assert_not_called()
+        assert settle_payment("ORD-S6", retry_delivery=True) == "delivered"
+    mcheck.assert_not_called()
+    mdeliver.assert_called_once()
+
+
+@pytest.mark.django_db
+def test_delivered_payment_is_not_redelivered_on_retry():
+    p = Payment.objects.create(order_id="ORD-S7", amount=15000, status="PAID")
+    PaymentEvent.objects.create(payment=p, kind="DELIVERED")
+    with patch("store.services.payments.deliver_ebook") as mdeliver:
+        assert settle_payment("ORD-S7", retry_delivery=True) == "already_paid"
+    mdeliver.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_broker_down_never_settles_inline(django_capture_on_commit_callbacks):
+    Payment.objects.create(order_id="ORD-S8", amount=15000, status="PENDING")
+    with patch("store.tasks.process_payment_webhook.apply_async", side_effect=OSError("down")), \
+         patch("store.services.payments.payment_check") as mcheck, \
+         django_capture_on_commit_callbacks(execute=True):
+        enqueue_settlement("ORD-S8")
+    mcheck.assert_not_called()
+    assert Payment.objects.get(order_id="ORD-S8").status == "PENDING"
+
+
+@pytest.mark.django_db
+def test_webhook_acks_without_calling_provider(
+    client, monkeypatch, django_capture_on_commit_callbacks
+):
+    import json
+
+    from store.tests.test_cinetpay_recipe import hdr_key, sig_hex
+
+    monkeypatch.setenv("CINETPAY_WEBHOOK_SECRET", "testsecret")
+    Payment.objects.create(order_id="ORD-S5", amount=15000, status="PENDING")
+    raw = json.dumps({"transaction_id": "ORD-S5"}).encode()
+    with patch("store.services.payments.payment_check") as mcheck, \
+         patch("store.tasks.process_payment_webhook.apply_async") as mpublish, \
+         django_capture_on_commit_callbacks(execute=True):
+        resp = client.post(
+            "/payment/callback/", data=raw, content_type="application/json",
+            **{hdr_key(): sig_hex(raw)},
+        )
+    assert resp.status_code == 200
+    assert resp.json()["queued"] is True
+    mcheck.assert_not_called()
+    mpublish.assert_called_once()
+    assert mpublish.call_args.args[0] == ("ORD-S5",)
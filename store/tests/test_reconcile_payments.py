@@ -0,0 +1,142 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from store.models import Order, Payment, Product
+from store.services import reconcile as rec
+
+ACCEPTED = {"code": "00", "data": {"status": "ACCEPTED", "transaction_id": "CP-1"}}
+REFUSED = {"code": "600", "data": {"status": "REFUSED"}}
+WAITING = {"code": "662", "data": {"status": "WAITING_CUSTOMER_PAYMENT"}}
+
+
+def _order(product, status="PENDING", age=timedelta(hours=1)):
+    o = Order.objects.create(
+        product=product, email="buyer@example.com", amount_fcfa=15000, status=status
+    )
+    Order.objects.filter(pk=o.pk).update(created_at=timezone.now() - age)
+    return o
+
+
+@pytest.fixture
+def product(db):
+    return Product.objects.create(slug="p-reconcile", title="P", price_fcfa=15000)
+
+
+@pytest.mark.django_db
+def test_reconcile_applies_transitions_and_fulfils_new_paid_once(
+    product, django_capture_on_commit_callbacks
+):
+    paid = _order(product)
+    refused = _order(product, status="CREATED")
+    waiting = _order(product)
+    fresh = _order(product, age=timedelta(minutes=1))
+    already = _order(product, status="PAID")
+
+    responses = {paid.provider_ref: ACCEPTED, refused.provider_ref: REFUSED}
+    check = patch.object(
+        rec.cinetpay, "check_transaction", side_effect=lambda tx: responses.get(tx, WAITING)
+    )
+    with check as mcheck, \
+            patch("store.services.fulfillment.after_payment") as mfulfil, \
+            django_capture_on_commit_callbacks(execute=True):
+        counts = rec.reconcile(workers=4, rate=0, chunk_size=2)
+
+    assert counts == {"checked": 3, "paid": 1, "failed": 1, "pending": 1, "error": 0}
+    assert mcheck.call_count == 3
+    statuses = dict(Order.objects.values_list("pk", "status"))
+    assert statuses[paid.pk] == "PAID"
+    assert statuses[refused.pk] == "FAILED"
+    assert statuses[waiting.pk] == "PENDING"
+    assert statuses[fresh.pk] == "PENDING"
+    assert statuses[already.pk] == "PAID"
+    assert Order.objects.get(pk=paid.pk).cinetpay_payment_id == "CP-1"
+    assert mfulfil.call_count == 1
+
+
+@pytest.mark.django_db
+def test_reconcile_skips_rows_paid_by_concurrent_webhook(
+    product, monkeypatch, django_capture_on_commit_callbacks
+):
+    order = _order(product)
+    claim = rec._claim_pending
+
+    def _webhook_wins(model, ids, statuses):
+        # Un webhook passe la ligne en PAID entre le check et l'application.
+        Order.objects.filter(pk=order.pk).update(status="PAID")
+        return claim(model, ids, statuses)
+
+    monkeypatch.setattr(rec, "_claim_pending", _webhook_wins)
+    with patch.object(rec.cinetpay, "check_transaction", return_value=ACCEPTED), \
+            patch("store.services.fulfillment.after_payment") as mfulfil, \
+            django_capture_on_commit_callbacks(execute=True):
+        counts = rec.reconcile(rate=0)
+    assert counts["checked"] == 1
+    assert counts["paid"] == 0
+    mfulfil.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_twin_payment_is_aligned_without_second_delivery(
+    product, django_capture_on_commit_callbacks
+):
+    order = _order(product)
+    Payment.objects.create(order_id=order.provider_ref, amount=15000, status="PENDING")
+    Payment.objects.update(created_at=timezone.now() - timedelta(hours=1))
+
+    with patch.object(rec.cinetpay, "check_transaction", return_value=ACCEPTED) as mcheck, \
+            patch("store.services.fulfillment.after_payment") as mfulfil, \
+            patch("store.services.payments.deliver_ebook") as mdeliver, \
+            django_capture_on_commit_callbacks(execute=True):
+        rec.reconcile(rate=0)
+    assert mcheck.call_count == 1
+    assert mfulfil.call_count == 1
+    mdeliver.assert_not_called()
+    assert Payment.objects.get(order_id=order.provider_ref).status == "PAID"
+
+
+@pytest.mark.django_db
+def test_overlapping_runs_are_single_flight(product):
+    _order(product)
+    with rec.single_flight() as acquired:
+        assert acquired
+        with patch.object(rec.cinetpay, "check_transaction") as mcheck:
+            assert rec.reconcile(rate=0) is None
+        mcheck.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_network_errors_leave_orders_pending(product):
+    order = _order(product)
+    with patch.object(rec.cinetpay, "check_transaction", side_effect=rec.CinetPayError("timeout")):
+        counts = rec.reconcile(rate=0)
+    assert counts["error"] == 1
+    assert Order.objects.get(pk=order.pk).status == "PENDING"
+
+
+@pytest.mark.django_db
+def test_command_dry_run_changes_nothing(product, capsys):
+    order = _order(product)
+    with patch.object(rec.cinetpay, "check_transaction", return_value=ACCEPTED):
+        call_command("reconcile_payments", "--dry-run", "--rate", "0")
+    assert Order.objects.get(pk=order.pk).status == "PENDING"
+    assert "payés: 1" in capsys.readouterr().out
+
+
+def test_rate_limiter_spaces_calls():
+    clock = [0.0]
+    sleeps = []
+
+    def _sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    limiter = rec.RateLimiter(rate=5, clock=lambda: clock[0], sleep=_sleep)
+    for _ in range(15):
+        limiter.acquire()
+    # 5 créneaux en rafale, puis 10 à 5/s → ~2 s.
+    assert clock[0] == pytest.approx(2.0)
+    assert len(sleeps) == 10
@@ -0,0 +1,71 @@
+from unittest.mock import patch
+
+import pytest
+from django.core import mail
+from django.core.management import call_command
+
+from downloads.models import DownloadCategory, ExternalEntitlement
+from store.models import EmailOutbox, Order, Product
+from store.services import resend
+
+
+@pytest.fixture
+def buyers(db):
+    product = Product.objects.create(slug="p-resend", title="P", price_fcfa=15000)
+    for email, status in [("a@example.com", "PAID"), ("b@example.com", "PENDING")]:
+        Order.objects.create(product=product, email=email, amount_fcfa=15000, status=status)
+    cat = DownloadCategory.objects.create(slug="bonus", title="Bonus", page_path="/bonus")
+    for email in ("A@example.com", "c@example.com"):
+        ExternalEntitlement.objects.create(email=email, category=cat, platform="site")
+
+
+@pytest.fixture(autouse=True)
+def _no_links():
+    with patch("store.services.mailing.build_link_manifest", return_value=[]):
+        yield
+
+
+@pytest.mark.django_db
+def test_campaign_reaches_each_buyer_once_over_one_connection(buyers):
+    with patch("store.services.outbox.get_connection", wraps=mail.get_connection) as mconn:
+        counts = resend.run_campaign("v2", rate=0)
+    assert sorted(m.to[0] for m in mail.outbox) == ["a@example.com", "c@example.com"]
+    assert counts["sent"] == 2
+    assert counts["skipped"] == 1  # a@ présent dans les deux populations
+    assert mconn.call_count == 1
+    assert EmailOutbox.objects.filter(kind="resend", status=EmailOutbox.SENT).count() == 2
+
+
+@pytest.mark.django_db
+def test_interrupted_campaign_resumes_without_duplicates(buyers):
+    assert resend.run_campaign("v2", rate=0, chunk_size=1, limit=1)["sent"] == 1
+    assert resend.run_campaign("v2", rate=0, chunk_size=1)["sent"] == 1
+    assert resend.run_campaign("v2", rate=0)["sent"] == 0
+    assert len(mail.outbox) == 2
+    # Nouvelle campagne : tout le monde est servi à nouveau.
+    assert resend.run_campaign("v3", rate=0)["sent"] == 2
+
+
+@pytest.mark.django_db
+def test_sends_are_rate_limited(buyers):
+    with patch.object(resend, "RateLimiter") as mlimiter:
+        resend.run_campaign("v2", rate=3)
+    mlimiter.assert_called_once_with(3)
+    assert mlimiter.return_value.acquire.call_count == 2
+
+
+@pytest.mark.django_db
+def test_smtp_failures_are_reported_and_left_for_retry(buyers):
+    with patch("django.core.mail.EmailMessage.send", side_effect=OSError("421 slow down")):
+        counts = resend.run_campaign("v2", rate=0)
+    assert counts["sent"] == 0
+    assert counts["retry"] == 2
+    assert EmailOutbox.objects.filter(status=EmailOutbox.PENDING, attempts=1).count() == 2
+
+
+@pytest.mark.django_db
+def test_command_dry_run_sends_nothing(buyers, capsys):
+    call_command("resend_fulfilment", "--campaign", "v2", "--dry-run", "--source", "orders")
+    assert "destinataires: 1" in capsys.readouterr().out
+    assert not EmailOutbox.objects.exists()
+    assert len(mail.outbox) == 0
@@ -0,0 +1,74 @@
+import io
+import os
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+from store.models import Order, Product
+from store.services import watermark
+from store.utils.tokens import issue_order_download_token
+
+PyPDF2 = pytest.importorskip("PyPDF2")
+
+
+def _pdf(pages=3) -> bytes:
+    writer = PyPDF2.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=595, height=842)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+@pytest.fixture
+def order(db, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path / "media")
+    settings.PRIVATE_MEDIA_ROOT = str(tmp_path / "private")
+    settings.PDF_WATERMARK_CACHE_DIR = str(tmp_path / "stamped")
+    product = Product.objects.create(
+        slug="asp", title="Audit Sans Peur", price_fcfa=15000,
+        deliverable_file_a4=SimpleUploadedFile("asp-a4.pdf", _pdf()),
+    )
+    return Order.objects.create(
+        product=product, email="buyer@example.com", first_name="Awa", last_name="Diallo",
+        amount_fcfa=15000, status="PAID",
+    )
+
+
+@pytest.mark.django_db
+def test_every_page_carries_the_buyer_footer(order):
+    path = watermark.stamped_pdf(order.product.deliverable_file_a4, order, variant="a4")
+    reader = PyPDF2.PdfReader(str(path))
+    assert len(reader.pages) == 3
+    for page in reader.pages:
+        text = page.extract_text()
+        assert "Awa Diallo / buyer@example.com" in text
+        assert str(order.uuid) in text
+
+
+@pytest.mark.django_db
+def test_stamped_file_is_reused_then_evicted(order, settings, monkeypatch):
+    source = order.product.deliverable_file_a4
+    first = watermark.stamped_pdf(source, order, variant="a4")
+    monkeypatch.setattr(watermark, "_stamp", lambda *a: pytest.fail("déjà en cache"))
+    assert watermark.stamped_pdf(source, order, variant="a4") == first
+    monkeypatch.undo()
+
+    settings.PDF_WATERMARK_CACHE_MAX_BYTES = os.path.getsize(first)
+    other = watermark.stamped_pdf(source, order, variant="6x9")
+    assert other.exists() and not first.exists()
+
+
+@pytest.mark.django_db
+def test_download_version_serves_the_personalised_copy(order, client, settings):
+    url = reverse("store:download_version", args=[issue_order_download_token(order), "a4"])
+    resp = client.get(url)
+    assert resp.status_code == 200
+    assert 'filename="asp-a4' in resp["Content-Disposition"]
+    body = b"".join(resp.streaming_content)
+    assert b"buyer@example.com" in body
+
+    settings.PDF_WATERMARK = False
+    resp = client.get(url)
+    assert b"buyer@example.com" not in b"".join(resp.streaming_content)
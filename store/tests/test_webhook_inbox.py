@@ -0,0 +1,179 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.test import RequestFactory
+
+from store import views
+from store.models import Order, Payment, PaymentEvent, PaymentWebhookLog, Product
+from store.services import metrics, webhooks
+from store.tests.test_cinetpay_recipe import hdr_key, sig_hex
+
+
+@pytest.fixture
+def secret(monkeypatch):
+    monkeypatch.setenv("CINETPAY_WEBHOOK_SECRET", "testsecret")
+
+
+@pytest.fixture
+def inbox(settings, secret):
+    settings.PAYMENT_WEBHOOK_INBOX = True
+
+
+def _post_callback(client, payload, sig=None):
+    raw = json.dumps(payload).encode()
+    return client.post(
+        "/payment/callback/", data=raw, content_type="application/json",
+        **{hdr_key(): sig if sig is not None else sig_hex(raw)},
+    )
+
+
+@pytest.mark.django_db
+def test_inbox_persists_and_acks_without_processing(client, inbox):
+    Payment.objects.create(order_id="ORD-I1", amount=15000, status="PENDING")
+    with patch("store.services.webhooks.enqueue_settlement") as menqueue:
+        resp = _post_callback(client, {"transaction_id": "ORD-I1"})
+    assert resp.status_code == 200
+    menqueue.assert_not_called()
+
+    log = PaymentWebhookLog.objects.get()
+    assert log.endpoint == webhooks.ENDPOINT_CALLBACK
+    assert log.order_ref == "ORD-I1"
+    assert log.signature
+    assert log.processed is False
+    assert "Content-Type" in log.headers
+    assert not PaymentEvent.objects.exists()
+
+
+@pytest.mark.django_db
+def test_inbox_rejects_bad_signature_without_persisting(client, inbox):
+    resp = _post_callback(client, {"transaction_id": "ORD-I2"}, sig="bad")
+    assert resp.status_code == 400
+    assert not PaymentWebhookLog.objects.exists()
+
+
+@pytest.mark.django_db
+def test_drain_processes_and_closes_rows(client, inbox):
+    Payment.objects.create(order_id="ORD-I3", amount=15000, status="PENDING")
+    _post_callback(client, {"transaction_id": "ORD-I3"})
+    _post_callback(client, {"transaction_id": "UNKNOWN"})
+
+    with patch("store.services.webhooks.enqueue_settlement") as menqueue:
+        assert webhooks.drain_inbox(batch_size=1) == 2
+        assert webhooks.drain_inbox() == 0
+    menqueue.assert_called_once_with("ORD-I3")
+    for log in PaymentWebhookLog.objects.all():
+        assert log.processed is True
+        assert log.http_status == 200
+        assert log.attempts == 1
+        assert log.processed_at is not None
+
+
+@pytest.mark.django_db
+def test_drain_keeps_transient_failures_until_max_attempts(monkeypatch):
+    log = PaymentWebhookLog.objects.create(endpoint=webhooks.ENDPOINT_CALLBACK, raw_bytes=b"{}")
+    monkeypatch.setitem(
+        webhooks.HANDLERS, webhooks.ENDPOINT_CALLBACK, lambda raw, sig: (502, {})
+    )
+
+    assert webhooks.drain_inbox() == 1
+    log.refresh_from_db()
+    assert (log.processed, log.http_status, log.attempts) == (False, 502, 1)
+    # Réservée : pas reprise avant CLAIM_TIMEOUT.
+    assert webhooks.drain_inbox() == 0
+
+    PaymentWebhookLog.objects.filter(pk=log.pk).update(
+        claimed_at=None, attempts=webhooks.MAX_ATTEMPTS - 1
+    )
+    webhooks.drain_inbox()
+    log.refresh_from_db()
+    assert log.processed is True
+    assert log.http_status == 502
+
+
+@pytest.mark.django_db
+def test_drain_replays_exact_bytes(client, inbox, monkeypatch):
+    # Corps non UTF-8 : un décodage « replace » casserait le HMAC au rejeu.
+    raw = b'{"transaction_id": "ORD-I4", "note": "\xe9"}'
+    client.post(
+        "/payment/callback/", data=raw, content_type="application/json",
+        **{hdr_key(): sig_hex(raw)},
+    )
+    seen = []
+    monkeypatch.setitem(
+        webhooks.HANDLERS,
+        webhooks.ENDPOINT_CALLBACK,
+        lambda body, sig: seen.append(body) or (200, {}),
+    )
+    assert webhooks.drain_inbox() == 1
+    assert seen == [raw]
+
+
+@pytest.mark.django_db
+def test_drain_task_is_noop_when_inbox_disabled(settings):
+    from store.tasks import drain_webhook_inbox
+
+    settings.PAYMENT_WEBHOOK_INBOX = False
+    PaymentWebhookLog.objects.create(endpoint=webhooks.ENDPOINT_CALLBACK, raw_bytes=b"{}")
+    assert drain_webhook_inbox() == 0
+    assert PaymentWebhookLog.objects.get().attempts == 0
+
+
+@pytest.mark.django_db
+def test_notify_stays_inline_with_inbox_enabled(inbox):
+    product = Product.objects.create(slug="p-inbox", title="P", price_fcfa=15000)
+    order = Order.objects.create(product=product, email="a@example.com", amount_fcfa=15000)
+    raw = json.dumps({"transaction_id": order.provider_ref}).encode()
+    rf = RequestFactory()
+
+    check = {"code": "00", "data": {"status": "ACCEPTED"}}
+    with patch("store.services.webhooks.cinetpay.safe_check", return_value=check), \
+         patch("store.services.fulfillment.after_payment") as mfulfil:
+        for _ in range(2):  # tempête de retries CinetPay
+            resp = views.payment_notify(
+                rf.post("/notify/", data=raw, content_type="application/json")
+            )
+            assert resp.status_code == 200
+    assert not PaymentWebhookLog.objects.exists()
+    order.refresh_from_db()
+    assert order.status == "PAID"
+    assert mfulfil.call_count == 1
+
+
+@pytest.mark.django_db
+def test_exact_replay_short_circuits_before_processing(client, secret, locmem_cache):
+    Payment.objects.create(order_id="ORD-D1", amount=15000, status="PENDING")
+    metrics.reset()
+    with patch("store.services.webhooks.enqueue_settlement") as menqueue:
+        first = _post_callback(client, {"transaction_id": "ORD-D1"})
+        with patch("store.services.webhooks.verify_signature") as mverify:
+            second = _post_callback(client, {"transaction_id": "ORD-D1"})
+        mverify.assert_not_called()
+    assert first.json() == second.json() == {"ok": True, "queued": True}
+    menqueue.assert_called_once_with("ORD-D1")
+    assert PaymentEvent.objects.count() == 1
+    snap = metrics.snapshot("webhook.dedup.")
+    assert (snap["webhook.dedup.miss"], snap["webhook.dedup.hit"]) == (1, 1)
+
+
+@pytest.mark.django_db
+def test_dedup_falls_back_to_db_when_cache_is_cold(client, secret, locmem_cache):
+    Payment.objects.create(order_id="ORD-D2", amount=15000, status="PENDING")
+    with patch("store.services.webhooks.enqueue_settlement") as menqueue:
+        _post_callback(client, {"transaction_id": "ORD-D2"})
+        cache.clear()  # redémarrage / autre worker
+        resp = _post_callback(client, {"transaction_id": "ORD-D2"})
+        # Corps différent (nouvel état côté CinetPay) : traité normalement.
+        _post_callback(client, {"transaction_id": "ORD-D2", "status": "ACCEPTED"})
+    assert resp.json() == {"ok": True, "duplicate": True}
+    assert menqueue.call_count == 2
+
+
+@pytest.mark.django_db
+def test_rejections_are_not_cached(client, secret, locmem_cache):
+    assert _post_callback(client, {"transaction_id": "ORD-D3"}, sig="bad").status_code == 400
+    Payment.objects.create(order_id="ORD-D3", amount=15000, status="PENDING")
+    with patch("store.services.webhooks.enqueue_settlement") as menqueue:
+        assert _post_callback(client, {"transaction_id": "ORD-D3"}).status_code == 200
+    menqueue.assert_called_once_with("ORD-D3")
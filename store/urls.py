@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, views_ops
 
 app_name = "store"
 
@@ -19,6 +19,15 @@ urlpatterns = [
     path("exemples/blocs/", views.examples_block, name="examples_block"),
     path("produit/<slug:slug>/", views.product_detail, name="product_detail"),
     path("start-checkout/", views.start_checkout, name="start_checkout"),
+    path("payment/callback/", views.cinetpay_callback, name="cinetpay_callback"),
+    path("payment/return/", views.cinetpay_return, name="cinetpay_return"),
+    path("payment/status/<str:ref>/", views.order_status_view, name="order_status"),
+    path("download/<str:token>/", views.download_options, name="download_options"),
+    path(
+        "download/<str:token>/<str:version>/",
+        views.download_version,
+        name="download_version",
+    ),
     
     path(
         "buy/other-methods/<slug:product_key>/",
@@ -27,4 +36,5 @@ urlpatterns = [
         ),
     path("kit/inquiry/", views.kit_inquiry, name="kit_inquiry"),
     path("training/inquiry/", views.training_inquiry, name="training_inquiry"),
+    path("ops/metrics/", views_ops.metrics_snapshot, name="ops_metrics"),
 ]
@@ -0,0 +1,250 @@
+# store/utils/delivery.py
+"""
+Livraison des fichiers protégés : Django ne fait que le contrôle d'accès, le
+serveur frontal envoie les octets (le worker Passenger est libéré aussitôt).
+
+FILE_DELIVERY_BACKEND :
+- "stream"     : FileResponse depuis Python (défaut, dev et stockage distant) ;
+- "x-accel"    : nginx, en-tête X-Accel-Redirect vers une location `internal`
+                 (FILE_DELIVERY_ACCEL_LOCATIONS : racine disque → préfixe d'URI) ;
+- "x-sendfile" : Apache mod_xsendfile / LiteSpeed, en-tête X-Sendfile (chemin absolu).
+
+Un fichier hors des racines déclarées, ou sans chemin local (S3…), retombe sur
+le streaming : jamais de chemin arbitraire exposé au serveur frontal.
+
+Avec `request`, la réponse est conditionnelle et reprenable :
+- ETag / Last-Modified calculés depuis os.stat (taille, mtime) sans relire le fichier,
+  ou ETag fort fourni par l'appelant (SHA-256 enregistré à l'upload) ;
+- 304 sur If-None-Match / If-Modified-Since (412 sur If-Match / If-Unmodified-Since) ;
+- en streaming, `Range` simple ou multiple → 206 (multipart/byteranges), 416 hors
+  bornes, If-Range respecté. En x-accel / x-sendfile, le serveur frontal gère Range.
+"""
+from __future__ import annotations
+
+import mimetypes
+import os
+import secrets
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+STREAM, X_ACCEL, X_SENDFILE = "stream", "x-accel", "x-sendfile"
+BACKENDS = (STREAM, X_ACCEL, X_SENDFILE)
+
+RANGE_CHUNK = 64 * 1024
+# Au-delà, la requête Range est ignorée (réponse 200 complète) : pas d'amplification.
+RANGE_MAX_PARTS = 8
+
+
+def backend() -> str:
+    value = (getattr(settings, "FILE_DELIVERY_BACKEND", STREAM) or STREAM).lower()
+    return value if value in BACKENDS else STREAM
+
+
+def _local_path(source) -> str | None:
+    """Chemin disque d'un FieldFile ou d'un chemin ; None si le stockage n'en a pas."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    try:
+        return source.path
+    except (NotImplementedError, AttributeError, ValueError):
+        return None
+
+
+def _location(path: str) -> tuple[str, str] | None:
+    """(chemin réel, préfixe interne + chemin relatif) si `path` est sous une racine déclarée."""
+    real = os.path.realpath(path)
+    for root, prefix in (getattr(settings, "FILE_DELIVERY_ACCEL_LOCATIONS", None) or {}).items():
+        root = os.path.realpath(os.fspath(root))
+        if real.startswith(root + os.sep):
+            rel = os.path.relpath(real, root).replace(os.sep, "/")
+            return real, prefix.rstrip("/") + "/" + quote(rel)
+    return None
+
+
+def _offload(header: str, value: str, filename: str, as_attachment: bool) -> HttpResponse:
+    content_type, encoding = mimetypes.guess_type(filename)
+    resp = HttpResponse(content_type=content_type or "application/octet-stream")
+    resp[header] = value
+    resp["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    if encoding:
+        resp["Content-Encoding"] = encoding
+    return resp
+
+
+def _content_type(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def validators(path: str) -> tuple[str, int, int]:
+    """(ETag, mtime en secondes, taille) d'un fichier local, depuis ses métadonnées."""
+    st = os.stat(path)
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"', int(st.st_mtime), st.st_size
+
+
+def _stamp(resp: HttpResponse, etag: str, mtime: int) -> HttpResponse:
+    resp["ETag"] = etag
+    resp["Last-Modified"] = http_date(mtime)
+    patch_cache_control(resp, private=True)
+    return resp
+
+
+def parse_range(header: str | None, size: int) -> list[tuple[int, int]] | None:
+    """
+    Plages d'octets (début, fin incluse) satisfiables de `header`, triées et
+    fusionnées. None : en-tête absent, invalide ou abusif (servir le fichier entier) ;
+    [] : aucune plage satisfiable (416).
+    """
+    unit, _, spec = (header or "").partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip() or size <= 0:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        first, sep, last = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if not first:
+                length = int(last)
+                if length <= 0:
+                    continue
+                start, end = max(0, size - length), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else None
+                if start < 0 or (end is not None and end < start):
+                    return None
+                if start >= size:
+                    continue
+                end = size - 1 if end is None else min(end, size - 1)
+        except ValueError:
+            return None
+        ranges.append((start, end))
+    if len(ranges) > RANGE_MAX_PARTS:
+        return None
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _read(path: str, start: int, end: int):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = fh.read(min(RANGE_CHUNK, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def _if_range_matches(request, etag: str, mtime: int) -> bool:
+    value = request.headers.get("If-Range")
+    if not value:
+        return True
+    if value.startswith(("W/", '"')):
+        return value == etag  # comparaison forte (RFC 9110 §13.1.5)
+    return parse_http_date_safe(value) == mtime
+
+
+def _partial(request, path: str, filename: str, as_attachment: bool, size: int, etag, mtime):
+    """Réponse 206/416 si la requête porte un Range exploitable, sinon None."""
+    if request.method not in ("GET", "HEAD") or not _if_range_matches(request, etag, mtime):
+        return None
+    ranges = parse_range(request.headers.get("Range"), size)
+    if ranges is None:
+        return None
+    if not ranges:
+        resp = HttpResponse(status=416)
+        resp["Content-Range"] = f"bytes */{size}"
+        return resp
+
+    content_type = _content_type(filename)
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        resp = StreamingHttpResponse(_read(path, start, end), status=206, content_type=content_type)
+        resp["Content-Range"] = f"bytes {start}-{end}/{size}"
+        resp["Content-Length"] = str(end - start + 1)
+    else:
+        boundary = secrets.token_hex(16)
+        heads = [
+            (
+                f"--{boundary}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+            ).encode("ascii")
+            for start, end in ranges
+        ]
+        tail = f"--{boundary}--\r\n".encode("ascii")
+
+        def body():
+            for head, (start, end) in zip(heads, ranges):
+                yield head
+                yield from _read(path, start, end)
+                yield b"\r\n"
+            yield tail
+
+        length = sum(len(h) + end - start + 1 + 2 for h, (start, end) in zip(heads, ranges))
+        resp = StreamingHttpResponse(
+            body(), status=206, content_type=f"multipart/byteranges; boundary={boundary}"
+        )
+        resp["Content-Length"] = str(length + len(tail))
+    resp["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    return resp
+
+
+def serve_file(
+    source,
+    *,
+    request=None,
+    filename: str | None = None,
+    as_attachment: bool = True,
+    etag: str | None = None,
+):
+    """
+    Réponse de téléchargement pour `source` (FieldFile ou chemin disque), selon
+    FILE_DELIVERY_BACKEND. Lève Http404 si le fichier local n'existe pas.
+    `request` active validateurs, GET conditionnel et Range (fichiers locaux) ;
+    `etag` (empreinte du contenu connue de l'appelant) remplace l'ETag taille/mtime.
+    """
+    path = _local_path(source)
+    if filename is None:
+        filename = Path(path or getattr(source, "name", "") or "fichier").name
+    if path is not None and not os.path.isfile(path):
+        raise Http404("Fichier non disponible.")
+
+    conditional = request is not None and path is not None
+    if conditional:
+        computed, mtime, size = validators(path)
+        etag = etag or computed
+        stamp = _stamp(HttpResponse(), etag, mtime)
+        early = get_conditional_response(request, etag=etag, last_modified=mtime, response=stamp)
+        if early is not stamp:
+            return early
+
+    mode = backend()
+    located = _location(path) if path is not None and mode != STREAM else None
+    if located and mode == X_ACCEL:
+        resp = _offload("X-Accel-Redirect", located[1], filename, as_attachment)
+    elif located and mode == X_SENDFILE:
+        resp = _offload("X-Sendfile", located[0], filename, as_attachment)
+    else:
+        resp = None
+        if conditional:
+            resp = _partial(request, path, filename, as_attachment, size, etag, mtime)
+        if resp is None:
+            handle = open(path, "rb") if path is not None else source.open("rb")
+            resp = FileResponse(handle, as_attachment=as_attachment, filename=filename)
+        if conditional:
+            resp["Accept-Ranges"] = "bytes"
+    if conditional and resp.status_code != 416:
+        _stamp(resp, etag, mtime)
+    return resp
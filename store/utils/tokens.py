@@ -1,88 +1,279 @@
 # store/utils/tokens.py
 """
 Utilitaires pour la gestion des tokens de téléchargement signés.
+
+Jetons sans état : le jeton porte lui-même commande ou inquiry, variante,
+expiration, nombre d'utilisations et un nonce, sous un HMAC-SHA256 tronqué.
+Sa vérification est du pur calcul (aucune requête).
+
+- Format (base64url, ~50 caractères) : en-tête binaire | variante | id de clé | MAC.
+- Rotation : la première clé de DOWNLOAD_TOKEN_KEYS signe, toutes vérifient
+  (à défaut : SECRET_KEY puis SECRET_KEY_FALLBACKS).
+- max_uses = 0 (liens de commande) : aucune écriture. Sinon le compteur vit dans
+  le cache (amorcé depuis la base au premier usage) et chaque consommation est
+  persistée en arrière-plan dans DownloadToken (tâche `record_download_token_use`).
+
+Les jetons historiques (TimestampSigner, contiennent « : ») restent acceptés
+via la table DownloadToken jusqu'à leur expiration.
 """
-from django.core.signing import TimestampSigner, BadSignature, SignatureExpired
-from django.utils import timezone
-from datetime import timedelta
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import hmac
+import logging
+import secrets
+import struct
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
 
 from store.models import DownloadToken, ClientInquiry
 
+logger = logging.getLogger(__name__)
+
+# Lien de téléchargement d'une commande payée (annoncé « valable 72h » dans l'email).
+ORDER_TOKEN_TTL = timedelta(hours=72)
+
+ORDER, INQUIRY = "o", "i"
+TOKEN_VERSION = 1
+# version, type, id, expiration (epoch), max_uses (0 = illimité), nonce
+_HEADER = struct.Struct(">Bc Q I B 6s")
+MAC_SIZE = 12  # 96 bits
+MAX_VARIANT = 16
+_KEY_SALT = b"store.utils.tokens.download"
+USES_PREFIX = "dltok:uses"
+
+
+class DownloadGrant(NamedTuple):
+    kind: str  # ORDER | INQUIRY
+    object_id: int
+    variant: str
+    expires_at: int  # epoch
+    max_uses: int  # 0 = illimité
+    nonce: str
+
+
+def _secrets() -> tuple[str, ...]:
+    keys = [k for k in getattr(settings, "DOWNLOAD_TOKEN_KEYS", None) or [] if k]
+    if not keys:
+        keys = [settings.SECRET_KEY, *getattr(settings, "SECRET_KEY_FALLBACKS", [])]
+    return tuple(keys)
+
+
+@lru_cache(maxsize=8)
+def _keyring(keys: tuple[str, ...]) -> tuple[tuple[int, bytes], ...]:
+    """(id de clé sur 1 octet, clé dérivée) ; la première signe."""
+    ring = []
+    for secret in keys:
+        key = hashlib.sha256(_KEY_SALT + secret.encode("utf-8")).digest()
+        ring.append((hashlib.sha256(key).digest()[0], key))
+    return tuple(ring)
+
+
+def _mac(key: bytes, signed: bytes) -> bytes:
+    return hmac.new(key, signed, hashlib.sha256).digest()[:MAC_SIZE]
+
+
+def sign_download_token(
+    kind: str, object_id: int, *, ttl: timedelta, variant: str = "", max_uses: int = 0
+) -> str:
+    """Jeton auto-vérifiable pour une commande (ORDER) ou une inquiry (INQUIRY)."""
+    if kind not in (ORDER, INQUIRY):
+        raise ValueError(f"type de jeton inconnu : {kind!r}")
+    if len(variant) > MAX_VARIANT or not variant.isascii():
+        raise ValueError(f"variante invalide : {variant!r}")
+    if not 0 <= max_uses <= 255:
+        raise ValueError(f"max_uses hors bornes : {max_uses}")
+    if kind == ORDER and max_uses:
+        # DownloadToken.order est un OneToOne : un seul compteur par commande possible.
+        raise ValueError("les jetons de commande sont à usage illimité")
+    expires = int(time.time() + ttl.total_seconds())
+    body = _HEADER.pack(
+        TOKEN_VERSION, kind.encode(), object_id, max(0, expires), max_uses, secrets.token_bytes(6)
+    ) + variant.encode("ascii")
+    kid, key = _keyring(_secrets())[0]
+    signed = body + bytes([kid])
+    return base64.urlsafe_b64encode(signed + _mac(key, signed)).rstrip(b"=").decode("ascii")
 
-def issue_download_token(inquiry: ClientInquiry, ttl_minutes: int = 45) -> DownloadToken:
+
+def verify_download_token(
+    token: str, *, kind: str | None = None, variant: str | None = None
+) -> DownloadGrant | None:
+    """
+    Vérifie signature, expiration, type et variante, sans requête.
+    Une variante vide dans le jeton vaut pour toutes les variantes.
     """
-    Génère un token de téléchargement signé pour une inquiry.
-    
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (binascii.Error, ValueError):
+        return None
+    if len(raw) < _HEADER.size + 1 + MAC_SIZE:
+        return None
+    signed, mac = raw[:-MAC_SIZE], raw[-MAC_SIZE:]
+    kid = signed[-1]
+    if not any(
+        hmac.compare_digest(_mac(key, signed), mac)
+        for key_id, key in _keyring(_secrets()) if key_id == kid
+    ):
+        return None
+    version, kind_b, object_id, expires, max_uses, nonce = _HEADER.unpack_from(signed)
+    grant = DownloadGrant(
+        kind=kind_b.decode("ascii", "replace"),
+        object_id=object_id,
+        variant=signed[_HEADER.size:-1].decode("ascii", "replace"),
+        expires_at=expires,
+        max_uses=max_uses,
+        nonce=nonce.hex(),
+    )
+    if version != TOKEN_VERSION or expires <= time.time():
+        return None
+    if kind is not None and grant.kind != kind:
+        return None
+    if variant is not None and grant.variant not in ("", variant):
+        return None
+    return grant
+
+
+def _uses_key(grant: DownloadGrant) -> str:
+    return f"{USES_PREFIX}:{grant.nonce}"
+
+
+def _expires_at(grant: DownloadGrant) -> datetime:
+    return datetime.fromtimestamp(grant.expires_at, tz=dt_timezone.utc)
+
+
+def record_use(token: str, grant: DownloadGrant | None = None) -> None:
+    """Persiste une consommation dans DownloadToken (ligne créée au premier usage)."""
+    grant = grant or verify_download_token(token)
+    if grant is None or not grant.max_uses:
+        return
+    owner = {"order_id" if grant.kind == ORDER else "inquiry_id": grant.object_id}
+    with transaction.atomic():
+        DownloadToken.objects.get_or_create(
+            token=token,
+            defaults={**owner, "expires_at": _expires_at(grant), "max_uses": grant.max_uses},
+        )
+        DownloadToken.objects.filter(token=token).update(used_count=F("used_count") + 1)
+
+
+def _record_async(token: str) -> None:
+    def _send():
+        from store.services.payments import PUBLISH_RETRY_POLICY
+        from store.tasks import record_download_token_use
+
+        try:
+            record_download_token_use.apply_async(
+                (token,), retry=True, retry_policy=PUBLISH_RETRY_POLICY
+            )
+        except Exception:
+            # Le compteur en cache reste la référence jusqu'à l'expiration.
+            logger.exception("[tokens] Broker indisponible, consommation non persistée")
+
+    transaction.on_commit(_send)
+
+
+def consume(token: str, grant: DownloadGrant) -> bool:
+    """
+    Enregistre une utilisation de `grant` ; False si max_uses est atteint.
+    Jeton illimité : aucun accès cache ni base.
+    """
+    if not grant.max_uses:
+        return True
+    key = _uses_key(grant)
+    ttl = max(1, int(grant.expires_at - time.time()))
+    if cache.get(key) is None:
+        used = (
+            DownloadToken.objects.filter(token=token)
+            .values_list("used_count", flat=True).first() or 0
+        )
+        cache.add(key, used, ttl)
+    try:
+        used = cache.incr(key)
+    except ValueError:
+        # Cache indisponible (DummyCache…) : la base fait foi, de façon synchrone.
+        with transaction.atomic():
+            used = (
+                DownloadToken.objects.select_for_update().filter(token=token)
+                .values_list("used_count", flat=True).first() or 0
+            )
+            if used >= grant.max_uses:
+                return False
+            record_use(token, grant)
+        return True
+    if used > grant.max_uses:
+        return False
+    _record_async(token)
+    return True
+
+
+def issue_download_token(inquiry: ClientInquiry, ttl_minutes: int = 45) -> str:
+    """
+    Génère un token de téléchargement signé, à usage unique, pour une inquiry.
+
     Args:
         inquiry: Instance ClientInquiry
         ttl_minutes: Durée de vie du token en minutes (défaut: 45)
-    
+
     Returns:
-        DownloadToken créé
+        Token signé (aucune écriture en base)
     """
-    signer = TimestampSigner()
-    token = signer.sign(str(inquiry.id))
-    expires_at = timezone.now() + timedelta(minutes=ttl_minutes)
-    
-    dt = DownloadToken.objects.create(
-        inquiry=inquiry,
-        token=token,
-        expires_at=expires_at,
-        max_uses=1,
-        used_count=0,
+    return sign_download_token(
+        INQUIRY, inquiry.id, ttl=timedelta(minutes=ttl_minutes), max_uses=1
     )
-    
-    return dt
+
+
+def issue_order_download_token(order, ttl: timedelta = ORDER_TOKEN_TTL, variant: str = "") -> str:
+    """
+    Token de téléchargement d'une commande, utilisable à volonté jusqu'à expiration.
+    """
+    return sign_download_token(ORDER, order.pk, ttl=ttl, variant=variant)
+
+
+def resolve_order_token(token: str, *, variant: str | None = None) -> int | None:
+    """
+    ID de la commande d'un lien de téléchargement, None si invalide ou expiré.
+    Jetons historiques (en base) acceptés jusqu'à leur expiration.
+    """
+    if ":" not in token:
+        grant = verify_download_token(token, kind=ORDER, variant=variant)
+        return grant.object_id if grant and consume(token, grant) else None
+    dt = DownloadToken.objects.filter(token=token).first()
+    return dt.order_id if dt and dt.order_id and dt.is_valid() else None
 
 
 def validate_download_token(token: str) -> int | None:
     """
     Valide un token de téléchargement et retourne l'ID de l'inquiry.
-    
+
     Args:
         token: Token signé
-    
+
     Returns:
         ID de l'inquiry si valide, None sinon
     """
-    signer = TimestampSigner()
-    try:
-        val = signer.unsign(token, max_age=3600)  # 60 min max
-        return int(val)
-    except (BadSignature, SignatureExpired, ValueError):
-        return None
+    grant = verify_download_token(token, kind=INQUIRY)
+    return grant.object_id if grant else None
 
 
-def consume_token(token_str: str) -> DownloadToken | None:
+def consume_token(token_str: str) -> DownloadGrant | None:
     """
-    Consomme un token (incrémente used_count) si valide et non expiré.
-    
+    Consomme un token d'inquiry si valide, non expiré et pas encore épuisé.
+
     Args:
         token_str: Token à consommer
-    
+
     Returns:
-        DownloadToken si valide et consommable, None sinon
+        DownloadGrant si valide et consommable, None sinon
     """
-    inquiry_id = validate_download_token(token_str)
-    if not inquiry_id:
+    grant = verify_download_token(token_str, kind=INQUIRY)
+    if grant is None or not consume(token_str, grant):
         return None
-    
-    try:
-        dt = DownloadToken.objects.select_for_update().get(
-            token=token_str,
-            inquiry_id=inquiry_id,
-        )
-        
-        # Vérifier expiration et limite d'utilisation
-        if not dt.is_valid():
-            return None
-        
-        # Incrémenter le compteur
-        dt.used_count += 1
-        dt.save(update_fields=["used_count"])
-        
-        return dt
-        
-    except DownloadToken.DoesNotExist:
-        return None
-
+    return grant
@@ -0,0 +1,86 @@
+# store/utils/zipstream.py
+"""
+Archive ZIP produite au fil de l'eau, pour StreamingHttpResponse.
+
+- zipfile écrit dans un tampon non positionnable (`_Sink`) : en-têtes locaux avec
+  descripteur de données, aucun retour en arrière, donc ni fichier temporaire ni
+  archive en mémoire ; le générateur vide le tampon après chaque morceau lu.
+- Chaque membre est lu par morceaux de CHUNK octets : la mémoire reste bornée quelle
+  que soit la taille des fichiers.
+- `stored=True` : membre copié tel quel (ZIP_STORED), pour les formats déjà compressés ;
+  sinon ZIP_DEFLATED. ZIP64 activé d'après la taille annoncée.
+"""
+from __future__ import annotations
+
+import logging
+import time
+import zipfile
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK = 64 * 1024
+# Les dates ZIP (MS-DOS) commencent en 1980.
+_EPOCH_1980 = (1980, 1, 1, 0, 0, 0)
+
+
+class ZipMember(NamedTuple):
+    name: str  # chemin dans l'archive
+    source: str  # interprété par `opener`
+    size: int
+    mtime: float
+    stored: bool
+
+
+class _Sink:
+    """Tampon en écriture seule : zipfile y écrit, le générateur le vide."""
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _zipinfo(member: ZipMember) -> zipfile.ZipInfo:
+    date_time = max(time.localtime(member.mtime)[:6], _EPOCH_1980)
+    info = zipfile.ZipInfo(member.name, date_time=date_time)
+    info.compress_type = zipfile.ZIP_STORED if member.stored else zipfile.ZIP_DEFLATED
+    info.file_size = member.size  # zipfile en déduit le besoin de ZIP64
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def stream_zip(
+    members: Iterable[ZipMember], opener: Callable[[ZipMember], object], *, chunk_size: int = CHUNK
+) -> Iterator[bytes]:
+    """
+    Génère les octets de l'archive. `opener(member)` renvoie un fichier binaire ouvert ;
+    un membre illisible (OSError) est omis et journalisé, l'archive reste valide.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as archive:
+        for member in members:
+            try:
+                source = opener(member)
+            except OSError as exc:
+                logger.warning(f"[zipstream] {member.name} omis : {exc}")
+                continue
+            with source, archive.open(_zipinfo(member), "w") as dest:
+                while chunk := source.read(chunk_size):
+                    dest.write(chunk)
+                    if data := sink.drain():
+                        yield data
+            if data := sink.drain():
+                yield data
+    if data := sink.drain():
+        yield data
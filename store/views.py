@@ -1,6 +1,5 @@
 # store/views.py
 import hashlib
-import hmac
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,18 +11,25 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.mail import EmailMessage, send_mail
 from django.db.models import Prefetch
-from django.http import FileResponse, Http404, HttpResponse, JsonResponse, HttpResponseBadRequest
+from django.http import Http404, HttpResponse, JsonResponse, HttpResponseBadRequest
 from django.db.models import Q
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
+from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods, require_POST
 
 import store.services.cinetpay as cinetpay
-from store.services.cinetpay import verify_signature, payment_check
+from store.services.cinetpay import verify_signature
+# Ré-export historique (downloads/tests/test_gating.py importe store.views.deliver_ebook).
+from store.services.payments import deliver_ebook  # noqa: F401
+from store.services import catalog, checkout, order_status, outbox, watermark, webhooks
+from store.utils.delivery import serve_file
+from store.utils.tokens import issue_order_download_token, resolve_order_token
 from downloads.models import DownloadableAsset
 from store.content.faqs import FAQ_ITEMS
 from downloads.services import user_has_access
+from downloads import stats as download_stats
 
 from pathlib import Path
 from django.shortcuts import render, get_object_or_404
@@ -68,8 +74,6 @@ def downloads_irregularites(request):
   # ta logique d'entitlement
 
 from .models import (
-    DownloadToken,
-    ExampleSlide,
     InquiryDocument,
     IrregularityCategory,
     IrregularityRow,
@@ -93,10 +97,15 @@ def get_webhook_header():
 # ---- Pages ----
 
 def product_detail(request, slug):
-    product = get_object_or_404(Product, slug=slug, is_published=True)
-    media = MediaAsset.objects.filter(product=product)
+    snap = catalog.snapshot()
+    if snap.product is not None and snap.product.slug == slug:
+        product, media = snap.product, snap.media
+        standard_tier = snap.tier(OfferTier.STANDARD)
+    else:
+        product = get_object_or_404(Product, slug=slug, is_published=True)
+        media = MediaAsset.objects.filter(product=product)
+        standard_tier = OfferTier.objects.filter(product=product, kind="STANDARD").first()
     proofs = product.social_proofs_json or []
-    standard_tier = OfferTier.objects.filter(product=product, kind="STANDARD").first()
 
     rows_ebook = SEED_IRREGULARITIES.get(slug, [])
 
@@ -115,11 +124,11 @@ def product_detail(request, slug):
 
 
 def offers(request):
-    product = Product.objects.filter(is_published=True).first()
-    tiers_qs = OfferTier.objects.filter(product=product) if product else OfferTier.objects.none()
+    snap = catalog.snapshot()
+    product, tiers = snap.product, snap.tiers
 
     standard = kit = formation = None
-    for t in tiers_qs:
+    for t in tiers:
         label = (getattr(t, "get_kind_display", lambda: "")() or t.title or "").lower()
         combo = " ".join([getattr(t, "slug", "") or "", t.title or "", label])
         if "ebook" in combo or "standard" in combo:
@@ -128,12 +137,12 @@ def offers(request):
             kit = t
         elif "formation" in combo or "assistance" in combo:
             formation = t
-    if standard is None and tiers_qs.exists():
-        standard = tiers_qs.order_by("order", "id").first()
-    if kit is None and tiers_qs.count() >= 2:
-        kit = tiers_qs.order_by("order", "id")[1]
-    if formation is None and tiers_qs.count() >= 3:
-        formation = tiers_qs.order_by("order", "id")[2]
+    if standard is None and tiers:
+        standard = tiers[0]
+    if kit is None and len(tiers) >= 2:
+        kit = tiers[1]
+    if formation is None and len(tiers) >= 3:
+        formation = tiers[2]
 
     return render(
         request,
@@ -217,7 +226,7 @@ def kit_inquiry(request):
                     if files:
                         names = "\n".join(f"- {f.name}" for f in files)
                         email.body += "\n\nFichiers reçus (non attachés car volumineux) :\n" + names
-                email.send(fail_silently=True)
+                outbox.enqueue(email, kind="kit_inquiry")
                 messages.success(
                     request,
                     "Merci, votre demande a bien été envoyée. "
@@ -293,10 +302,18 @@ def training_inquiry_view(request):
                     to=["contact@auditsanspeur.com"],
                     reply_to=[data["email"]],
                 )
-                email.send(fail_silently=False)
+                if _total_size(files) <= MAX_ATTACH_TOTAL:
+                    for f in files:
+                        email.attach(f.name, f.read(), f.content_type or "application/octet-stream")
+                else:
+                    if files:
+                        names = "\n".join(f"- {f.name}" for f in files)
+                        email.body += "\n\nFichiers reçus (non attachés car volumineux) :\n" + names
+                outbox.enqueue(email, kind="training_inquiry")
                 messages.success(
                     request,
-                    "Merci, votre demande a bien été envoyée. Nous vous contactons sous 24–48 h.",
+                    "Merci, votre demande a bien été envoyée. "
+                    "Nous vous contactons sous 24–48 h avec une proposition adaptée.",
                 )
             except Exception:
                 logging.getLogger(__name__).exception("Erreur d'envoi email")
@@ -304,21 +321,6 @@ def training_inquiry_view(request):
                     request,
                     "Votre demande est enregistrée. Un souci d'email est survenu ; nous vous recontactons vite.",
                 )
-
-            if _total_size(files) <= MAX_ATTACH_TOTAL:
-                for f in files:
-                    email.attach(f.name, f.read(), f.content_type or "application/octet-stream")
-            else:
-                if files:
-                    names = "\n".join(f"- {f.name}" for f in files)
-                    email.body += "\n\nFichiers reçus (non attachés car volumineux) :\n" + names
-
-            email.send(fail_silently=False)
-
-            messages.success(
-                request,
-                "Merci, votre demande a bien été envoyée. Nous vous contactons sous 24–48 h avec une proposition adaptée.",
-            )
             return redirect(reverse("store:training_inquiry_success"))
     else:
         form = TrainingInquiryForm()
@@ -331,15 +333,15 @@ def training_inquiry_success(request):
 
 
 def examples(request):
-    product = Product.objects.filter(is_published=True).first()
-    slides = ExampleSlide.objects.filter(product=product) if product else []
+    snap = catalog.snapshot()
+    product, slides = snap.product, snap.slides
     return render(request, "store/examples.html", {"product": product, "slides": slides})
 
 
 @require_http_methods(["GET"])
 def irregularities_table(request):
     version = request.GET.get("version", "EBOOK")
-    product = Product.objects.filter(is_published=True).first()
+    product = catalog.snapshot().product
     rows = (
         IrregularityRow.objects.filter(product=product, version=version).order_by("order")[:5]
         if product
@@ -357,6 +359,19 @@ SLUG_ALIASES = {
 }
 
 @require_http_methods(["GET", "POST"])
+def _payment_unavailable(request, product):
+    """503 immédiat quand le disjoncteur CinetPay est ouvert."""
+    return render(
+        request,
+        "store/payment_error.html",
+        {
+            "message": "Le paiement en ligne est momentanément indisponible.",
+            "other_methods_url": reverse("store:buy_other_methods", args=[product.slug]),
+        },
+        status=503,
+    )
+
+
 def buy(request, slug):
     # 1) Résolution d’alias (ex. /buy/cinetpay/ => product "audit-sans-peur")
     canonical_slug = SLUG_ALIASES.get(slug, slug)
@@ -378,7 +393,18 @@ def buy(request, slug):
                     status=400,
                 )
             tier = get_object_or_404(OfferTier, id=tier_id, product=product)
-            transaction_id = uuid.uuid4().hex[:24].upper()
+            idem_key = data.get("idempotency_key") or ""
+            reuse = {"product": product, "tier_id": tier.id, "email": data["email"]}
+            payment_url = checkout.find_reusable(idempotency_key=idem_key, **reuse)
+            if payment_url is None and not checkout.claim(idem_key):
+                # Double soumission en vol : on attend l'URL de la première.
+                payment_url = checkout.wait_for(idem_key)
+            if payment_url:
+                return redirect(payment_url)
+            if cinetpay.breaker.state() == cinetpay.breaker.OPEN:
+                # CinetPay en panne : pas d'Order orpheline, renvoi vers les autres moyens.
+                checkout.release(idem_key)
+                return _payment_unavailable(request, product)
             amount = tier.price_fcfa or product.price_fcfa
             order = Order.objects.create(
                 product=product,
@@ -394,17 +420,23 @@ def buy(request, slug):
             )
             try:
                 payment_url = cinetpay.init_payment_auto(order=order, request=request)
+            except cinetpay.CircuitOpenError:
+                order.delete()
+                checkout.release(idem_key)
+                return _payment_unavailable(request, product)
             except Exception:
                 order.delete()
+                checkout.release(idem_key)
                 return render(
                     request,
                     "store/payment_error.html",
                     {"message": "Erreur lors de l'initialisation du paiement."},
                     status=500,
                 )
+            checkout.remember(order, payment_url, idem_key)
             return redirect(payment_url)
     else:
-        form = CheckoutForm()
+        form = CheckoutForm(initial={"idempotency_key": uuid.uuid4().hex})
 
     # 2) Flag provider pour le template (affichage branding CinetPay)
     return render(
@@ -433,9 +465,6 @@ def payment_success(request, order_id):
 
 
 # --- Paiement CinetPay sécurisé ---
-import json
-
-from django.db import transaction
 from django.views.decorators.http import require_POST
 
 try:
@@ -511,136 +540,43 @@ def payment_return(request):
     return redirect("downloads:secure", order_uuid=order.uuid)
 
 
+def _webhook_response(http_status, body):
+    if isinstance(body, dict):
+        return JsonResponse(body, status=http_status)
+    return HttpResponse(body, status=http_status)
+
+
 @csrf_exempt
 @require_POST
 def cinetpay_callback(request):
     """
-    Legacy/alt webhook with custom header (x-token) + verify_signature + S2S check.
+    Legacy/alt webhook with custom header (x-token) + verify_signature.
+    Ack immédiat : le check S2S et la livraison tournent dans un worker
+    (store.services.payments.settle_payment), hors de toute transaction.
+    En mode inbox, la signature est vérifiée puis le message est persisté tel quel.
+    Un rejeu exact d'une notification déjà acquittée reçoit la réponse en cache.
     """
-    import hashlib as _hl
+    endpoint = webhooks.ENDPOINT_CALLBACK
+    raw = request.body or b""
+    replay = webhooks.dedup_lookup(endpoint, raw)
+    if replay is not None:
+        return _webhook_response(*replay)
 
     header_name = get_webhook_header()
     sig = request.headers.get(header_name) or request.META.get(
         f"HTTP_{header_name.upper().replace('-','_')}"
     )
-    raw = request.body or b""
     _sigdebug(header_name, sig, raw)
-    if not sig or not verify_signature(sig, raw):
-        logging.getLogger(__name__).warning(
-            "Invalid signature: header=%s body_len=%d body_sha256=%s",
-            header_name,
-            len(raw),
-            _hl.sha256(raw).hexdigest(),
-        )
-        return HttpResponseBadRequest("Invalid signature")
-
-    try:
-        payload = json.loads(raw.decode("utf-8"))
-    except Exception:
-        return HttpResponseBadRequest("Invalid JSON")
-
-    order_id = (
-        payload.get("transaction_id") or payload.get("cpm_trans_id") or payload.get("order_id")
-    )
-    if not order_id:
-        return HttpResponseBadRequest("Missing order_id")
-
-    with transaction.atomic():
-        try:
-            payment = Payment.objects.select_for_update().get(order_id=order_id)
-        except Payment.DoesNotExist:
-            logging.getLogger(__name__).error("Webhook (legacy) for unknown order_id=%s", order_id)
-            return JsonResponse({"ok": False, "reason": "unknown_order"}, status=200)
-
-        if PaymentEvent:
-            try:
-                PaymentEvent.objects.create(payment=payment, kind="WEBHOOK", payload=payload)
-            except Exception:
-                logging.getLogger(__name__).exception("Failed to persist PaymentEvent for %s", order_id)
-
-        if getattr(payment, "status", None) == "PAID":
-            return JsonResponse({"ok": True, "idempotent": True}, status=200)
-
-        try:
-            amt = payload.get("amount")
-            cur = payload.get("currency")
-            if amt is not None and int(amt) != int(payment.amount):
-                logging.getLogger(__name__).warning(
-                    "Amount mismatch for %s: payload=%s db=%s", order_id, amt, payment.amount
-                )
-            if cur and cur != getattr(payment, "currency", None):
-                logging.getLogger(__name__).warning(
-                    "Currency mismatch for %s: payload=%s db=%s",
-                    order_id,
-                    cur,
-                    getattr(payment, "currency", None),
-                )
-        except Exception:
-            pass
-
-        ok, provider_tx_id = payment_check(order_id)
-        if not ok:
-            try:
-                payment.status = "FAILED"
-                payment.save(update_fields=["status", "updated_at"])
-            except Exception:
-                payment.status = "FAILED"
-                payment.save()
-            if PaymentEvent:
-                try:
-                    PaymentEvent.objects.create(payment=payment, kind="CHECK_FAIL", payload={})
-                except Exception:
-                    logging.getLogger(__name__).exception("Failed to persist CHECK_FAIL for %s", order_id)
-            return JsonResponse({"ok": False, "reason": "check_failed"}, status=200)
-
-        payment.status = "PAID"
-        if provider_tx_id:
-            setattr(payment, "provider_tx_id", provider_tx_id)
-        try:
-            payment.save(update_fields=["status", "provider_tx_id", "updated_at"])
-        except Exception:
-            payment.save()
-
-        if PaymentEvent:
-            try:
-                PaymentEvent.objects.create(
-                    payment=payment, kind="CHECK_OK", payload={"provider_tx_id": provider_tx_id}
-                )
-            except Exception:
-                logging.getLogger(__name__).exception("Failed to persist CHECK_OK for %s", order_id)
-
-        try:
-            deliver_ebook(payment)
-        except Exception as e:
-            logging.getLogger(__name__).exception("Delivery error for %s: %s", order_id, e)
-            return JsonResponse({"ok": True, "delivered": False}, status=200)
-
-    return JsonResponse({"ok": True, "delivered": True}, status=200)
-
-
-def deliver_ebook(payment):
-    """
-    Génère un lien de téléchargement unique et expirable, envoie l'e-mail, journalise l'event.
-    """
-    from django.urls import reverse
-
-    order = Order.objects.filter(provider_ref=payment.order_id).first()
-    if not order:
-        return
-    token_obj, _ = DownloadToken.objects.get_or_create(order=order)
-    base_url = settings.CINETPAY_RETURN_URL.rstrip("/")
-    download_url = f"{base_url}" + reverse("downloads:secure_token", args=[str(token_obj.token)])
-    subject = "Votre lien de téléchargement AuditShield"
-    message = (
-        f"Merci pour votre achat !\n\n"
-        f"Téléchargez votre ebook ici (valable 72h) : {download_url}\n\n"
-        f"Ceci est un lien personnel et temporaire."
-    )
-    send_mail(subject, message, None, [payment.email])
-    if PaymentEvent:
-        PaymentEvent.objects.create(
-            payment=payment, kind="DELIVERED", payload={"download_url": download_url}
-        )
+    if webhooks.inbox_enabled():
+        if not sig or not verify_signature(sig, raw):
+            return HttpResponseBadRequest("Invalid signature")
+        webhooks.record(endpoint, request, signature=sig)
+        body = {"ok": True, "queued": True}
+        webhooks.dedup_remember(endpoint, raw, 200, body, persist=False)
+        return JsonResponse(body, status=200)
+    http_status, body = webhooks.handle_callback(raw, sig)
+    webhooks.dedup_remember(endpoint, raw, http_status, body)
+    return _webhook_response(http_status, body)
 
 
 @csrf_exempt
@@ -649,109 +585,30 @@ def payment_notify(request):
     """
     Ancien endpoint (compat). Conserve si déjà déclaré côté CinetPay.
     """
-    try:
-        try:
-            payload = json.loads(request.body.decode())
-        except Exception:
-            logging.getLogger(__name__).warning("[CinetPay][notify] Invalid JSON")
-            return JsonResponse({"detail": "Invalid JSON"}, status=400)
-        masked = {k: ("***" if "key" in k else v) for k, v in payload.items()}
-        logging.getLogger(__name__).info(f"[CinetPay][notify] Payload: {masked}")
-        transaction_id = payload.get("transaction_id")
-        if not transaction_id:
-            return JsonResponse({"detail": "Missing transaction_id"}, status=400)
-        order = Order.objects.filter(provider_ref=transaction_id).first()
-        if not order:
-            logging.getLogger(__name__).warning("[CinetPay][notify] Order not found for transaction_id=%s", transaction_id)
-            return JsonResponse({"detail": "Order not found"}, status=404)
-        try:
-            check = cinetpay.safe_check(transaction_id)
-        except Exception as e:
-            logging.getLogger(__name__).error(f"[CinetPay][notify] CinetPay check error: {str(e)}")
-            return JsonResponse({"detail": "CinetPay check error"}, status=502)
-        status = (check.get("data") or {}).get("status", "")
-        logging.getLogger(__name__).info(f"[CinetPay][notify] Order {order.id} - check status: {status}")
-        if status in ("ACCEPTED", "SUCCESS", "PAID"):
-            order.status = Order.PAID
-            order.save(update_fields=["status"])
-            from store.services import deliver_order
-            deliver_order(order)
-            send_download_email(order)
-        elif status in ("REFUSED", "CANCELED", "FAILED"):
-            order.status = Order.FAILED
-            order.save(update_fields=["status"])
-        return JsonResponse({"detail": "OK"})
-    except Exception as e:
-        logging.getLogger(__name__).error(f"[CinetPay][notify] Unexpected error: {str(e)}")
-        return JsonResponse({"detail": "Unexpected error"}, status=500)
-
-
-# Webhook HMAC (form-data) — compat
-SECRET = os.getenv("CINETPAY_SECRET", "")
-
-FIELDS_ORDER = [
-    "cpm_site_id",
-    "cpm_trans_id",
-    "cpm_trans_date",
-    "cpm_amount",
-    "cpm_currency",
-    "signature",
-    "payment_method",
-    "cel_phone_num",
-    "cpm_phone_prefixe",
-    "cpm_language",
-    "cpm_version",
-    "cpm_payment_config",
-    "cpm_page_action",
-    "cpm_custom",
-    "cpm_designation",
-    "cpm_error_message",
-]
-
-
-def _cinetpay_token(form: dict) -> str:
-    data = "".join(form.get(k, "") for k in FIELDS_ORDER)
-    return hmac.new(SECRET.encode(), data.encode(), hashlib.sha256).hexdigest()
+    return _webhook_response(*webhooks.handle_notify(request.body or b""))
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
 def payment_callback(request):
     received = request.headers.get("x-token", "")
-    form = {k: request.POST.get(k, "") for k in FIELDS_ORDER}
-    expected = _cinetpay_token(form)
-
-    if not received or not hmac.compare_digest(received, expected):
-        return HttpResponse("Invalid signature", status=400)
-
-    tx_id = request.POST.get("cpm_trans_id")
-    order = Order.objects.filter(cinetpay_payment_id=tx_id).first()
-    if not order:
-        return HttpResponse("Order not found", status=404)
-
-    res = cinetpay.safe_check(tx_id)
-    status_ok = res.get("code") == "00" and res.get("data", {}).get("status") == "ACCEPTED"
-
-    if status_ok:
-        order.status = Order.PAID
-        order.save(update_fields=["status"])
-        DownloadToken.objects.get_or_create(order=order)
-    else:
-        order.status = Order.FAILED
-        order.save(update_fields=["status"])
-
-    return HttpResponse("OK")
+    # form-data ou multipart : on normalise en urlencoded pour le handler.
+    raw = request.POST.urlencode().encode()
+    return _webhook_response(*webhooks.handle_form(raw, received))
 
 
 def download(request, token):
-    dt = DownloadToken.objects.filter(token=token).select_related("order", "order__product").first()
-    if not dt or not dt.is_valid():
+    order_id = resolve_order_token(token)
+    order = (
+        Order.objects.select_related("product").filter(pk=order_id).first() if order_id else None
+    )
+    if order is None:
         raise Http404("Lien de téléchargement invalide ou expiré.")
-    product = dt.order.product
+    product = order.product
     f = product.deliverable_file
     if not f:
         raise Http404("Fichier non disponible.")
-    return FileResponse(f.open("rb"), as_attachment=True, filename=f.name.split("/")[-1])
+    return serve_file(f, request=request)
 
 
 def examples_block(request):
@@ -760,7 +617,8 @@ def examples_block(request):
     """
     mode = request.GET.get("mode", "carousel")
     version = request.GET.get("version", "EBOOK")
-    product = Product.objects.filter(is_published=True).first()
+    snap = catalog.snapshot()
+    product = snap.product
 
     if mode == "table":
         prefetch_rows = Prefetch(
@@ -791,13 +649,12 @@ def examples_block(request):
             {"tables": tables},
         )
 
-    slides = ExampleSlide.objects.filter(product=product).order_by("order", "id") if product else []
-    return render(request, "store/partials/examples_block_carousel.html", {"slides": slides})
+    return render(request, "store/partials/examples_block_carousel.html", {"slides": snap.slides})
 
 
 @require_http_methods(["GET"])
 def examples_prelim(request):
-    product = Product.objects.filter(is_published=True).first()
+    product = catalog.snapshot().product
     tables = (
         PreliminaryTable.objects.filter(product=product)
         .order_by("order", "title")
@@ -808,7 +665,7 @@ def examples_prelim(request):
 
 @login_required
 def user_orders(request):
-    orders = Order.objects.filter(email=request.user.email).order_by("-created_at")
+    orders = Order.objects.filter(email__lower=request.user.email.lower()).order_by("-created_at")
     return render(request, "store/user_orders.html", {"orders": orders})
 
 
@@ -852,6 +709,10 @@ def _cinetpay_secret_bytes():
     return secret.encode("utf-8")
 
 
+def _download_options_url(order):
+    return reverse("store:download_options", args=[issue_order_download_token(order)])
+
+
 def cinetpay_return(request):
     # CinetPay renvoie classiquement ?transaction_id=... ou ?cpm_trans_id=...
     tx_id = request.GET.get("cpm_trans_id") or request.GET.get("transaction_id")
@@ -867,9 +728,47 @@ def cinetpay_return(request):
     if not order:
         return HttpResponse("Transaction inconnue", status=404)
 
-    # Crée le token de téléchargement et redirige vers le choix des versions
-    dt, _ = DownloadToken.objects.get_or_create(order=order)
-    return redirect("store:download_options", token=dt.token)
+    if order.is_paid:
+        return redirect(_download_options_url(order))
+
+    # Webhook pas encore arrivé : page d'attente qui interroge order_status (cache).
+    order_status.seed(order.provider_ref, order.status)
+    return render(
+        request,
+        "store/payment_pending.html",
+        {"order_ref": order.provider_ref, "status": order.status},
+    )
+
+
+@never_cache
+@require_http_methods(["GET"])
+def order_status_view(request, ref):
+    """
+    Poll HTMX de la page d'attente : un GET de cache tant que le paiement n'est
+    pas validé ; la base n'est lue qu'au passage en PAID (ou si la clé a expiré).
+    """
+    status = order_status.read(ref)
+    if status is None:
+        status = Order.objects.filter(provider_ref=ref).values_list("status", flat=True).first()
+        if status is None:
+            raise Http404("Commande inconnue")
+        order_status.seed(ref, status)
+
+    htmx = request.headers.get("HX-Request") == "true"
+    if status == "PAID":
+        url = _download_options_url(get_object_or_404(Order, provider_ref=ref))
+        if htmx:
+            response = HttpResponse(status=204)
+            response["HX-Redirect"] = url
+            return response
+        return JsonResponse({"status": status, "redirect": url})
+    if htmx:
+        return render(
+            request,
+            "store/partials/payment_status.html",
+            {"order_ref": ref, "status": status},
+        )
+    return JsonResponse({"status": status})
 
 
 def cinetpay_cancel(request):
@@ -883,26 +782,28 @@ def cinetpay_notify(request):
         return HttpResponse('OK', status=200)
     return HttpResponse('OK', status=200)
 
+def _paid_order_for_token(token, variant=None):
+    """Commande payée d'un lien de téléchargement (jeton vérifié sans requête), sinon 404."""
+    order_id = resolve_order_token(token, variant=variant)
+    order = (
+        Order.objects.select_related("product").filter(pk=order_id).first() if order_id else None
+    )
+    if order is None or not order.is_paid:
+        raise Http404("Lien de téléchargement invalide ou paiement non validé.")
+    return order
+
+
 @require_http_methods(["GET"])
 def download_options(request, token):
-    from django.shortcuts import get_object_or_404
-    from store.models import DownloadToken, Order
-    dt = get_object_or_404(DownloadToken, token=token)
-    if not dt.is_valid() or dt.order.status != Order.PAID:
-        raise Http404("Lien de téléchargement invalide ou paiement non validé.")
-    product = dt.order.product
+    order = _paid_order_for_token(token)
+    product = order.product
     return render(request, "store/download_options.html", {"product": product, "token": token})
 
 
 @require_http_methods(["GET"])
 def download_version(request, token, version):
-    from django.shortcuts import get_object_or_404
-    from django.http import FileResponse, Http404
-    from store.models import DownloadToken, Order
-    dt = get_object_or_404(DownloadToken, token=token)
-    if not dt.is_valid() or dt.order.status != Order.PAID:
-        raise Http404("Lien de téléchargement invalide ou paiement non validé.")
-    product = dt.order.product
+    order = _paid_order_for_token(token, variant=version)
+    product = order.product
     if version == 'a4':
         f = product.deliverable_file_a4
     elif version == '6x9':
@@ -911,7 +812,10 @@ def download_version(request, token, version):
         raise Http404("Version inconnue.")
     if not f:
         raise Http404("Fichier non disponible.")
-    return FileResponse(f.open('rb'), as_attachment=True, filename=f.name.split('/')[-1])
+    stamped = watermark.stamped_pdf(f, order, variant=version)
+    if stamped:
+        return serve_file(stamped, request=request, filename=os.path.basename(f.name))
+    return serve_file(f, request=request)
     
 def secure_download(request, asset_id):
     asset = get_object_or_404(DownloadableAsset, pk=asset_id)
@@ -926,7 +830,9 @@ def secure_download(request, asset_id):
     if not abs_path.exists():
         raise Http404("Not found")
 
-    return FileResponse(open(abs_path, "rb"), as_attachment=True, filename=rel_path.name)
+    response = serve_file(abs_path, request=request, filename=rel_path.name)
+    download_stats.record_response(request, asset.pk, response)
+    return response
     
 def buy_other_methods(request, product_key):
     """
@@ -0,0 +1,29 @@
+# store/views_ops.py
+from __future__ import annotations
+
+import os
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .services import cinetpay, metrics
+
+
+@staff_member_required
+@require_GET
+def metrics_snapshot(request):
+    """
+    Histogrammes de latence du processus qui sert la requête (staff uniquement).
+    `?prefix=cinetpay.` filtre par nom. Les métriques sont locales à chaque worker :
+    le `pid` permet de distinguer les instantanés d'un worker à l'autre.
+    `breaker` : état du disjoncteur CinetPay (partagé si le cache l'est).
+    """
+    prefix = request.GET.get("prefix", "")
+    return JsonResponse(
+        {
+            "pid": os.getpid(),
+            "metrics": metrics.snapshot(prefix),
+            "breaker": cinetpay.breaker.snapshot(),
+        }
+    )
@@ -1,8 +1,20 @@
 from unittest.mock import Mock, patch
 
 import pytest
+import requests
 
 cinetpay = pytest.importorskip("store.services.cinetpay")
+metrics = pytest.importorskip("store.services.metrics")
+
+
+def _resp(code="00", status_code=200):
+    mock_resp = Mock()
+    mock_resp.status_code = status_code
+    mock_resp.ok = status_code < 400
+    mock_resp.text = '{"code": "%s"}' % code
+    mock_resp.json.return_value = {"code": code, "message": "OK"}
+    mock_resp.raise_for_status = Mock()
+    return mock_resp
 
 
 def test_cinetpay_config_defaults(monkeypatch):
@@ -13,13 +25,167 @@ def test_cinetpay_config_defaults(monkeypatch):
 @pytest.mark.parametrize("code", ["201", "00", "SUCCESS"])
 def test_cinetpay_post_is_mockable(code):
     payload = {"amount": 15000, "currency": "XOF"}
-    with patch("store.services.cinetpay.requests.post") as mock_post:
-        mock_resp = Mock()
-        mock_resp.status_code = 200
-        mock_resp.ok = True
-        mock_resp.text = '{"code": "%s"}' % code
-        mock_resp.json.return_value = {"code": code, "message": "OK"}
-        mock_resp.raise_for_status = Mock()
-        mock_post.return_value = mock_resp
+    with patch("store.services.cinetpay.get_session") as mock_session:
+        mock_session.return_value.post.return_value = _resp(code)
         res = cinetpay._post("/charge", payload)
         assert str(res.get("code")).upper() in ("201", "00", "SUCCESS")
+
+
+def test_session_is_shared_and_pooled():
+    s1 = cinetpay.get_session()
+    s2 = cinetpay.get_session()
+    assert s1 is s2
+    adapter = s1.get_adapter("https://api-checkout.cinetpay.com")
+    assert adapter._pool_maxsize == cinetpay.POOL_MAXSIZE
+
+
+def test_post_uses_split_connect_read_timeouts():
+    metrics.reset()
+    with patch("store.services.cinetpay.get_session") as mock_session:
+        mock_session.return_value.post.return_value = _resp()
+        cinetpay._post("/v2/payment/check", {})
+        _, kwargs = mock_session.return_value.post.call_args
+        assert kwargs["timeout"] == (cinetpay.CONNECT_TIMEOUT, cinetpay.READ_TIMEOUT)
+
+
+def test_check_is_retried_with_backoff(monkeypatch):
+    monkeypatch.setattr(cinetpay, "CHECK_RETRIES", 2)
+    sleeps = []
+    monkeypatch.setattr(cinetpay.time, "sleep", sleeps.append)
+    with patch("store.services.cinetpay.get_session") as mock_session:
+        mock_session.return_value.post.side_effect = [
+            requests.ConnectionError("reset"),
+            _resp(status_code=503),
+            _resp("00"),
+        ]
+        res = cinetpay._post("/v2/payment/check", {})
+    assert res["code"] == "00"
+    assert mock_session.return_value.post.call_count == 3
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[1] <= cinetpay.RETRY_BACKOFF * 2
+
+
+def test_init_is_never_retried(monkeypatch):
+    monkeypatch.setattr(cinetpay.time, "sleep", lambda s: None)
+    with patch("store.services.cinetpay.get_session") as mock_session:
+        mock_session.return_value.post.side_effect = requests.ConnectionError("reset")
+        with pytest.raises(cinetpay.CinetPayError):
+            cinetpay._post("/v2/payment", {})
+    assert mock_session.return_value.post.call_count == 1
+
+
+def test_latency_histogram_per_endpoint():
+    metrics.reset()
+    with patch("store.services.cinetpay.get_session") as mock_session:
+        mock_session.return_value.post.return_value = _resp()
+        cinetpay._post("/v2/payment/check", {})
+        cinetpay._post("/v2/payment/check", {})
+    snap = metrics.snapshot("cinetpay.")
+    assert snap["cinetpay./v2/payment/check"]["count"] == 2
+    assert snap["cinetpay./v2/payment/check"]["p95"] is not None
+
+
+def test_request_path_can_disable_check_retries(monkeypatch):
+    monkeypatch.setattr(cinetpay, "CHECK_RETRIES", 2)
+    monkeypatch.setattr(cinetpay.time, "sleep", lambda s: None)
+    with patch("store.services.cinetpay.get_session") as mock_session:
+        mock_session.return_value.post.side_effect = requests.ConnectionError("reset")
+        with pytest.raises(cinetpay.CinetPayError):
+            cinetpay._post("/v2/payment/check", {}, retries=0)
+    assert mock_session.return_value.post.call_count == 1
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint_is_staff_only(client, django_user_model):
+    metrics.reset()
+    metrics.observe("cinetpay./v2/payment/check", 0.2)
+    url = "/ops/metrics/?prefix=cinetpay."
+    assert client.get(url).status_code == 302
+    staff = django_user_model.objects.create_user("ops", password="x", is_staff=True)
+    client.force_login(staff)
+    data = client.get(url).json()
+    assert data["metrics"]["cinetpay./v2/payment/check"]["count"] == 1
+
+
+def test_read_timeout_adapts_to_observed_p99(monkeypatch):
+    metrics.reset()
+    monkeypatch.setattr(cinetpay, "ADAPTIVE_MIN_SAMPLES", 20)
+    path = "/v2/payment/check"
+    for _ in range(19):
+        metrics.observe(f"cinetpay.{path}", 0.5)
+    assert cinetpay._read_timeout(path) == cinetpay.READ_TIMEOUT  # pas assez de mesures
+    metrics.observe(f"cinetpay.{path}", 0.5)
+    assert cinetpay._read_timeout(path) == cinetpay.ADAPTIVE_FLOOR  # 4 × 0.5 s < plancher
+    for _ in range(20):
+        metrics.observe(f"cinetpay.{path}", 60)
+    assert cinetpay._read_timeout(path) == cinetpay.READ_TIMEOUT  # plafonné
+
+
+@pytest.fixture
+def breaker(locmem_cache, monkeypatch):
+    clock = [1000.0]
+    b = cinetpay.CircuitBreaker(
+        "cinetpay-test", failures=3, window=60, cooldown=30, slow_call=5,
+        clock=lambda: clock[0],
+    )
+    b.clock_value = clock
+    monkeypatch.setattr(cinetpay, "breaker", b)
+    monkeypatch.setattr(cinetpay.time, "sleep", lambda s: None)
+    return b
+
+
+def test_breaker_opens_after_failures_and_fails_fast(breaker):
+    with patch("store.services.cinetpay.get_session") as mock_session:
+        mock_session.return_value.post.side_effect = requests.ConnectionError("down")
+        for _ in range(3):
+            with pytest.raises(cinetpay.CinetPayError):
+                cinetpay._post("/v2/payment", {})
+        assert breaker.state() == breaker.OPEN
+        with pytest.raises(cinetpay.CircuitOpenError):
+            cinetpay._post("/v2/payment", {})
+    assert mock_session.return_value.post.call_count == 3
+
+
+def test_breaker_counts_5xx_and_slow_calls(breaker):
+    breaker.record(True, 0.1)
+    breaker.record(True, 9.0)  # trop lent
+    with patch("store.services.cinetpay.get_session") as mock_session:
+        mock_session.return_value.post.return_value = _resp(status_code=503)
+        with pytest.raises(cinetpay.CinetPayError):
+            cinetpay._post("/v2/payment/check", {}, retries=1)
+    assert breaker.state() == breaker.OPEN
+
+
+def test_half_open_probe_closes_or_reopens(breaker):
+    breaker._trip()
+    breaker.clock_value[0] += 31
+    assert breaker.state() == breaker.HALF_OPEN
+    assert breaker.before_call() is True
+    with pytest.raises(cinetpay.CircuitOpenError):
+        breaker.before_call()  # une seule sonde à la fois
+    breaker.record(False, 0.1, probe=True)
+    assert breaker.state() == breaker.OPEN
+
+    breaker.clock_value[0] += 31
+    with patch("store.services.cinetpay.get_session") as mock_session:
+        mock_session.return_value.post.return_value = _resp("00")
+        cinetpay._post("/v2/payment/check", {})
+    assert breaker.state() == breaker.CLOSED
+
+
+@pytest.mark.django_db
+def test_buy_fails_fast_without_order_when_breaker_open(breaker, rf):
+    from store import views
+    from store.models import OfferTier, Order, Product
+
+    product = Product.objects.create(
+        slug="p-breaker", title="P", price_fcfa=15000, is_published=True
+    )
+    OfferTier.objects.create(product=product, kind=OfferTier.STANDARD)
+    breaker._trip()
+    with patch.object(cinetpay, "init_payment_auto") as minit:
+        resp = views.buy(rf.post("/buy/p-breaker/", {"email": "a@example.com"}), "p-breaker")
+    assert resp.status_code == 503
+    assert b"/buy/other-methods/p-breaker/" in resp.content
+    minit.assert_not_called()
+    assert not Order.objects.exists()
@@ -7,7 +7,6 @@ import pytest
 from django.contrib.auth import get_user_model
 from django.core import mail
 from django.urls import reverse
-from django.utils import timezone
 
 from downloads.models import DownloadCategory, DownloadableAsset, ExternalEntitlement
 from store.models import Product, Order, ClientInquiry, PaymentIntent, GeneratedDraft, FinalAsset, DownloadToken
@@ -66,7 +65,8 @@ def test_delivery_email_contains_links(client, settings, monkeypatch):
     x69 = DownloadableAsset.objects.create(category=ebook, slug="x69", title="PDF 6x9", file="downloads/6x9.pdf", is_published=True)
     # Entitlement for extra category (optional)
     # Generate fulfilment email
-    with patch("store.services.mailing.SignedUrlService.get_signed_url", side_effect=lambda asset, expires=900: f"https://signed/{asset.slug}"):
+    signed = lambda asset, expires=900: f"https://signed/{asset.slug}"  # noqa: E731
+    with patch("downloads.services.SignedUrlService._sign", side_effect=signed):
         from store.services.mailing import send_fulfilment_email
         send_fulfilment_email(to_email="buyer@example.com", order_ref="ORDER-1")
     assert len(mail.outbox) == 1
@@ -170,15 +170,12 @@ def test_bonus_publish_sends_email_and_marks_row_green(client, django_user_model
 @pytest.mark.django_db
 def test_signed_links_expire_and_renew():
     inquiry = ClientInquiry.objects.create(email="x@x.com", payment_status="PAID", processing_state="PAID")
-    dt = issue_download_token(inquiry, ttl_minutes=0)  # immediate expiry
-    # Manually set past expiry to ensure invalid
-    dt.expires_at = timezone.now() - timezone.timedelta(minutes=1)
-    dt.save(update_fields=["expires_at"])
-    assert dt.is_valid() is False
-    assert consume_token(dt.token) is None
-    # Renew
-    dt2 = issue_download_token(inquiry, ttl_minutes=30)
-    assert dt2.is_valid() is True
+    expired = issue_download_token(inquiry, ttl_minutes=-1)
+    assert consume_token(expired) is None
+    # Renew : jeton à usage unique
+    token = issue_download_token(inquiry, ttl_minutes=30)
+    assert consume_token(token).object_id == inquiry.id
+    assert consume_token(token) is None
 
 
 @pytest.mark.django_db